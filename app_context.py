@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+import http_pool
+from credit_budget import credit_budget
+
+
+class AppContext:
+    """Long-lived application state, built once at startup and shared by every request"""
+
+    def __init__(self, config, crypto_service, price_cache, price_refresher, **services):
+        self.config = config
+        self.crypto_service = crypto_service
+        self.price_cache = price_cache
+        self.price_refresher = price_refresher
+        # Process-wide pools and budgets live here too, so handlers reach
+        # everything through one object
+        self.http_client = http_pool.http_client
+        self.credit_budget = credit_budget
+        # Server-specific services (user store, sessions, page caches, ...)
+        for name, service in services.items():
+            setattr(self, name, service)
+
+    def attach(self, server):
+        """Make the context available to handlers as self.server.app"""
+        server.app = self
+        return server
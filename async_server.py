@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+import io
+import os
+import socket
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from price_cache import env_seconds
+
+
+# Upper bound on handlers running at once, and how long an idle or slow
+# client may take to send its request before the connection is dropped
+ASYNC_MAX_HANDLERS = int(os.environ.get('ASYNC_MAX_HANDLERS', 32))
+ASYNC_REQUEST_TIMEOUT = env_seconds('ASYNC_REQUEST_TIMEOUT', 30)
+
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+# Responses up to this size are written in one go after the handler returns;
+# longer bodies (exports, large files) go out while the handler is still writing
+STREAM_BUFFER_BYTES = 64 * 1024
+
+
+class _StreamingWriter:
+    """wfile for a handler running on the executor, writing through the event loop"""
+
+    def __init__(self, loop, writer):
+        self._loop = loop
+        self._writer = writer
+        self._buffer = bytearray()
+
+    def write(self, data):
+        self._buffer += data
+        if len(self._buffer) >= STREAM_BUFFER_BYTES:
+            self._send(self.getvalue())
+        return len(data)
+
+    def flush(self):
+        # Like BytesIO: whatever is still buffered is sent once the handler returns
+        pass
+
+    def getvalue(self):
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+    def _send(self, data):
+        # Block the handler thread until the client has taken the data, so a
+        # slow reader holds back the producer instead of filling memory
+        future = asyncio.run_coroutine_threadsafe(self._write(data), self._loop)
+        try:
+            future.result(ASYNC_REQUEST_TIMEOUT)
+        except TimeoutError:
+            future.cancel()
+            raise ConnectionResetError('client stopped reading the response')
+
+    async def _write(self, data):
+        self._writer.write(data)
+        await self._writer.drain()
+
+
+class AsyncHTTPServer:
+    """asyncio serving engine that runs an existing BaseHTTPRequestHandler class"""
+
+    def __init__(self, server_address, RequestHandlerClass, max_handlers=None, reuse_port=False):
+        self.server_address = server_address
+        self.RequestHandlerClass = RequestHandlerClass
+        self.max_handlers = ASYNC_MAX_HANDLERS if max_handlers is None else max_handlers
+        # Bind immediately so "address in use" surfaces like it does for HTTPServer
+        self.socket = socket.create_server(server_address, backlog=1024, reuse_port=reuse_port)
+        # Idle and slow clients only cost a coroutine; complete requests run on
+        # a bounded pool so file reads and page rendering never block the loop
+        self.executor = ThreadPoolExecutor(self.max_handlers, thread_name_prefix='async-handler')
+        self._loop = None
+        self._server = None
+
+    def serve_forever(self):
+        asyncio.run(self._serve())
+
+    def shutdown(self):
+        # A second SIGTERM (e.g. to the whole process group) may arrive after the loop has finished
+        if self._loop is not None and self._server is not None and not self._loop.is_closed():
+            try:
+                self._loop.call_soon_threadsafe(self._server.close)
+            except RuntimeError:
+                pass
+
+    def server_close(self):
+        self.socket.close()
+        self.executor.shutdown(wait=False)
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._semaphore = asyncio.Semaphore(self.max_handlers)
+        self._server = await asyncio.start_server(
+            self._handle_connection,
+            sock=self.socket,
+            limit=MAX_HEADER_BYTES
+        )
+        async with self._server:
+            try:
+                await self._server.serve_forever()
+            except asyncio.CancelledError:
+                pass
+
+    async def _handle_connection(self, reader, writer):
+        client_address = writer.get_extra_info('peername')
+        requests_served = 0
+        try:
+            while True:
+                raw_request = await self._read_request(reader)
+                if raw_request is None:
+                    break
+
+                requests_served += 1
+                async with self._semaphore:
+                    response, close, stream = await self._loop.run_in_executor(
+                        self.executor, self._dispatch, raw_request, client_address, requests_served, writer
+                    )
+
+                writer.write(response)
+                await writer.drain()
+                if stream is not None:
+                    # Long-lived responses (event streams, WebSockets) continue
+                    # on the loop, without holding a handler thread
+                    await stream.stream_to(writer, reader)
+                    break
+                if close:
+                    break
+        except (ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        """Read one request head and body, or None when the client is done"""
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), ASYNC_REQUEST_TIMEOUT)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+            return None
+
+        content_length = 0
+        for line in head.split(b'\r\n')[1:]:
+            name, _, value = line.partition(b':')
+            if name.strip().lower() == b'content-length':
+                try:
+                    content_length = int(value.strip())
+                except ValueError:
+                    content_length = 0
+        if content_length > MAX_BODY_BYTES:
+            return None
+
+        body = b''
+        if content_length:
+            body = await asyncio.wait_for(reader.readexactly(content_length), ASYNC_REQUEST_TIMEOUT)
+        return head + body
+
+    def _dispatch(self, raw_request, client_address, requests_served, writer):
+        # Run the handler against an in-memory request and a buffered writer
+        # instead of a socket
+        handler = self.RequestHandlerClass.__new__(self.RequestHandlerClass)
+        # Handlers that cap requests per connection count from here; their
+        # handle_one_request adds the current request
+        handler.requests_served = requests_served - 1
+        handler.request = None
+        handler.client_address = client_address
+        handler.server = self
+        handler.rfile = io.BytesIO(raw_request)
+        handler.wfile = _StreamingWriter(self._loop, writer)
+        handler.close_connection = True
+        # A handler may set .stream to an object with an async
+        # stream_to(writer, reader) to keep the connection after this response
+        handler.stream = None
+        handler.handle_one_request()
+        return handler.wfile.getvalue(), handler.close_connection, handler.stream
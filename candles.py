@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+import os
+import math
+import time
+import threading
+from collections import deque
+
+import numpy as np
+
+
+# Candle intervals in seconds, each built from the one before it
+INTERVALS = {'1m': 60, '5m': 300, '1h': 3600, '1d': 86400}
+# Closed candles kept in memory per symbol and interval, the default number
+# of candles in a response, and the most a response may carry
+CANDLE_MEMORY = int(os.environ.get('CANDLE_MEMORY', 1440))
+CANDLE_DEFAULT_COUNT = 200
+CANDLE_MAX_COUNT = 5000
+
+# t (bucket start), open, high, low, close, volume_24h at close, ticks
+FIELDS = ('t', 'open', 'high', 'low', 'close', 'volume_24h', 'ticks')
+
+
+def _merge(candle, newer, bucket):
+    """Fold a newer candle (or tick) into candle, which may be None"""
+    if candle is None:
+        return [bucket] + newer[1:]
+    return [bucket, candle[1], max(candle[2], newer[2]), min(candle[3], newer[3]),
+            newer[4], newer[5], candle[6] + newer[6]]
+
+
+class CandleAggregator:
+    """Rolling candles at one interval, fed closed candles from the interval below"""
+
+    def __init__(self, step, capacity, parent=None):
+        self.step = step
+        self.closed = deque(maxlen=capacity)
+        self.current = None
+        # Next interval up; receives each candle this one closes
+        self.parent = parent
+
+    def bucket(self, t):
+        return t - t % self.step
+
+    def add(self, candle):
+        bucket = self.bucket(candle[0])
+        if self.current is not None and bucket != self.current[0]:
+            if bucket < self.current[0]:
+                # Out-of-order input would rewrite a closed candle; drop it
+                return
+            self.closed.append(self.current)
+            if self.parent is not None:
+                self.parent.add(self.current)
+            self.current = None
+        self.current = _merge(self.current, candle, bucket)
+
+
+class SymbolCandles:
+    """Aggregators for every interval of one symbol, 1m at the bottom"""
+
+    def __init__(self, started, capacity):
+        self.levels = {}
+        # Longest interval first, so each aggregator can point at its parent
+        self.order = sorted(INTERVALS, key=INTERVALS.get, reverse=True)
+        parent = None
+        for name in self.order:
+            parent = self.levels[name] = CandleAggregator(INTERVALS[name], capacity, parent)
+        self.lowest = parent
+        self.started = started
+
+    def add_tick(self, t, price, volume):
+        self.lowest.add([t, price, price, price, price, volume, 1])
+
+    def open_candles(self, name):
+        """Unfinished candles at an interval, folding in the lower intervals' unfinished ones"""
+        aggregator = self.levels[name]
+        # Each lower level's open candle is newer than the level above it, and
+        # may already fall in the next bucket of this interval
+        chain = [self.levels[level].current for level in self.order[self.order.index(name):]]
+        candles = []
+        for candle in chain:
+            if candle is None:
+                continue
+            bucket = aggregator.bucket(candle[0])
+            if candles and candles[-1][0] == bucket:
+                candles[-1] = _merge(candles[-1], candle, bucket)
+            else:
+                candles.append(_merge(None, candle, bucket))
+        return candles
+
+    def covered_from(self, name):
+        """Earliest bucket whose memory candle is complete"""
+        aggregator = self.levels[name]
+        # The first bucket may have started before we saw any tick
+        start = math.ceil(self.started / aggregator.step) * aggregator.step
+        if len(aggregator.closed) == aggregator.closed.maxlen:
+            start = max(start, aggregator.closed[0][0])
+        return start
+
+
+class CandleBook:
+    """OHLCV candles per symbol, updated as snapshots arrive; history comes from the store"""
+
+    def __init__(self, store=None, capacity=None):
+        self.store = store
+        self.capacity = CANDLE_MEMORY if capacity is None else capacity
+        self._symbols = {}
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.resampled = 0
+
+    def record(self, snapshot):
+        """PriceCache listener: one tick per quote, at the snapshot's fetch time"""
+        t = snapshot.fetched_at
+        if not t:
+            return
+        with self._lock:
+            for quote in snapshot.data:
+                price = quote.get('price')
+                if not isinstance(price, (int, float)):
+                    continue
+                symbol = str(quote.get('symbol', '')).upper()
+                candles = self._symbols.get(symbol)
+                if candles is None:
+                    candles = self._symbols[symbol] = SymbolCandles(t, self.capacity)
+                volume = quote.get('volume_24h')
+                candles.add_tick(t, float(price), float(volume) if isinstance(volume, (int, float)) else math.nan)
+
+    def candles(self, symbol, interval, start=None, end=None):
+        """{field: list} for candles with start <= t <= end, oldest first"""
+        step = INTERVALS[interval]
+        end = time.time() if end is None else end
+        start = end - step * CANDLE_DEFAULT_COUNT if start is None else start
+        # Never more than CANDLE_MAX_COUNT candles; keep the most recent
+        start = max(start, end - step * CANDLE_MAX_COUNT)
+
+        with self._lock:
+            symbol_candles = self._symbols.get(symbol.upper())
+            if symbol_candles is not None and start >= symbol_candles.covered_from(interval):
+                self.memory_hits += 1
+                rows = [candle for candle in symbol_candles.levels[interval].closed if start <= candle[0] <= end]
+                rows.extend(candle for candle in symbol_candles.open_candles(interval) if start <= candle[0] <= end)
+                return {field: [row[index] for row in rows] for index, field in enumerate(FIELDS)}
+
+        # Older than what memory holds: resample the recorded ticks
+        self.resampled += 1
+        if self.store is None:
+            return {field: [] for field in FIELDS}
+        # Ticks from the start of the first bucket, so it is not cut short
+        columns = self.store.query(symbol, start - start % step, end, columns=('ts', 'price', 'volume_24h'))
+        return resample(columns, step)
+
+    def status(self):
+        return {
+            'symbols': len(self._symbols),
+            'memory_hits': self.memory_hits,
+            'resampled': self.resampled
+        }
+
+
+def resample(columns, step):
+    """OHLCV candles from raw tick columns in a few vectorised passes"""
+    ts = np.frombuffer(columns['ts'], dtype=np.float64)
+    price = np.frombuffer(columns['price'], dtype=np.float64)
+    volume = np.frombuffer(columns['volume_24h'], dtype=np.float64)
+    keep = ~np.isnan(price)
+    ts, price, volume = ts[keep], price[keep], volume[keep]
+    if not len(ts):
+        return {field: [] for field in FIELDS}
+
+    buckets = ts - np.mod(ts, step)
+    # Ticks are sorted by time, so each bucket is one contiguous run
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+    ends = np.append(starts[1:], len(ts))
+    result = {
+        't': buckets[starts],
+        'open': price[starts],
+        'high': np.maximum.reduceat(price, starts),
+        'low': np.minimum.reduceat(price, starts),
+        'close': price[ends - 1],
+        'volume_24h': volume[ends - 1],
+        'ticks': ends - starts
+    }
+    return {field: values.tolist() for field, values in result.items()}
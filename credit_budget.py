@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+import time
+import datetime
+import threading
+from collections import deque
+
+from price_cache import env_seconds
+
+
+# How often plan usage is re-read from /key/info, the share of the monthly
+# quota kept in reserve, and the most a refresh interval may be stretched
+CMC_STATUS_INTERVAL = env_seconds('CMC_STATUS_INTERVAL', 600)
+CMC_CREDIT_RESERVE = env_seconds('CMC_CREDIT_RESERVE', 0.05)
+CMC_MAX_STRETCH = env_seconds('CMC_MAX_STRETCH', 20)
+
+BURN_WINDOW = 24 * 3600
+
+
+def next_month_start(now=None):
+    """Start of the next calendar month in UTC, when CMC usage resets by default"""
+    today = datetime.datetime.utcfromtimestamp(now or time.time())
+    if today.month == 12:
+        reset = datetime.datetime(today.year + 1, 1, 1)
+    else:
+        reset = datetime.datetime(today.year, today.month + 1, 1)
+    return reset.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+class CreditBudget:
+    """Tracks CoinMarketCap credit usage and paces upstream calls to last the month"""
+
+    def __init__(self, check_status=None):
+        # Returns the dict produced by CryptoAPIService.check_api_status()
+        self.check_status = check_status
+        self.plan = None
+        self.credits_used = None
+        self.credits_left = None
+        self.reset_at = None
+        self.last_checked = 0.0
+        self.recorded_since_check = 0
+        self.refused = 0
+        self.started_at = time.time()
+        self._checking = False
+        self._calls = deque()
+        self._lock = threading.Lock()
+
+    def record(self, credits=1):
+        """Account for credits spent by one upstream call"""
+        now = time.time()
+        with self._lock:
+            self._calls.append((now, credits))
+            self.recorded_since_check += credits
+            self._trim(now)
+
+    def record_response(self, payload):
+        """Record the credit_count CMC reports in a response body"""
+        status = payload.get('status') if isinstance(payload, dict) else None
+        self.record((status or {}).get('credit_count', 1))
+
+    def maybe_refresh_status(self, force=False):
+        """Re-read plan usage from /key/info in the background when the last reading is too old
+
+        Never blocks the caller (the price refresher): decisions use the
+        previous reading until the new one arrives.
+        """
+        with self._lock:
+            if self._checking or (not force and time.time() - self.last_checked < CMC_STATUS_INTERVAL):
+                return
+            self.last_checked = time.time()
+            self._checking = True
+        threading.Thread(target=self._refresh_in_background, name='credit-status', daemon=True).start()
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh_status()
+        except Exception as e:
+            print(f"Credit status check failed: {e}")
+        finally:
+            self._checking = False
+
+    def refresh_status(self):
+        """Read plan usage from /key/info now"""
+        check_status = self.check_status
+        if check_status is None:
+            from crypto_api import crypto_service
+            check_status = crypto_service.check_api_status
+
+        status = check_status()
+        if status.get('status') != 'active':
+            return
+
+        with self._lock:
+            self.plan = status.get('plan')
+            self.credits_used = status.get('credits_used')
+            self.credits_left = status.get('credits_left')
+            self.reset_at = status.get('reset_at') or next_month_start()
+            self.recorded_since_check = 0
+
+    def estimated_credits_left(self):
+        if self.credits_left is None:
+            return None
+        return self.credits_left - self.recorded_since_check
+
+    def burn_rate(self):
+        """Credits spent per hour over the last day"""
+        now = time.time()
+        with self._lock:
+            self._trim(now)
+            spent = sum(credits for _, credits in self._calls)
+        window = min(BURN_WINDOW, max(now - self.started_at, 60))
+        return spent * 3600 / window
+
+    def hours_until_reset(self):
+        reset_at = self.reset_at or next_month_start()
+        return max((reset_at - time.time()) / 3600, 1 / 60)
+
+    def projected_usage(self):
+        """Credits expected to be used by the end of the billing month"""
+        if self.credits_used is None:
+            return None
+        used = self.credits_used + self.recorded_since_check
+        return round(used + self.burn_rate() * self.hours_until_reset())
+
+    def reserve(self):
+        if self.credits_used is None or self.credits_left is None:
+            return 0
+        return (self.credits_used + self.credits_left) * CMC_CREDIT_RESERVE
+
+    def allow(self, credits=1):
+        """Whether spending more credits still leaves the reserve untouched"""
+        self.maybe_refresh_status()
+        left = self.estimated_credits_left()
+        if left is None:
+            return True
+
+        if left - credits < self.reserve():
+            self.refused += 1
+            return False
+        return True
+
+    def affordable_rate(self):
+        """Credits per hour that can be spent without touching the reserve before reset"""
+        left = self.estimated_credits_left()
+        if left is None:
+            return None
+        return max(left - self.reserve(), 0) / self.hours_until_reset()
+
+    def stretch(self, interval):
+        """Polling interval stretched so one call per interval fits the remaining budget"""
+        affordable = self.affordable_rate()
+        if affordable is None:
+            return interval
+        if affordable <= 0:
+            return interval * CMC_MAX_STRETCH
+
+        with self._lock:
+            calls = len(self._calls)
+            spent = sum(credits for _, credits in self._calls)
+        credits_per_call = spent / calls if calls else 1
+        return min(max(interval, 3600 * credits_per_call / affordable), interval * CMC_MAX_STRETCH)
+
+    def status(self):
+        """Budget information for monitoring endpoints"""
+        return {
+            'plan': self.plan,
+            'credits_used': self.credits_used,
+            'credits_left': self.estimated_credits_left(),
+            'burn_rate_per_hour': round(self.burn_rate(), 2),
+            'projected_usage': self.projected_usage(),
+            'affordable_per_hour': None if self.affordable_rate() is None else round(self.affordable_rate(), 2),
+            'refused_calls': self.refused
+        }
+
+    def _trim(self, now):
+        while self._calls and now - self._calls[0][0] > BURN_WINDOW:
+            self._calls.popleft()
+
+
+# The quota belongs to the API key, so every caller in the process shares it
+credit_budget = CreditBudget()
@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
 import os
 import json
-import requests
+import http_pool
 from datetime import datetime
+from credit_budget import credit_budget
+from quote_batcher import QuoteBatcher
+
+DEFAULT_SYMBOLS = ['BTC', 'ETH', 'BNB', 'SOL', 'DOGE', 'USDC']
+# Plan usage is only a pacing hint: one short attempt, never a retry loop
+KEY_INFO_TIMEOUT = (3.05, 5)
 
 class CryptoAPIService:
     def __init__(self):
@@ -12,49 +18,60 @@ class CryptoAPIService:
             'X-CMC_PRO_API_KEY': self.api_key,
             'Accept': 'application/json'
         }
+        # ذاكرة مؤقتة لكل رمز على حدة مشتركة بين جميع المستدعين
+        self.quotes = QuoteBatcher(self.fetch_quote_batch)
     
-    def get_real_time_prices(self):
+    def get_real_time_prices(self, symbols=None):
         """الحصول على أسعار العملات الحقيقية من CoinMarketCap"""
-        try:
-            symbols = ['BTC', 'ETH', 'BNB', 'SOL', 'DOGE', 'USDC']
-            
-            response = requests.get(
-                f'{self.base_url}/cryptocurrency/quotes/latest',
-                headers=self.headers,
-                params={
-                    'symbol': ','.join(symbols),
-                    'convert': 'USD'
-                },
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                crypto_data = []
-                
-                for symbol in symbols:
-                    if symbol in data['data']:
-                        coin = data['data'][symbol]
-                        quote = coin['quote']['USD']
-                        
-                        crypto_data.append({
-                            'symbol': symbol,
-                            'name': coin['name'],
-                            'price': round(quote['price'], 6),
-                            'change_24h': round(quote['percent_change_24h'], 2),
-                            'market_cap': quote['market_cap'],
-                            'volume_24h': quote['volume_24h'],
-                            'last_updated': quote['last_updated']
-                        })
-                
-                return crypto_data
-            else:
-                print(f"خطأ في API: {response.status_code}")
-                return self.get_fallback_data()
-                
-        except Exception as e:
-            print(f"خطأ في الحصول على البيانات: {e}")
-            return self.get_fallback_data()
+        crypto_data = []
+        for coin in self.get_quotes(symbols or DEFAULT_SYMBOLS):
+            crypto_data.append({
+                'symbol': coin['symbol'],
+                'name': coin['name'],
+                **coin['quote']['USD']
+            })
+        
+        return crypto_data or self.get_fallback_data()
+    
+    def get_quotes(self, symbols, convert=('USD',), max_age=None):
+        """أسعار عدة عملات دفعة واحدة؛ الطلبات المتزامنة تُدمج في أقل عدد من الاستدعاءات"""
+        return self.quotes.get(symbols, convert, max_age=max_age)
+    
+    def fetch_quote_batch(self, symbols, currency):
+        """استدعاء واحد لـ quotes/latest لقائمة رموز بعملة تحويل واحدة"""
+        # توفير الرصيد الشهري: استخدام البيانات المخزنة قبل نفاد الرصيد
+        if not credit_budget.allow():
+            print("تم تجاوز ميزانية رصيد API، استخدام البيانات المخزنة")
+            return {}
+        
+        response = http_pool.get(
+            f'{self.base_url}/cryptocurrency/quotes/latest',
+            headers=self.headers,
+            params={
+                'symbol': ','.join(symbols),
+                'convert': currency
+            }
+        )
+        
+        if response.status_code != 200:
+            print(f"خطأ في API: {response.status_code}")
+            return {}
+        
+        data = response.json()
+        credit_budget.record_response(data)
+        return {
+            symbol: {'name': coin['name'], 'quote': self.format_quote(coin['quote'][currency])}
+            for symbol, coin in data['data'].items()
+        }
+    
+    def format_quote(self, quote):
+        return {
+            'price': round(quote['price'], 6),
+            'change_24h': round(quote['percent_change_24h'], 2),
+            'market_cap': quote['market_cap'],
+            'volume_24h': quote['volume_24h'],
+            'last_updated': quote['last_updated']
+        }
     
     def get_fallback_data(self):
         """بيانات احتياطية عند فشل API"""
@@ -70,19 +87,27 @@ class CryptoAPIService:
     def get_top_cryptocurrencies(self, limit=10):
         """الحصول على أهم العملات المشفرة"""
         try:
-            response = requests.get(
+            if not credit_budget.allow():
+                return []
+            
+            response = http_pool.get(
                 f'{self.base_url}/cryptocurrency/listings/latest',
                 headers=self.headers,
                 params={
                     'start': 1,
                     'limit': limit,
                     'convert': 'USD'
-                },
-                timeout=10
+                }
             )
             
             if response.status_code == 200:
                 data = response.json()
+                credit_budget.record_response(data)
+                
+                # القائمة تحتوي على الأسعار أيضاً، فنستخدمها لتعبئة ذاكرة الأسعار
+                for coin in data['data']:
+                    self.quotes.store(coin['symbol'], coin['name'], 'USD', self.format_quote(coin['quote']['USD']))
+                
                 return [
                     {
                         'rank': coin['cmc_rank'],
@@ -104,20 +129,27 @@ class CryptoAPIService:
     
     def check_api_status(self):
         """فحص حالة مفتاح API"""
+        if not self.api_key:
+            return {'status': 'error', 'message': 'API key not configured'}
+        
         try:
-            response = requests.get(
+            response = http_pool.get(
                 f'{self.base_url}/key/info',
                 headers=self.headers,
-                timeout=10
+                timeout=KEY_INFO_TIMEOUT,
+                retries=0
             )
             
             if response.status_code == 200:
                 data = response.json()
+                plan = data['data']['plan']
+                reset_at = plan.get('credit_limit_monthly_reset_timestamp')
                 return {
                     'status': 'active',
-                    'plan': data['data']['plan']['name'],
+                    'plan': plan['name'],
                     'credits_used': data['data']['usage']['current_month']['credits_used'],
-                    'credits_left': data['data']['usage']['current_month']['credits_left']
+                    'credits_left': data['data']['usage']['current_month']['credits_left'],
+                    'reset_at': datetime.fromisoformat(reset_at.replace('Z', '+00:00')).timestamp() if reset_at else None
                 }
             else:
                 return {'status': 'error', 'message': f'HTTP {response.status_code}'}
@@ -1,10 +1,16 @@
 #!/usr/bin/env python3
 import os
+import argparse
 import json
 import requests
 import secrets
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from socketserver import ThreadingMixIn
+from price_cache import PriceCache
+from price_refresher import PriceRefresher, PRICE_REFRESH_INTERVAL
+from crypto_api import DEFAULT_SYMBOLS, crypto_service as quote_service
+from async_server import AsyncHTTPServer
+from app_context import AppContext
 
 class EnvironmentConfig:
     def __init__(self):
@@ -44,53 +50,42 @@ class CryptoAPIService:
             return []
             
         try:
-            symbols = ['BTC', 'ETH', 'BNB', 'SOL', 'DOGE', 'USDC']
-            
-            response = requests.get(
-                f'{self.base_url}/cryptocurrency/quotes/latest',
-                headers=self.headers,
-                params={
-                    'symbol': ','.join(symbols),
-                    'convert': 'USD'
-                },
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                crypto_data = []
-                
-                for symbol in symbols:
-                    if symbol in data['data']:
-                        coin = data['data'][symbol]
-                        quote = coin['quote']['USD']
-                        
-                        crypto_data.append({
-                            'symbol': symbol,
-                            'name': coin['name'],
-                            'price': round(quote['price'], 6),
-                            'change_24h': round(quote['percent_change_24h'], 2)
-                        })
-                
-                return crypto_data
-            else:
-                print(f"API Error: {response.status_code}")
-                return []
+            # Through the shared per-symbol quote cache, so this fetch joins any
+            # concurrent quotes/latest batch and reuses quotes another caller
+            # fetched within the last half refresh interval
+            return [
+                {'symbol': coin['symbol'], 'name': coin['name'], **coin['quote']['USD']}
+                for coin in quote_service.get_quotes(DEFAULT_SYMBOLS, max_age=PRICE_REFRESH_INTERVAL / 2)
+            ]
                 
         except Exception as e:
             print(f"Error fetching data: {e}")
             return []
 
+def create_app():
+    """Build config, services and caches once; every request shares them"""
+    config = EnvironmentConfig()
+    crypto_service = CryptoAPIService(config)
+    # Prices are fetched once per TTL no matter how many requests come in
+    price_cache = PriceCache(
+        crypto_service.get_real_time_prices,
+        key=('/cryptocurrency/quotes/latest', 'BTC,ETH,BNB,SOL,DOGE,USDC', 'USD')
+    )
+    return AppContext(config, crypto_service, price_cache, PriceRefresher(price_cache))
+
 class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
     """Handle requests in a separate thread for better performance"""
     allow_reuse_address = True
     daemon_threads = True
 
 class RimTokenHandler(BaseHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        self.config = EnvironmentConfig()
-        self.crypto_service = CryptoAPIService(self.config)
-        super().__init__(*args, **kwargs)
+    @property
+    def app(self):
+        return self.server.app
+    
+    @property
+    def config(self):
+        return self.app.config
 
     def do_GET(self):
         if self.path == '/api/crypto/prices':
@@ -134,7 +129,7 @@ class RimTokenHandler(BaseHTTPRequestHandler):
         self.end_headers()
         
         health_data = {
-            'status': 'healthy',
+            'status': 'degraded' if self.app.price_refresher.consecutive_errors else 'healthy',
             'service': 'RimToken Trading Platform',
             'version': '1.0.0',
             'environment': 'production' if self.config.is_production_ready() else 'development',
@@ -142,7 +137,8 @@ class RimTokenHandler(BaseHTTPRequestHandler):
             'security': {
                 'jwt_configured': bool(self.config.jwt_secret),
                 'session_configured': bool(self.config.session_secret)
-            }
+            },
+            'price_refresher': self.app.price_refresher.status()
         }
         
         self.wfile.write(json.dumps(health_data, ensure_ascii=False).encode('utf-8'))
@@ -154,12 +150,13 @@ class RimTokenHandler(BaseHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Origin', '*')
         self.end_headers()
         
-        crypto_data = self.crypto_service.get_real_time_prices()
+        snapshot = self.app.price_cache.get()
         response_data = {
             'success': True,
-            'data': crypto_data,
+            'data': snapshot.data,
             'source': 'CoinMarketCap API' if self.config.coinmarketcap_api_key else 'No API configured',
-            'count': len(crypto_data),
+            'count': len(snapshot.data),
+            'cache': self.app.price_cache.freshness(snapshot),
             'timestamp': requests.utils.formatdate(usegmt=True)
         }
         
@@ -174,7 +171,7 @@ class RimTokenHandler(BaseHTTPRequestHandler):
         self.end_headers()
         
         # Get cryptocurrency data
-        crypto_data = self.crypto_service.get_real_time_prices()
+        crypto_data = self.app.price_cache.get().data
         
         # Generate price display
         price_display = ""
@@ -499,7 +496,14 @@ class RimTokenHandler(BaseHTTPRequestHandler):
         self.wfile.write(html_content.encode('utf-8'))
 
 def main():
-    config = EnvironmentConfig()
+    parser = argparse.ArgumentParser(description='RimToken deployment server')
+    parser.add_argument('--engine', choices=['threaded', 'asyncio'],
+                        default=os.environ.get('SERVER_ENGINE', 'threaded'),
+                        help='serving engine: one thread per connection, or an asyncio event loop')
+    args = parser.parse_args()
+    
+    app = create_app()
+    config = app.config
     
     print("🔐 RimToken Trading Platform - Deployment Ready")
     print("🌐 Access at: http://localhost:3000")
@@ -512,10 +516,17 @@ def main():
     print("   - /health (Health check)")
     print("   - /api/crypto/prices (Crypto data)")
     print("   - /api/config/status (Configuration status)")
-    print("✅ Server starting...")
+    print(f"✅ Server starting ({args.engine} engine)...")
+    
+    app.price_refresher.start()
+    app.price_refresher.wait_until_ready(5)
     
     server_address = ('0.0.0.0', int(os.environ.get('PORT', 3000)))
-    httpd = ThreadedHTTPServer(server_address, RimTokenHandler)
+    if args.engine == 'asyncio':
+        httpd = AsyncHTTPServer(server_address, RimTokenHandler)
+    else:
+        httpd = ThreadedHTTPServer(server_address, RimTokenHandler)
+    app.attach(httpd)
     
     try:
         httpd.serve_forever()
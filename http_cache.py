@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+import os
+import hashlib
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+
+
+def content_etag(body):
+    """Strong ETag derived from the body bytes"""
+    return '"%s"' % hashlib.blake2b(body, digest_size=12).hexdigest()
+
+
+def snapshot_etag(prefix, snapshot, weak=False):
+    """ETag for anything rendered purely from one price snapshot"""
+    # fetched_at keeps tags unique across restarts, when versions start over
+    etag = '"%s-%d-%d"' % (prefix, snapshot.version, int(snapshot.fetched_at * 1000))
+    return 'W/' + etag if weak else etag
+
+
+def variant_etag(etag, encoding):
+    """Each content coding of a body is a different representation with its own tag"""
+    if encoding == 'identity':
+        return etag
+    return '%s-%s"' % (etag[:-1], encoding)
+
+
+def _opaque(tag):
+    # Weak comparison: ignore W/ and any content-coding suffix added by variant_etag
+    tag = tag.strip()
+    if tag.startswith('W/'):
+        tag = tag[2:]
+    for encoding in ('-gzip"', '-br"'):
+        if tag.endswith(encoding):
+            return tag[:-len(encoding)] + '"'
+    return tag
+
+
+def matching_etag(if_none_match, etag):
+    """The tag from If-None-Match that matches etag in any content coding, or None"""
+    if if_none_match.strip() == '*':
+        return etag
+    for tag in if_none_match.split(','):
+        if _opaque(tag) == _opaque(etag):
+            return tag.strip()
+    return None
+
+
+def http_date(timestamp):
+    return formatdate(timestamp, usegmt=True)
+
+
+def is_not_modified(headers, etag=None, last_modified=None):
+    """Whether a conditional GET can be answered with 304 Not Modified"""
+    if_none_match = headers.get('If-None-Match')
+    if if_none_match is not None:
+        # If-None-Match takes precedence over If-Modified-Since (RFC 9110 13.2.2)
+        if etag is None:
+            return False
+        return matching_etag(if_none_match, etag) is not None
+
+    if_modified_since = headers.get('If-Modified-Since')
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(last_modified) <= since
+    return False
+
+
+class FileValidators:
+    """Content-hash ETags for files on disk, recomputed only when a file changes"""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, path, stat=None):
+        """(etag, mtime) for path; raises FileNotFoundError like open()"""
+        stat = os.stat(path) if stat is None else stat
+        key = (stat.st_mtime_ns, stat.st_size)
+        entry = self._entries.get(path)
+        if entry is None or entry[0] != key:
+            with open(path, 'rb') as f:
+                etag = content_etag(f.read())
+            entry = (key, etag)
+            with self._lock:
+                self._entries[path] = entry
+        return entry[1], stat.st_mtime
+
+
+file_validators = FileValidators()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+import os
+import gzip
+import zlib
+import threading
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Bodies smaller than this are sent as-is; compressing them costs more than it saves
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+
+
+def supported_encodings():
+    """Content codings this server can produce, most preferred first"""
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def negotiate(accept_encoding):
+    """Pick the best content coding allowed by an Accept-Encoding header"""
+    if not accept_encoding:
+        return 'identity'
+
+    weights = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        weight = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip().lower()] = weight
+
+    best, best_weight = 'identity', 0.0
+    for coding in supported_encodings():
+        weight = weights.get(coding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+def is_compressible(content_type):
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def compress(body, encoding):
+    """Encode a response body with one of the supported content codings"""
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=6)
+    if encoding == 'br' and brotli is not None:
+        return brotli.compress(body, quality=5)
+    return body
+
+
+class PrecompressedBody:
+    """Static response body whose compressed variants are computed once"""
+
+    def __init__(self, body):
+        self.body = body
+        self._variants = {'identity': body}
+        self._lock = threading.Lock()
+
+    def get(self, encoding='identity'):
+        variant = self._variants.get(encoding)
+        if variant is None:
+            with self._lock:
+                variant = self._variants.get(encoding)
+                if variant is None:
+                    variant = self._variants[encoding] = compress(self.body, encoding)
+        return variant
+
+
+class StreamCompressor:
+    """Incremental compressor for bodies sent in chunks of unknown total size"""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._brotli = brotli.Compressor(quality=5)
+        elif encoding == 'gzip':
+            # wbits=31 writes the gzip header and trailer
+            self._zlib = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        if self.encoding == 'br':
+            return self._brotli.process(data) + self._brotli.flush()
+        if self.encoding == 'gzip':
+            # Sync-flush so every chunk reaches the client as soon as it is written
+            return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+        return data
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self._brotli.finish()
+        if self.encoding == 'gzip':
+            return self._zlib.flush()
+        return b''
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+import os
+import time
+import random
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from price_cache import env_seconds
+
+
+# Connection pool and timeout settings for upstream API calls
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 10))
+HTTP_CONNECT_TIMEOUT = env_seconds('HTTP_CONNECT_TIMEOUT', 3.05)
+HTTP_READ_TIMEOUT = env_seconds('HTTP_READ_TIMEOUT', 10)
+HTTP_MAX_RETRIES = int(os.environ.get('HTTP_MAX_RETRIES', 3))
+HTTP_BACKOFF_BASE = env_seconds('HTTP_BACKOFF_BASE', 0.5)
+HTTP_BACKOFF_MAX = env_seconds('HTTP_BACKOFF_MAX', 8)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class PooledHTTPClient:
+    """Keep-alive connection pool shared by every thread, with retries for 429/5xx"""
+
+    def __init__(self, pool_size=None, connect_timeout=None, read_timeout=None, max_retries=None):
+        pool_size = HTTP_POOL_SIZE if pool_size is None else pool_size
+        self.timeout = (
+            HTTP_CONNECT_TIMEOUT if connect_timeout is None else connect_timeout,
+            HTTP_READ_TIMEOUT if read_timeout is None else read_timeout
+        )
+        self.max_retries = HTTP_MAX_RETRIES if max_retries is None else max_retries
+        # The adapter's urllib3 pool is thread-safe; sessions are not, so each
+        # thread gets its own session mounted on the same adapter
+        self.adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True)
+        self._local = threading.local()
+
+    def session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.mount('https://', self.adapter)
+            session.mount('http://', self.adapter)
+            self._local.session = session
+        return session
+
+    def get(self, url, headers=None, params=None, timeout=None, retries=None):
+        """GET through the pool, retrying connection errors, 429 and 5xx with jittered backoff"""
+        retries = self.max_retries if retries is None else retries
+        for attempt in range(retries + 1):
+            last_attempt = attempt == retries
+            retry_after = None
+            try:
+                response = self.session().get(
+                    url,
+                    headers=headers,
+                    params=params,
+                    timeout=timeout or self.timeout
+                )
+            except (requests.ConnectionError, requests.Timeout):
+                if last_attempt:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or last_attempt:
+                    return response
+                retry_after = response.headers.get('Retry-After')
+                response.close()
+
+            time.sleep(self.backoff(attempt, retry_after))
+
+    def backoff(self, attempt, retry_after=None):
+        """Full-jitter exponential backoff, honouring a numeric Retry-After header"""
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), HTTP_BACKOFF_MAX)
+        return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * (2 ** attempt)))
+
+
+# One pool per process, used for every CoinMarketCap call
+http_client = PooledHTTPClient()
+
+
+def get(url, headers=None, params=None, timeout=None, retries=None):
+    return http_client.get(url, headers=headers, params=params, timeout=timeout, retries=retries)
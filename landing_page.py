@@ -1,11 +1,15 @@
 #!/usr/bin/env python3
 import os
 import json
-import requests
+import http_pool
 import secrets
 import datetime
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from socketserver import ThreadingMixIn
+from price_cache import PriceCache
+from price_refresher import PriceRefresher
+from price_stream import PriceBroadcaster, stream_prices
+from credit_budget import credit_budget
 
 class CryptoAPIService:
     def __init__(self):
@@ -23,15 +27,15 @@ class CryptoAPIService:
                 'X-CMC_PRO_API_KEY': self.api_key,
             }
             
-            response = requests.get(
+            response = http_pool.get(
                 f"{self.base_url}/cryptocurrency/listings/latest",
                 headers=headers,
-                params={'start': '1', 'limit': '6', 'convert': 'USD'},
-                timeout=10
+                params={'start': '1', 'limit': '6', 'convert': 'USD'}
             )
             
             if response.status_code == 200:
                 data = response.json()
+                credit_budget.record_response(data)
                 crypto_list = []
                 for coin in data['data']:
                     crypto_list.append({
@@ -42,9 +46,12 @@ class CryptoAPIService:
                     })
                 return crypto_list
             else:
-                return self.get_demo_data()
-        except:
-            return self.get_demo_data()
+                print(f"API Error: {response.status_code}")
+                return []
+        except Exception as e:
+            # The price cache falls back to its last good or demo data
+            print(f"Error fetching data: {e}")
+            return []
     
     def get_demo_data(self):
         """Demo data when API is not available"""
@@ -57,16 +64,29 @@ class CryptoAPIService:
             {'symbol': 'DOT', 'name': 'Polkadot', 'price': 7.35, 'change_24h': -2.10}
         ]
 
+# Shared by every request so prices are fetched once per TTL
+crypto_service = CryptoAPIService()
+price_cache = PriceCache(
+    crypto_service.get_real_time_prices,
+    key=('/cryptocurrency/listings/latest', 'start=1&limit=6', 'USD'),
+    fallback=crypto_service.get_demo_data
+)
+price_refresher = PriceRefresher(price_cache)
+price_stream = PriceBroadcaster(price_cache)
+
+class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
+    """Handle requests in a separate thread so event streams do not block pages"""
+    allow_reuse_address = True
+    daemon_threads = True
+
 class LandingPageHandler(BaseHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        self.crypto_service = CryptoAPIService()
-        super().__init__(*args, **kwargs)
-    
     def do_GET(self):
         if self.path == '/':
             self.handle_landing_page()
         elif self.path == '/api/crypto/prices':
             self.handle_crypto_api()
+        elif self.path == '/api/crypto/stream':
+            self.handle_price_stream()
         elif self.path == '/login':
             self.handle_login_page()
         elif self.path == '/signup':
@@ -74,6 +94,10 @@ class LandingPageHandler(BaseHTTPRequestHandler):
         else:
             self.send_error(404)
     
+    def handle_price_stream(self):
+        """Server-Sent Events stream of changed quotes"""
+        stream_prices(self, price_stream)
+    
     def handle_crypto_api(self):
         """API endpoint for cryptocurrency prices"""
         self.send_response(200)
@@ -81,11 +105,12 @@ class LandingPageHandler(BaseHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Origin', '*')
         self.end_headers()
         
-        crypto_data = self.crypto_service.get_real_time_prices()
+        snapshot = price_cache.get()
         
         response_data = {
             'success': True,
-            'data': crypto_data,
+            'data': snapshot.data,
+            'cache': price_cache.freshness(snapshot),
             'timestamp': datetime.datetime.utcnow().isoformat() + 'Z'
         }
         
@@ -97,7 +122,7 @@ class LandingPageHandler(BaseHTTPRequestHandler):
         self.send_header('Content-Type', 'text/html; charset=utf-8')
         self.end_headers()
         
-        crypto_data = self.crypto_service.get_real_time_prices()
+        crypto_data = price_cache.get().data
         
         # Generate live price ticker
         price_ticker = ""
@@ -578,15 +603,23 @@ class LandingPageHandler(BaseHTTPRequestHandler):
             }});
         }});
 
-        // Update prices every 30 seconds
-        setInterval(() => {{
-            fetch('/api/crypto/prices')
-                .then(response => response.json())
-                .then(data => {{
-                    console.log('Price data updated:', data.timestamp);
-                }})
-                .catch(error => console.log('Price update failed:', error));
-        }}, 30000);
+        // Prices are pushed as they change; poll only without EventSource
+        if (window.EventSource) {{
+            const priceStream = new EventSource('/api/crypto/stream');
+            priceStream.addEventListener('prices', event => {{
+                const update = JSON.parse(event.data);
+                console.log('Price data updated:', update.version);
+            }});
+        }} else {{
+            setInterval(() => {{
+                fetch('/api/crypto/prices')
+                    .then(response => response.json())
+                    .then(data => {{
+                        console.log('Price data updated:', data.timestamp);
+                    }})
+                    .catch(error => console.log('Price update failed:', error));
+            }}, 30000);
+        }}
     </script>
 </body>
 </html>"""
@@ -814,8 +847,10 @@ class LandingPageHandler(BaseHTTPRequestHandler):
         self.wfile.write(html_content.encode('utf-8'))
 
 def main():
+    price_refresher.start()
+    price_refresher.wait_until_ready(5)
     server_address = ('0.0.0.0', 3000)
-    httpd = HTTPServer(server_address, LandingPageHandler)
+    httpd = ThreadedHTTPServer(server_address, LandingPageHandler)
     print("🚀 RimToken Landing Page Server")
     print("🌐 Running on http://localhost:3000")
     print("✨ Modern landing page with visitor exploration")
@@ -1,11 +1,38 @@
 #!/usr/bin/env python3
 import os
+import argparse
+import io
+import csv
 import json
-import requests
+import http_pool
 import secrets
 import datetime
+import time
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, unquote, urlencode, urlsplit
+from html import escape
+from http.cookies import SimpleCookie
+from price_cache import PriceCache
+from price_refresher import PriceRefresher
+from credit_budget import credit_budget
+from async_server import AsyncHTTPServer
+from prefork import PreforkSupervisor
+from page_template import PrecompiledPage
+from page_cache import RenderedPageCache
+from app_context import AppContext
+from http_compression import COMPRESSION_MIN_SIZE, PrecompressedBody, StreamCompressor, compress, is_compressible, negotiate
+from static_assets import STATIC_CACHE_CONTROL, AssetIndex, parse_range
+from user_store import SORT_FIELDS, DuplicateUserError, UserStore
+from password_hashing import HasherBusy, PasswordHasher
+from sessions import SESSION_COOKIE, SessionStore
+from price_stream import PriceBroadcaster, stream_prices
+from market_gateway import MarketGateway, serve_market
+from timeseries import TimeSeriesStore
+from candles import INTERVALS, CandleBook
+from portfolio import PortfolioEngine
+from deployment_ready import EnvironmentConfig
+from http_cache import content_etag, http_date, is_not_modified, matching_etag, snapshot_etag, variant_etag
 
 class CryptoAPIService:
     def __init__(self):
@@ -23,28 +50,35 @@ class CryptoAPIService:
                 'X-CMC_PRO_API_KEY': self.api_key,
             }
             
-            response = requests.get(
+            response = http_pool.get(
                 f"{self.base_url}/cryptocurrency/listings/latest",
                 headers=headers,
-                params={'start': '1', 'limit': '6', 'convert': 'USD'},
-                timeout=10
+                params={'start': '1', 'limit': '6', 'convert': 'USD'}
             )
             
             if response.status_code == 200:
                 data = response.json()
+                credit_budget.record_response(data)
                 crypto_list = []
                 for coin in data['data']:
+                    quote = coin['quote']['USD']
                     crypto_list.append({
                         'symbol': coin['symbol'],
                         'name': coin['name'],
-                        'price': coin['quote']['USD']['price'],
-                        'change_24h': coin['quote']['USD']['percent_change_24h']
+                        'price': quote['price'],
+                        'change_24h': quote['percent_change_24h'],
+                        'market_cap': quote.get('market_cap'),
+                        'volume_24h': quote.get('volume_24h'),
+                        'last_updated': quote.get('last_updated')
                     })
                 return crypto_list
             else:
-                return self.get_demo_data()
-        except:
-            return self.get_demo_data()
+                print(f"API Error: {response.status_code}")
+                return []
+        except Exception as e:
+            # The price cache falls back to its last good or demo data
+            print(f"Error fetching data: {e}")
+            return []
     
     def get_demo_data(self):
         """Demo data when API is not available"""
@@ -57,13 +91,48 @@ class CryptoAPIService:
             {'symbol': 'ADA', 'name': 'Cardano', 'price': 0.52, 'change_24h': -2.3}
         ]
 
-# Global user storage (in production, this would be a database)
-USERS_DATABASE = []
+# Last-Modified for pages that are fixed for the lifetime of the process
+STARTED_AT = time.time()
+
+# Admin listing: default and largest page, and rows per streamed chunk
+ADMIN_PAGE_SIZE = 50
+ADMIN_MAX_PAGE_SIZE = 500
+ADMIN_STREAM_ROWS = 200
+ADMIN_ROWS_MARKER = '\x00rows\x00'
+# Who may use the admin pages: logged-in users named in ADMIN_USERS
+# (comma-separated), or clients sending ADMIN_TOKEN as a Bearer token.
+# With neither set, nobody can.
+ADMIN_USERS = frozenset(name.strip() for name in os.environ.get('ADMIN_USERS', '').split(',') if name.strip())
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+
+# Most rows one price history response may carry
+HISTORY_MAX_POINTS = 5000
+
+# Persistent connections: how long an idle connection is kept open and how
+# many requests one connection may carry before the server closes it
+KEEPALIVE_TIMEOUT = float(os.environ.get('KEEPALIVE_TIMEOUT', 15))
+KEEPALIVE_MAX_REQUESTS = int(os.environ.get('KEEPALIVE_MAX_REQUESTS', 100))
 
 class LandingPageHandler(BaseHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        self.crypto_service = CryptoAPIService()
-        super().__init__(*args, **kwargs)
+    # Every response carries Content-Length, so connections can be reused
+    protocol_version = 'HTTP/1.1'
+    timeout = KEEPALIVE_TIMEOUT
+    # Headers and body are separate writes; don't let Nagle hold back the body
+    disable_nagle_algorithm = True
+    requests_served = 0
+    
+    @property
+    def app(self):
+        return self.server.app
+    
+    def handle_one_request(self):
+        self.requests_served += 1
+        super().handle_one_request()
+    
+    def send_response(self, code, message=None):
+        super().send_response(code, message)
+        if code != 101 and self.requests_served >= KEEPALIVE_MAX_REQUESTS:
+            self.send_header('Connection', 'close')
     
     def do_GET(self):
         if self.path == '/':
@@ -74,12 +143,26 @@ class LandingPageHandler(BaseHTTPRequestHandler):
             self.handle_login_page()
         elif self.path == '/api/crypto/prices':
             self.handle_crypto_api()
+        elif self.path == '/api/crypto/stream':
+            self.handle_price_stream()
+        elif self.path == '/ws/market':
+            self.handle_market_socket()
+        elif urlsplit(self.path).path == '/api/crypto/history':
+            self.handle_price_history()
+        elif urlsplit(self.path).path == '/api/crypto/candles':
+            self.handle_candles()
         elif self.path == '/logo.gif':
             self.handle_logo_image()
         elif self.path.startswith('/team-photos/'):
             self.handle_team_photo()
-        elif self.path == '/admin/users':
+        elif urlsplit(self.path).path == '/admin/users':
             self.handle_admin_users()
+        elif urlsplit(self.path).path == '/admin/users/export':
+            self.handle_admin_export()
+        elif self.path == '/api/me':
+            self.handle_me_api()
+        elif self.path.startswith('/api/portfolio/'):
+            self.handle_portfolio_api()
         else:
             self.send_error(404)
     
@@ -88,67 +171,259 @@ class LandingPageHandler(BaseHTTPRequestHandler):
             self.handle_register_api()
         elif self.path == '/api/login':
             self.handle_login_api()
+        elif self.path == '/api/logout':
+            self.handle_logout_api()
         else:
             self.send_error(404)
     
+    def send_content(self, body, content_type, status=200, variants=None, headers=(),
+                     etag=None, last_modified=None, cache_control=None):
+        """Send a complete response, compressed when the client and the body allow it"""
+        # variants(encoding) returns a cached compressed copy of body, if the caller has one
+        if self.not_modified(etag, last_modified, cache_control):
+            return
+        
+        compressible = is_compressible(content_type)
+        encoding = 'identity'
+        if compressible and len(body) >= COMPRESSION_MIN_SIZE:
+            encoding = negotiate(self.headers.get('Accept-Encoding'))
+            if encoding != 'identity':
+                body = variants(encoding) if variants else compress(body, encoding)
+        
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        if compressible:
+            self.send_header('Vary', 'Accept-Encoding')
+        if encoding != 'identity':
+            self.send_header('Content-Encoding', encoding)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_validators(variant_etag(etag, encoding) if etag else None, last_modified, cache_control)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+    
+    def not_modified(self, etag, last_modified=None, cache_control=None):
+        """Answer 304 when the client's copy is still current; True if it did"""
+        # Called before rendering or reading files, so a hit costs almost nothing
+        if self.command not in ('GET', 'HEAD') or not is_not_modified(self.headers, etag, last_modified):
+            return False
+        
+        self.send_response(304)
+        # Echo the representation the client holds, including its content coding
+        matched = matching_etag(self.headers.get('If-None-Match', ''), etag) if etag else None
+        self.send_validators(matched or etag, last_modified, cache_control)
+        self.end_headers()
+        return True
+    
+    def send_validators(self, etag, last_modified, cache_control):
+        if etag:
+            self.send_header('ETag', etag)
+        if last_modified:
+            self.send_header('Last-Modified', http_date(last_modified))
+        if cache_control:
+            self.send_header('Cache-Control', cache_control)
+    
+    def send_asset(self, asset):
+        """Serve an indexed static file, honouring conditional and Range requests"""
+        if asset is None:
+            self.send_error(404)
+            return
+        if self.not_modified(asset.etag, asset.mtime, STATIC_CACHE_CONTROL):
+            return
+        
+        # If-Range: only send a partial body if the client's copy is still current
+        byte_range = None
+        if_range = self.headers.get('If-Range')
+        if not if_range or if_range.strip() == asset.etag:
+            byte_range = parse_range(self.headers.get('Range'), asset.size)
+        
+        if byte_range is False:
+            self.send_response(416)
+            self.send_header('Content-Range', f'bytes */{asset.size}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        
+        start, end = byte_range or (0, asset.size - 1)
+        length = end - start + 1
+        self.send_response(206 if byte_range else 200)
+        for name, value in asset.headers:
+            self.send_header(name, value)
+        if byte_range:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{asset.size}')
+        self.send_header('Content-Length', str(length))
+        self.end_headers()
+        if self.command == 'HEAD' or not length:
+            return
+        
+        if asset.data is not None:
+            self.wfile.write(asset.data[start:end + 1])
+            return
+        
+        with open(asset.path, 'rb') as f:
+            # Large files go from the page cache straight to the socket; the asyncio
+            # engine has no socket to hand out, so copy through its wfile in pieces
+            connection = getattr(self, 'connection', None)
+            if connection is not None and hasattr(os, 'sendfile'):
+                self.wfile.flush()
+                offset = start
+                while offset <= end:
+                    sent = os.sendfile(connection.fileno(), f.fileno(), offset, end + 1 - offset)
+                    if not sent:
+                        break
+                    offset += sent
+            else:
+                f.seek(start)
+                while length > 0:
+                    data = f.read(min(length, 64 * 1024))
+                    if not data:
+                        break
+                    self.wfile.write(data)
+                    length -= len(data)
+    
+    def begin_chunked(self, content_type, status=200, headers=()):
+        """Start a response whose body is written piece by piece with write_chunk"""
+        encoding = 'identity'
+        if is_compressible(content_type):
+            encoding = negotiate(self.headers.get('Accept-Encoding'))
+        self._stream = StreamCompressor(encoding)
+        # HTTP/1.0 clients cannot parse chunked framing; end their body by closing
+        self._chunked = self.request_version == 'HTTP/1.1'
+        
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        if is_compressible(content_type):
+            self.send_header('Vary', 'Accept-Encoding')
+        if encoding != 'identity':
+            self.send_header('Content-Encoding', encoding)
+        for name, value in headers:
+            self.send_header(name, value)
+        if self._chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+    
+    def write_chunk(self, data):
+        data = self._stream.compress(data)
+        if not data or self.command == 'HEAD':
+            return
+        if self._chunked:
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        else:
+            self.wfile.write(data)
+    
+    def end_chunked(self):
+        data = self._stream.finish()
+        if self.command == 'HEAD':
+            return
+        if self._chunked:
+            self.wfile.write(b'%x\r\n%s\r\n0\r\n\r\n' % (len(data), data) if data else b'0\r\n\r\n')
+        elif data:
+            self.wfile.write(data)
+    
+    def send_json(self, status, payload, headers=()):
+        self.send_content(json.dumps(payload).encode('utf-8'), 'application/json', status, headers=headers)
+    
     def handle_crypto_api(self):
         """API endpoint for cryptocurrency prices"""
-        self.send_response(200)
-        self.send_header('Content-Type', 'application/json; charset=utf-8')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-        
-        crypto_data = self.crypto_service.get_real_time_prices()
+        snapshot = self.app.price_cache.get()
+        # The body only changes with the snapshot (apart from the timestamp), so
+        # the page's 30 s poll gets a 304 until new prices are published
+        etag = snapshot_etag('prices', snapshot, weak=True)
+        last_modified = snapshot.fetched_at or None
+        if self.not_modified(etag, last_modified, 'no-cache'):
+            return
         
         response_data = {
             'status': 'success',
-            'data': crypto_data,
+            'data': snapshot.data,
+            'cache': self.app.price_cache.freshness(snapshot),
             'timestamp': datetime.datetime.utcnow().isoformat() + 'Z'
         }
         
-        self.wfile.write(json.dumps(response_data, ensure_ascii=False).encode('utf-8'))
+        self.send_content(
+            json.dumps(response_data, ensure_ascii=False).encode('utf-8'),
+            'application/json; charset=utf-8',
+            headers=[('Access-Control-Allow-Origin', '*')],
+            etag=etag,
+            last_modified=last_modified,
+            cache_control='no-cache'
+        )
+    
+    def handle_price_stream(self):
+        """Server-Sent Events stream of changed quotes"""
+        stream_prices(self, self.app.price_stream)
+    
+    def handle_price_history(self):
+        """Stored quotes for one symbol, column by column, from the local time-series store"""
+        params = parse_qs(urlsplit(self.path).query)
+        symbol = params.get('symbol', [''])[0].strip().upper()
+        try:
+            start = float(params['from'][0]) if 'from' in params else None
+            end = float(params['to'][0]) if 'to' in params else None
+            limit = min(max(1, int(params.get('limit', [HISTORY_MAX_POINTS])[0])), HISTORY_MAX_POINTS)
+        except ValueError:
+            self.send_json(400, {'status': 'error', 'message': 'from and to are epoch seconds, limit a number'})
+            return
+        if not symbol:
+            self.send_json(400, {'status': 'error', 'message': 'symbol is required'})
+            return
+        
+        columns = self.app.price_history.query(symbol, start, end, limit=limit)
+        # Missing values are stored as NaN, which JSON cannot carry
+        self.send_json(200, {
+            'status': 'success',
+            'symbol': symbol,
+            'count': len(columns['ts']),
+            'columns': {name: [None if value != value else value for value in values]
+                        for name, values in columns.items()}
+        }, headers=[('Access-Control-Allow-Origin', '*'), ('Cache-Control', 'no-cache')])
+    
+    def handle_candles(self):
+        """OHLCV candles for one symbol at 1m, 5m, 1h or 1d"""
+        params = parse_qs(urlsplit(self.path).query)
+        symbol = params.get('symbol', [''])[0].strip().upper()
+        interval = params.get('interval', ['1h'])[0]
+        try:
+            start = float(params['from'][0]) if 'from' in params else None
+            end = float(params['to'][0]) if 'to' in params else None
+        except ValueError:
+            self.send_json(400, {'status': 'error', 'message': 'from and to are epoch seconds'})
+            return
+        if not symbol or interval not in INTERVALS:
+            self.send_json(400, {'status': 'error', 'message': f"symbol is required and interval is one of {', '.join(INTERVALS)}"})
+            return
+        
+        candles = self.app.candle_book.candles(symbol, interval, start, end)
+        self.send_json(200, {
+            'status': 'success',
+            'symbol': symbol,
+            'interval': interval,
+            'count': len(candles['t']),
+            'candles': {name: [None if value != value else value for value in values]
+                        for name, values in candles.items()}
+        }, headers=[('Access-Control-Allow-Origin', '*'), ('Cache-Control', 'no-cache')])
+    
+    def handle_market_socket(self):
+        """WebSocket market data for the trading dashboard"""
+        serve_market(self, self.app.market_gateway)
     
     def handle_logo_image(self):
         """Serve the logo image"""
-        try:
-            with open('attached_assets/unnamed.gif', 'rb') as f:
-                image_data = f.read()
-            
-            self.send_response(200)
-            self.send_header('Content-Type', 'image/gif')
-            self.send_header('Content-Length', str(len(image_data)))
-            self.end_headers()
-            self.wfile.write(image_data)
-        except FileNotFoundError:
-            self.send_error(404)
+        self.send_asset(self.app.static_assets.get('unnamed.gif'))
     
     def handle_team_photo(self):
         """Serve team member photos"""
-        try:
-            # Extract filename from URL path
-            filename = self.path.split('/')[-1]
-            file_path = f'attached_assets/{filename}'
-            
-            with open(file_path, 'rb') as f:
-                image_data = f.read()
-            
-            # Determine content type based on file extension
-            if filename.lower().endswith('.jpg') or filename.lower().endswith('.jpeg'):
-                content_type = 'image/jpeg'
-            elif filename.lower().endswith('.png'):
-                content_type = 'image/png'
-            elif filename.lower().endswith('.gif'):
-                content_type = 'image/gif'
-            else:
-                content_type = 'image/jpeg'  # Default
-            
-            self.send_response(200)
-            self.send_header('Content-Type', content_type)
-            self.send_header('Content-Length', str(len(image_data)))
-            self.end_headers()
-            self.wfile.write(image_data)
-        except FileNotFoundError:
-            self.send_error(404)
+        # Only names present in the asset index are served, so encoded
+        # separators or dot segments can never reach outside attached_assets
+        filename = unquote(urlsplit(self.path).path[len('/team-photos/'):])
+        asset = self.app.static_assets.get(filename)
+        if asset is not None and not asset.content_type.startswith('image/'):
+            asset = None
+        self.send_asset(asset)
     
     def handle_register_api(self):
         """Handle user registration POST requests"""
@@ -163,57 +438,37 @@ class LandingPageHandler(BaseHTTPRequestHandler):
             
             # Basic validation
             if not username or not email or not password:
-                self.send_response(400)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                response = {'success': False, 'message': 'All fields are required'}
-                self.wfile.write(json.dumps(response).encode('utf-8'))
+                self.send_json(400, {'success': False, 'message': 'All fields are required'})
                 return
             
             if len(password) < 6:
-                self.send_response(400)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                response = {'success': False, 'message': 'Password must be at least 6 characters'}
-                self.wfile.write(json.dumps(response).encode('utf-8'))
+                self.send_json(400, {'success': False, 'message': 'Password must be at least 6 characters'})
                 return
             
-            # Check if username already exists
-            for user in USERS_DATABASE:
-                if user['username'] == username:
-                    self.send_response(400)
-                    self.send_header('Content-Type', 'application/json')
-                    self.end_headers()
-                    response = {'success': False, 'message': 'Username already exists'}
-                    self.wfile.write(json.dumps(response).encode('utf-8'))
-                    return
+            # Cheap early rejection before spending a hash on a taken name
+            if self.app.user_store.by_username(username) is not None:
+                self.send_json(400, {'success': False, 'message': 'Username already exists'})
+                return
             
-            # Store user data
-            user_data = {
-                'id': len(USERS_DATABASE) + 1,
-                'username': username,
-                'email': email,
-                'password': password,  # In production, this would be hashed
-                'created_at': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            }
-            USERS_DATABASE.append(user_data)
+            # Store user data; the duplicate check and id allocation are atomic
+            try:
+                self.app.user_store.add(username, email, self.app.password_hasher.hash(password))
+            except HasherBusy:
+                self.send_json(503, {'success': False, 'message': 'Server busy, please retry'}, [('Retry-After', '1')])
+                return
+            except DuplicateUserError as e:
+                message = 'Username already exists' if e.field == 'username' else 'Email already registered'
+                self.send_json(400, {'success': False, 'message': message})
+                return
             
-            self.send_response(201)
-            self.send_header('Content-Type', 'application/json')
-            self.end_headers()
-            response = {
+            self.send_json(201, {
                 'success': True, 
                 'message': 'Account created successfully',
                 'user': {'username': username, 'email': email}
-            }
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+            })
             
         except Exception as e:
-            self.send_response(500)
-            self.send_header('Content-Type', 'application/json')
-            self.end_headers()
-            response = {'success': False, 'message': 'Registration failed'}
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+            self.send_json(500, {'success': False, 'message': 'Registration failed'})
     
     def handle_login_api(self):
         """Handle user login POST requests"""
@@ -227,38 +482,92 @@ class LandingPageHandler(BaseHTTPRequestHandler):
             
             # Basic validation
             if not username or not password:
-                self.send_response(400)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                response = {'success': False, 'message': 'Username and password are required'}
-                self.wfile.write(json.dumps(response).encode('utf-8'))
+                self.send_json(400, {'success': False, 'message': 'Username and password are required'})
                 return
             
-            # For now, simulate successful login
-            # In a real implementation, this would verify against the database
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.end_headers()
-            response = {
+            user = self.app.user_store.by_username(username)
+            try:
+                verified = self.app.password_hasher.verify(password, user['password_hash'] if user else None)
+            except HasherBusy:
+                self.send_json(503, {'success': False, 'message': 'Server busy, please retry'}, [('Retry-After', '1')])
+                return
+            
+            if not verified:
+                self.send_json(401, {'success': False, 'message': 'Invalid username or password'})
+                return
+            
+            token = self.app.session_store.create(user)
+            self.send_json(200, {
                 'success': True, 
                 'message': 'Login successful',
-                'user': {'username': username}
-            }
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+                'user': {'username': username},
+                'token': token
+            }, [('Set-Cookie', f'{SESSION_COOKIE}={token}; Max-Age={self.app.session_store.ttl}; Path=/; HttpOnly; SameSite=Lax')])
             
         except Exception as e:
-            self.send_response(500)
-            self.send_header('Content-Type', 'application/json')
-            self.end_headers()
-            response = {'success': False, 'message': 'Login failed'}
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+            self.send_json(500, {'success': False, 'message': 'Login failed'})
+    
+    def session_token(self):
+        """Session token from the Authorization header or the session cookie"""
+        authorization = self.headers.get('Authorization', '')
+        if authorization.startswith('Bearer '):
+            return authorization[7:].strip()
+        cookie = SimpleCookie(self.headers.get('Cookie', ''))
+        return cookie[SESSION_COOKIE].value if SESSION_COOKIE in cookie else None
+    
+    def current_session(self):
+        # An HMAC check and a dict lookup; the password is never rehashed
+        return self.app.session_store.get(self.session_token(), load_user=self.app.user_store.get)
+    
+    def handle_me_api(self):
+        """Return the logged-in user for a valid session"""
+        session = self.current_session()
+        if session is None:
+            self.send_json(401, {'success': False, 'message': 'Not logged in'})
+            return
+        user = self.app.user_store.get(session['user_id'])
+        self.send_json(200, {
+            'success': True,
+            'user': {'id': user['id'], 'username': user['username'], 'email': user['email']}
+        })
+    
+    def handle_portfolio_api(self):
+        """Valuation of the logged-in user's holdings at current prices"""
+        session = self.current_session()
+        if session is None:
+            self.send_json(401, {'success': False, 'message': 'Not logged in'})
+            return
+        # /api/portfolio/me, or the user's own username or id
+        name = unquote(urlsplit(self.path).path[len('/api/portfolio/'):])
+        if name not in ('me', session['username'], str(session['user_id'])):
+            self.send_json(403, {'success': False, 'message': 'Portfolios are private'})
+            return
+        
+        portfolio = self.app.portfolio_engine.portfolio(session['user_id'])
+        self.send_json(200, dict(portfolio, success=True, user=session['username']),
+                       headers=[('Cache-Control', 'no-store')])
+    
+    def handle_logout_api(self):
+        """End the current session"""
+        token = self.session_token()
+        if token:
+            self.app.session_store.revoke(token)
+        self.send_json(200, {'success': True, 'message': 'Logged out'},
+                       [('Set-Cookie', f'{SESSION_COOKIE}=; Max-Age=0; Path=/; HttpOnly; SameSite=Lax')])
     
     def handle_register_page(self):
         """Registration page for new users"""
-        self.send_response(200)
-        self.send_header('Content-Type', 'text/html; charset=utf-8')
-        self.end_headers()
-        
+        # Static page: encoded and compressed once, not per request
+        self.send_content(
+            REGISTER_PAGE.body,
+            'text/html; charset=utf-8',
+            variants=REGISTER_PAGE.get,
+            etag=REGISTER_PAGE_ETAG,
+            last_modified=STARTED_AT
+        )
+    
+    @staticmethod
+    def register_page_template():
         html_content = f"""<!DOCTYPE html>
 <html lang="en" dir="ltr">
 <head>
@@ -536,14 +845,21 @@ class LandingPageHandler(BaseHTTPRequestHandler):
 </body>
 </html>"""
         
-        self.wfile.write(html_content.encode('utf-8'))
+        return html_content
     
     def handle_login_page(self):
         """Login page for existing users"""
-        self.send_response(200)
-        self.send_header('Content-Type', 'text/html; charset=utf-8')
-        self.end_headers()
-        
+        # Static page: encoded and compressed once, not per request
+        self.send_content(
+            LOGIN_PAGE.body,
+            'text/html; charset=utf-8',
+            variants=LOGIN_PAGE.get,
+            etag=LOGIN_PAGE_ETAG,
+            last_modified=STARTED_AT
+        )
+    
+    @staticmethod
+    def login_page_template():
         html_content = f"""<!DOCTYPE html>
 <html lang="en" dir="ltr">
 <head>
@@ -794,34 +1110,140 @@ class LandingPageHandler(BaseHTTPRequestHandler):
 </body>
 </html>"""
         
-        self.wfile.write(html_content.encode('utf-8'))
+        return html_content
+    
+    def admin_query(self):
+        """Search, sort field and direction from the admin page query string"""
+        params = parse_qs(urlsplit(self.path).query)
+        search = params.get('q', [''])[0].strip()
+        sort = params.get('sort', ['id'])[0]
+        if sort not in SORT_FIELDS:
+            sort = 'id'
+        descending = params.get('order', ['asc'])[0] == 'desc'
+        return params, search, sort, descending
+    
+    def require_admin(self):
+        """True if the request may use the admin pages; otherwise answers 401 or 403"""
+        token = self.session_token()
+        if ADMIN_TOKEN and token and secrets.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+            return True
+        session = self.current_session()
+        if session is None:
+            self.send_error(401, 'Admin login required')
+            return False
+        if session['username'] not in ADMIN_USERS:
+            self.send_error(403, 'Admin access required')
+            return False
+        return True
     
     def handle_admin_users(self):
-        """Admin panel to view all registered users"""
-        self.send_response(200)
-        self.send_header('Content-Type', 'text/html; charset=utf-8')
-        self.end_headers()
-        
-        # Generate user rows for the table
-        user_rows = ""
-        for user in USERS_DATABASE:
-            user_rows += f"""
+        """Admin panel to view registered users, one page at a time"""
+        if not self.require_admin():
+            return
+        params, search, sort, descending = self.admin_query()
+        try:
+            page = max(1, int(params.get('page', ['1'])[0]))
+            per_page = min(max(1, int(params.get('per_page', [ADMIN_PAGE_SIZE])[0])), ADMIN_MAX_PAGE_SIZE)
+        except ValueError:
+            page, per_page = 1, ADMIN_PAGE_SIZE
+        
+        total, users = self.app.user_store.query(search, sort, descending, (page - 1) * per_page, per_page)
+        pages = max(1, -(-total // per_page))
+        
+        def link(**changes):
+            query = {'q': search, 'sort': sort, 'order': 'desc' if descending else 'asc',
+                     'page': page, 'per_page': per_page}
+            query.update(changes)
+            return '?' + urlencode({key: value for key, value in query.items() if value != ''})
+        
+        headers = {}
+        for field, label in (('id', 'ID'), ('username', 'Username'), ('email', 'Email'), ('created_at', 'Registration Date')):
+            order = 'desc' if field == sort and not descending else 'asc'
+            arrow = (' ▼' if descending else ' ▲') if field == sort else ''
+            headers[field] = f'<a href="{link(sort=field, order=order, page=1)}">{label}{arrow}</a>'
+        
+        export_query = urlencode({'q': search, 'sort': sort, 'order': 'desc' if descending else 'asc'})
+        toolbar = f"""<form method="get" action="/admin/users">
+                <input type="search" name="q" value="{escape(search)}" placeholder="Search username or email">
+                <input type="hidden" name="sort" value="{sort}">
+                <input type="hidden" name="order" value="{'desc' if descending else 'asc'}">
+            </form>
+            <span>Export: <a href="/admin/users/export?format=csv&amp;{escape(export_query)}">CSV</a> ·
+                <a href="/admin/users/export?format=json&amp;{escape(export_query)}">JSON</a></span>"""
+        
+        pagination = f'<span>Page {page} of {pages} ({total} users)</span>'
+        if page > 1:
+            pagination = f'<a href="{escape(link(page=page - 1))}">← Previous</a>' + pagination
+        if page < pages:
+            pagination += f'<a href="{escape(link(page=page + 1))}">Next →</a>'
+        
+        # Everything around the rows is rendered once; rows are streamed in chunks
+        html_content = self.admin_page_template(self.app.user_store.stats(), ADMIN_ROWS_MARKER, headers, toolbar, pagination)
+        head, tail = html_content.split(ADMIN_ROWS_MARKER)
+        
+        self.begin_chunked('text/html; charset=utf-8', headers=[('Cache-Control', 'no-cache')])
+        self.write_chunk(head.encode('utf-8'))
+        if not users:
+            self.write_chunk(b"""
                 <tr>
-                    <td>{user['id']}</td>
-                    <td>{user['username']}</td>
-                    <td>{user['email']}</td>
-                    <td>{user['created_at']}</td>
+                    <td colspan="4" style="text-align: center; color: #666;">No users registered yet</td>
                 </tr>
-            """
-        
-        if not user_rows:
-            user_rows = """
+            """)
+        for offset in range(0, len(users), ADMIN_STREAM_ROWS):
+            self.write_chunk(''.join(
+                f"""
                 <tr>
-                    <td colspan="4" style="text-align: center; color: #666;">No users registered yet</td>
+                    <td>{user['id']}</td>
+                    <td>{escape(user['username'])}</td>
+                    <td>{escape(user['email'])}</td>
+                    <td>{user['created_at']}</td>
                 </tr>
-            """
-        
-        html_content = f"""<!DOCTYPE html>
+            """ for user in users[offset:offset + ADMIN_STREAM_ROWS]).encode('utf-8'))
+        self.write_chunk(tail.encode('utf-8'))
+        self.end_chunked()
+    
+    def handle_admin_export(self):
+        """Stream every matching user as CSV or JSON"""
+        if not self.require_admin():
+            return
+        params, search, sort, descending = self.admin_query()
+        export_format = params.get('format', ['json'])[0]
+        users = self.app.user_store.iter_users(search, sort, descending)
+        fields = ('id', 'username', 'email', 'created_at')
+        
+        if export_format == 'csv':
+            self.begin_chunked('text/csv; charset=utf-8', headers=[
+                ('Content-Disposition', 'attachment; filename="users.csv"')
+            ])
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(fields)
+            for count, user in enumerate(users, 1):
+                writer.writerow([user[field] for field in fields])
+                if count % ADMIN_STREAM_ROWS == 0:
+                    self.write_chunk(buffer.getvalue().encode('utf-8'))
+                    buffer.seek(0)
+                    buffer.truncate()
+            self.write_chunk(buffer.getvalue().encode('utf-8'))
+        else:
+            self.begin_chunked('application/json; charset=utf-8', headers=[
+                ('Content-Disposition', 'attachment; filename="users.json"')
+            ])
+            batch = []
+            separator = '['
+            for user in users:
+                batch.append(separator + json.dumps({field: user[field] for field in fields}, ensure_ascii=False))
+                separator = ','
+                if len(batch) == ADMIN_STREAM_ROWS:
+                    self.write_chunk('\n'.join(batch).encode('utf-8'))
+                    batch = []
+            batch.append(']' if separator == ',' else '[]')
+            self.write_chunk('\n'.join(batch).encode('utf-8'))
+        self.end_chunked()
+    
+    @staticmethod
+    def admin_page_template(stats, user_rows, headers, toolbar, pagination):
+        return f"""<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
@@ -970,6 +1392,36 @@ class LandingPageHandler(BaseHTTPRequestHandler):
         .refresh-btn:hover {{
             background: rgba(255, 255, 255, 0.2);
         }}
+        
+        .toolbar {{
+            display: flex;
+            flex-wrap: wrap;
+            gap: 1rem;
+            align-items: center;
+            justify-content: space-between;
+            margin-bottom: 1rem;
+        }}
+        
+        .toolbar input {{
+            background: rgba(255, 255, 255, 0.1);
+            color: white;
+            border: 1px solid rgba(255, 255, 255, 0.2);
+            border-radius: 8px;
+            padding: 0.6rem 1rem;
+        }}
+        
+        .toolbar a, .pagination a, th a {{
+            color: #4fd1c7;
+            text-decoration: none;
+        }}
+        
+        .pagination {{
+            display: flex;
+            gap: 1.5rem;
+            justify-content: center;
+            align-items: center;
+            color: rgba(255, 255, 255, 0.8);
+        }}
     </style>
 </head>
 <body>
@@ -984,19 +1436,23 @@ class LandingPageHandler(BaseHTTPRequestHandler):
         
         <div class="stats-grid">
             <div class="stat-card">
-                <div class="stat-number">{len(USERS_DATABASE)}</div>
+                <div class="stat-number">{stats['total']}</div>
                 <div class="stat-label">Total Registered Users</div>
             </div>
             <div class="stat-card">
-                <div class="stat-number">{len([u for u in USERS_DATABASE if datetime.datetime.now().strftime('%Y-%m-%d') in u.get('created_at', '')])}</div>
+                <div class="stat-number">{stats['today']}</div>
                 <div class="stat-label">Registered Today</div>
             </div>
             <div class="stat-card">
-                <div class="stat-number">{len(set(u['email'].split('@')[1] for u in USERS_DATABASE if '@' in u['email']))}</div>
+                <div class="stat-number">{stats['domains']}</div>
                 <div class="stat-label">Email Domains</div>
             </div>
         </div>
         
+        <div class="toolbar">
+            {toolbar}
+        </div>
+        
         <div class="users-table">
             <div class="table-header">
                 Registered Users
@@ -1005,10 +1461,10 @@ class LandingPageHandler(BaseHTTPRequestHandler):
             <table>
                 <thead>
                     <tr>
-                        <th>ID</th>
-                        <th>Username</th>
-                        <th>Email</th>
-                        <th>Registration Date</th>
+                        <th>{headers['id']}</th>
+                        <th>{headers['username']}</th>
+                        <th>{headers['email']}</th>
+                        <th>{headers['created_at']}</th>
                     </tr>
                 </thead>
                 <tbody>
@@ -1016,88 +1472,68 @@ class LandingPageHandler(BaseHTTPRequestHandler):
                 </tbody>
             </table>
         </div>
+        
+        <div class="pagination">
+            {pagination}
+        </div>
     </div>
 </body>
 </html>"""
-        
-        self.wfile.write(html_content.encode('utf-8'))
     
     def handle_landing_page(self):
         """Single-page website with all sections accessible by scrolling"""
-        self.send_response(200)
-        self.send_header('Content-Type', 'text/html; charset=utf-8')
-        self.end_headers()
-        
-        crypto_data = self.crypto_service.get_real_time_prices()
-        
-        # Generate live price ticker for moving ticker
-        ticker_items = ""
+        # The page only changes when prices do, so it is rendered once per snapshot
+        snapshot = self.app.price_cache.get()
+        etag = snapshot_etag('page', snapshot)
+        last_modified = snapshot.fetched_at or STARTED_AT
+        if self.not_modified(etag, last_modified, 'no-cache'):
+            return
+        
+        self.send_content(
+            self.app.landing_page_cache.get(snapshot),
+            'text/html; charset=utf-8',
+            variants=lambda encoding: self.app.landing_page_cache.get(snapshot, encoding),
+            etag=etag,
+            last_modified=last_modified,
+            cache_control='no-cache'
+        )
+    
+    @staticmethod
+    def render_ticker_items(crypto_data):
+        """Live price ticker for the moving ticker bar"""
+        items = []
         for coin in crypto_data:
             change_class = "positive" if coin['change_24h'] >= 0 else "negative"
             change_symbol = "+" if coin['change_24h'] >= 0 else ""
-            ticker_items += f"""
+            items.append(f"""
                 <div class="ticker-item">
                     <span class="ticker-symbol">{coin['symbol']}</span>
                     <span class="ticker-price">${coin['price']:,.2f}</span>
                     <span class="ticker-change {change_class}">{change_symbol}{coin['change_24h']:.2f}%</span>
                 </div>
-            """
-        
-        # Generate live price grid for home section
-        price_ticker = ""
-        for coin in crypto_data[:4]:
+            """)
+        return "".join(items)
+    
+    @staticmethod
+    def render_price_grid(crypto_data):
+        """Live price grid for the home section"""
+        items = []
+        for coin in crypto_data:
             change_class = "positive" if coin['change_24h'] >= 0 else "negative"
             change_symbol = "+" if coin['change_24h'] >= 0 else ""
-            price_ticker += f"""
+            items.append(f"""
                 <div class="crypto-item">
                     <div class="crypto-symbol">{coin['symbol']}</div>
                     <div class="crypto-name">{coin['name']}</div>
                     <div class="crypto-price">${coin['price']:,.2f}</div>
                     <div class="crypto-change {change_class}">{change_symbol}{coin['change_24h']:.2f}%</div>
                 </div>
-            """
-        
-        # Generate portfolio items for wallet section
-        user_balances = {
-            'BTC': {'amount': 0.001524896, 'icon': '₿'},
-            'ETH': {'amount': 0.15642, 'icon': 'Ξ'},
-            'BNB': {'amount': 2.48632, 'icon': 'BNB'},
-            'SOL': {'amount': 5.8741, 'icon': 'SOL'},
-            'USDT': {'amount': 1847.23, 'icon': 'T'},
-            'ADA': {'amount': 328.47, 'icon': 'ADA'}
-        }
-        
-        portfolio_items = ""
-        total_value = 0
-        
-        for coin in crypto_data:
-            if coin['symbol'] in user_balances:
-                user_data = user_balances[coin['symbol']]
-                balance = user_data['amount']
-                value = balance * coin['price']
-                total_value += value
-                change_class = "positive" if coin['change_24h'] >= 0 else "negative"
-                change_symbol = "+" if coin['change_24h'] >= 0 else ""
-                
-                portfolio_items += f"""
-                    <div class="portfolio-item">
-                        <div class="coin-icon">
-                            <div class="icon-circle">{user_data['icon']}</div>
-                        </div>
-                        <div class="coin-details">
-                            <div class="coin-name">{coin['name']}</div>
-                            <div class="coin-symbol">{coin['symbol']}</div>
-                        </div>
-                        <div class="coin-balance">
-                            <div class="balance-amount">${value:,.2f}</div>
-                            <div class="balance-tokens">{balance:.6f} {coin['symbol']}</div>
-                        </div>
-                        <div class="coin-change {change_class}">
-                            {change_symbol}{coin['change_24h']:.2f}%
-                        </div>
-                    </div>
-                """
-        
+            """)
+        return "".join(items)
+    
+    @staticmethod
+    def landing_page_template(ticker_items, price_ticker):
+        """Full landing page markup; rendered once at startup by PrecompiledPage"""
         html_content = f"""<!DOCTYPE html>
 <html lang="en">
 <head>
@@ -2735,8 +3171,8 @@ class LandingPageHandler(BaseHTTPRequestHandler):
                 <div class="swap-form">
                     <div style="margin-bottom: 1rem;">
                         <label style="display: block; margin-bottom: 0.5rem; opacity: 0.8;">From</label>
-                        <input type="text" class="swap-input" placeholder="0.0" value="1.0">
-                        <select class="swap-input" style="margin-top: 0.5rem;">
+                        <input type="text" id="swapFromAmount" class="swap-input" placeholder="0.0" value="1.0">
+                        <select id="swapFromSymbol" class="swap-input" style="margin-top: 0.5rem;">
                             <option>ETH - Ethereum</option>
                             <option>BTC - Bitcoin</option>
                             <option>BNB - BNB</option>
@@ -2749,14 +3185,15 @@ class LandingPageHandler(BaseHTTPRequestHandler):
                     
                     <div style="margin-bottom: 2rem;">
                         <label style="display: block; margin-bottom: 0.5rem; opacity: 0.8;">To</label>
-                        <input type="text" class="swap-input" placeholder="0.0" value="2,847.23">
-                        <select class="swap-input" style="margin-top: 0.5rem;">
+                        <input type="text" id="swapToAmount" class="swap-input" placeholder="0.0" value="2,847.23">
+                        <select id="swapToSymbol" class="swap-input" style="margin-top: 0.5rem;">
                             <option>USDT - Tether USD</option>
                             <option>USDC - USD Coin</option>
                             <option>DAI - Dai</option>
                         </select>
                     </div>
                     
+                    <div id="swapRate" style="margin-bottom: 1rem; opacity: 0.8;"></div>
                     <button class="swap-button">Swap Tokens</button>
                 </div>
             </div>
@@ -2868,9 +3305,9 @@ class LandingPageHandler(BaseHTTPRequestHandler):
                     <div class="balance-card">
                         <div class="balance-header">
                             <h3>Total Balance</h3>
-                            <div class="balance-amount">$0.00</div>
+                            <div id="balanceAmount" class="balance-amount">$0.00</div>
                         </div>
-                        <div class="balance-change">+0.00% (24h)</div>
+                        <div id="balanceChange" class="balance-change">+0.00% (24h)</div>
                     </div>
                     
                     <div class="wallet-actions">
@@ -2894,7 +3331,7 @@ class LandingPageHandler(BaseHTTPRequestHandler):
                     
                     <div class="crypto-holdings">
                         <h4>Your Holdings</h4>
-                        <div class="holdings-list">
+                        <div id="holdingsList" class="holdings-list">
                             <div class="holding-item">
                                 <div class="holding-info">
                                     <span class="crypto-symbol">₿</span>
@@ -3269,16 +3706,79 @@ class LandingPageHandler(BaseHTTPRequestHandler):
             }});
         }});
 
-        // Update cryptocurrency prices every 30 seconds
-        setInterval(() => {{
-            fetch('/api/crypto/prices')
-                .then(response => response.json())
-                .then(data => {{
-                    console.log('Live cryptocurrency data updated');
-                }})
-                .catch(error => console.log('Update failed'));
-        }}, 30000);
+        // Live prices are pushed by the server; poll only without EventSource
+        if (window.EventSource) {{
+            const priceStream = new EventSource('/api/crypto/stream');
+            priceStream.addEventListener('prices', event => {{
+                const update = JSON.parse(event.data);
+                console.log('Live cryptocurrency data updated', update.quotes.length);
+                if (document.getElementById('user-wallet').style.display === 'block') {{
+                    loadPortfolio();
+                }}
+            }});
+        }} else {{
+            setInterval(() => {{
+                fetch('/api/crypto/prices')
+                    .then(response => response.json())
+                    .then(data => {{
+                        console.log('Live cryptocurrency data updated');
+                    }})
+                    .catch(error => console.log('Update failed'));
+            }}, 30000);
+        }}
 
+        // Trading dashboard: live ticks over WebSocket for the swap form's symbols
+        const swapPrices = {{}};
+        const STABLECOINS = ['USDT', 'USDC', 'DAI'];
+        
+        function swapSymbol(id) {{
+            return document.getElementById(id).value.split(' ')[0];
+        }}
+        
+        function updateSwapQuote() {{
+            const fromSymbol = swapSymbol('swapFromSymbol');
+            const toSymbol = swapSymbol('swapToSymbol');
+            const from = swapPrices[fromSymbol];
+            const to = swapPrices[toSymbol] || (STABLECOINS.includes(toSymbol) ? {{price: 1}} : null);
+            if (!from || !to) return;
+            
+            const rate = from.price / to.price;
+            const amount = parseFloat(document.getElementById('swapFromAmount').value) || 0;
+            const format = value => value.toLocaleString('en-US', {{maximumFractionDigits: 6}});
+            document.getElementById('swapToAmount').value = format(amount * rate);
+            document.getElementById('swapRate').textContent = `1 ${{fromSymbol}} = ${{format(rate)}} ${{toSymbol}}`;
+        }}
+        
+        function connectMarket() {{
+            const socket = new WebSocket((location.protocol === 'https:' ? 'wss://' : 'ws://') + location.host + '/ws/market');
+            socket.onopen = () => {{
+                const options = document.querySelectorAll('#swapFromSymbol option, #swapToSymbol option');
+                const symbols = Array.from(options, option => option.value.split(' ')[0]);
+                socket.send(JSON.stringify({{action: 'subscribe', symbols: symbols}}));
+            }};
+            socket.onmessage = event => {{
+                const message = JSON.parse(event.data);
+                if (message.type === 'quote') {{
+                    swapPrices[message.symbol] = message;
+                }} else if (message.type === 'tick') {{
+                    Object.assign(swapPrices[message.symbol] || (swapPrices[message.symbol] = {{}}), message);
+                }} else if (message.type === 'removed') {{
+                    delete swapPrices[message.symbol];
+                }} else {{
+                    return;
+                }}
+                updateSwapQuote();
+            }};
+            socket.onclose = () => setTimeout(connectMarket, 3000);
+        }}
+        
+        if (window.WebSocket) {{
+            connectMarket();
+            ['swapFromAmount', 'swapFromSymbol', 'swapToSymbol'].forEach(id => {{
+                document.getElementById(id).addEventListener('input', updateSwapQuote);
+            }});
+        }}
+        
         // Trading interface interactions
         document.querySelectorAll('.tab').forEach(tab => {{
             tab.addEventListener('click', function() {{
@@ -3413,12 +3913,53 @@ class LandingPageHandler(BaseHTTPRequestHandler):
             if (isLoggedIn) {{
                 guestWallet.style.display = 'none';
                 userWallet.style.display = 'block';
+                loadPortfolio();
             }} else {{
                 guestWallet.style.display = 'block';
                 userWallet.style.display = 'none';
             }}
         }}
         
+        // Fill the balance card and holdings from the server-side valuation
+        function loadPortfolio() {{
+            fetch('/api/portfolio/me', {{credentials: 'same-origin'}})
+                .then(response => response.ok ? response.json() : null)
+                .then(portfolio => {{
+                    if (!portfolio) return;
+                    const money = value => '$' + value.toLocaleString('en-US', {{minimumFractionDigits: 2, maximumFractionDigits: 2}});
+                    const sign = portfolio.change_24h >= 0 ? '+' : '';
+                    document.getElementById('balanceAmount').textContent = money(portfolio.total_value);
+                    document.getElementById('balanceChange').textContent =
+                        `${{sign}}${{portfolio.change_24h.toFixed(2)}}% (24h)`;
+                    
+                    const list = document.getElementById('holdingsList');
+                    list.innerHTML = '';
+                    if (!portfolio.holdings.length) {{
+                        list.innerHTML = '<div class="holding-item"><span class="crypto-name">No holdings yet</span></div>';
+                        return;
+                    }}
+                    portfolio.holdings.forEach(holding => {{
+                        const item = document.createElement('div');
+                        item.className = 'holding-item';
+                        item.innerHTML = `
+                            <div class="holding-info">
+                                <span class="crypto-symbol"></span>
+                                <div class="crypto-details">
+                                    <span class="crypto-name"></span>
+                                    <span class="crypto-amount"></span>
+                                </div>
+                            </div>
+                            <div class="holding-value"></div>`;
+                        item.querySelector('.crypto-symbol').textContent = holding.symbol.charAt(0);
+                        item.querySelector('.crypto-name').textContent = `${{holding.name}} · ${{holding.allocation.toFixed(1)}}%`;
+                        item.querySelector('.crypto-amount').textContent = `${{holding.amount.toFixed(8)}} ${{holding.symbol}}`;
+                        item.querySelector('.holding-value').textContent = money(holding.value);
+                        list.appendChild(item);
+                    }});
+                }})
+                .catch(error => console.log('Portfolio update failed'));
+        }}
+        
         // Call checkLoginStatus on page load
         document.addEventListener('DOMContentLoaded', function() {{
             checkLoginStatus();
@@ -3428,7 +3969,7 @@ class LandingPageHandler(BaseHTTPRequestHandler):
         const translations = {{
             'en': {{
                 'home': 'Home', 'trading': 'Trading', 'wallet': 'Wallet', 'team': 'Team', 'contact': 'Contact',
-                'contact_title': 'Get In Touch', 'contact_subtitle': 'We\'re here to help you succeed',
+                'contact_title': 'Get In Touch', 'contact_subtitle': 'We\\'re here to help you succeed',
                 'welcome_title': 'Welcome to RimToken', 'welcome_subtitle': 'The Future of Cryptocurrency Trading',
                 'welcome_description': 'Experience seamless cryptocurrency trading with real-time market data, advanced portfolio management, and secure wallet integration.',
                 'get_started_btn': 'Get Started', 'learn_more_btn': 'Learn More',
@@ -3506,20 +4047,128 @@ class LandingPageHandler(BaseHTTPRequestHandler):
 </body>
 </html>"""
         
-        self.wfile.write(html_content.encode('utf-8'))
+        return html_content
+
+# Static parts of the landing page, encoded once per process
+LANDING_PAGE = PrecompiledPage(LandingPageHandler.landing_page_template, ['ticker_items', 'price_ticker'])
+
+def render_landing_page(snapshot):
+    """Encoded landing page for one price snapshot"""
+    # Only the price regions are rendered; everything else was encoded at startup
+    chunks = LANDING_PAGE.render(
+        ticker_items=LandingPageHandler.render_ticker_items(snapshot.data).encode('utf-8'),
+        price_ticker=LandingPageHandler.render_price_grid(snapshot.data[:4]).encode('utf-8')
+    )
+    return b''.join(chunks)
+
+REGISTER_PAGE = PrecompressedBody(LandingPageHandler.register_page_template().encode('utf-8'))
+LOGIN_PAGE = PrecompressedBody(LandingPageHandler.login_page_template().encode('utf-8'))
+REGISTER_PAGE_ETAG = content_etag(REGISTER_PAGE.body)
+LOGIN_PAGE_ETAG = content_etag(LOGIN_PAGE.body)
+
+def create_app():
+    """Build config, services, caches and pools once; every request shares them"""
+    config = EnvironmentConfig()
+    crypto_service = CryptoAPIService()
+    # Prices are fetched once per TTL no matter how many requests come in
+    price_cache = PriceCache(
+        crypto_service.get_real_time_prices,
+        key=('/cryptocurrency/listings/latest', 'start=1&limit=6', 'USD'),
+        fallback=crypto_service.get_demo_data
+    )
+    landing_page_cache = RenderedPageCache(render_landing_page)
+    price_cache.add_listener(landing_page_cache.invalidate)
+    # Every published snapshot is kept, so history never costs API credits
+    price_history = TimeSeriesStore()
+    price_cache.add_listener(price_history.record)
+    # Candles roll forward with each snapshot; older ranges are resampled from history
+    candle_book = CandleBook(price_history)
+    price_cache.add_listener(candle_book.record)
+    # One SQLite database shared by every worker process
+    user_store = UserStore()
+    # Every portfolio is revalued together whenever prices change; users
+    # registered later, here or in another worker, join as the store sees them
+    portfolio_engine = PortfolioEngine(user_store.all())
+    user_store.add_listener(portfolio_engine.add_user)
+    price_cache.add_listener(portfolio_engine.revalue)
+    
+    return AppContext(
+        config,
+        crypto_service,
+        price_cache,
+        PriceRefresher(price_cache),
+        landing_page_cache=landing_page_cache,
+        # One producer encodes each price change once for every SSE client
+        price_stream=PriceBroadcaster(price_cache),
+        # WebSocket clients pick the symbols they want ticks for
+        market_gateway=MarketGateway(price_cache),
+        price_history=price_history,
+        candle_book=candle_book,
+        # Logo and team photos, indexed once and kept in memory when small
+        static_assets=AssetIndex('attached_assets'),
+        user_store=user_store,
+        portfolio_engine=portfolio_engine,
+        # scrypt runs in separate processes so logins never stall page serving
+        password_hasher=PasswordHasher(),
+        # Login sessions, signed with the deployment session secret
+        session_store=SessionStore(config.session_secret)
+    )
 
 class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
     """Handle requests in a separate thread for better performance"""
     allow_reuse_address = True
     daemon_threads = True
 
+class ReusePortHTTPServer(ThreadedHTTPServer):
+    """Threaded server that shares its port with other worker processes"""
+    allow_reuse_port = True
+
+def create_server(engine, server_address, app, reuse_port=False):
+    """Build the HTTP server for the selected serving engine"""
+    if engine == 'asyncio':
+        httpd = AsyncHTTPServer(server_address, LandingPageHandler, reuse_port=reuse_port)
+    elif reuse_port:
+        httpd = ReusePortHTTPServer(server_address, LandingPageHandler)
+    else:
+        httpd = ThreadedHTTPServer(server_address, LandingPageHandler)
+    return app.attach(httpd)
+
 def main():
+    parser = argparse.ArgumentParser(description='RimToken Platform server')
+    parser.add_argument('--engine', choices=['threaded', 'asyncio'],
+                        default=os.environ.get('SERVER_ENGINE', 'threaded'),
+                        help='serving engine: one thread per connection, or an asyncio event loop')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WEB_WORKERS', 1)),
+                        help='number of pre-forked worker processes sharing the port')
+    args = parser.parse_args()
+    
     port = int(os.environ.get('PORT', 8080))
+    app = create_app()
+    
+    if args.workers > 1:
+        # A fetcher process polls prices and shares them; workers only serve requests
+        print(f"🚀 RimToken Platform ({args.engine} engine, {args.workers} workers)")
+        print(f"🌐 Running on http://0.0.0.0:{port}")
+        supervisor = PreforkSupervisor(
+            lambda address: create_server(args.engine, address, app, reuse_port=True),
+            ('0.0.0.0', port),
+            args.workers,
+            app.price_cache,
+            app.price_refresher,
+            # Only one process may write the history files
+            fetcher_listeners=[app.price_history.record]
+        )
+        supervisor.run()
+        return
+    
+    # Poll prices in the background so request threads never wait on CoinMarketCap
+    app.price_refresher.start()
+    app.price_refresher.wait_until_ready(5)
     
     try:
         server_address = ('0.0.0.0', port)
-        httpd = ThreadedHTTPServer(server_address, LandingPageHandler)
-        print(f"🚀 RimToken Platform")
+        httpd = create_server(args.engine, server_address, app)
+        print(f"🚀 RimToken Platform ({args.engine} engine)")
         print(f"🌐 Running on http://0.0.0.0:{port}")
         print("✨ Ready for preview")
         httpd.serve_forever()
@@ -3529,8 +4178,8 @@ def main():
             for alt_port in [3000, 8000, 5000]:
                 try:
                     server_address = ('0.0.0.0', alt_port)
-                    httpd = ThreadedHTTPServer(server_address, LandingPageHandler)
-                    print(f"🚀 RimToken Platform")
+                    httpd = create_server(args.engine, server_address, app)
+                    print(f"🚀 RimToken Platform ({args.engine} engine)")
                     print(f"🌐 Running on http://0.0.0.0:{alt_port}")
                     httpd.serve_forever()
                     break
@@ -0,0 +1,503 @@
+#!/usr/bin/env python3
+import os
+import re
+import json
+import base64
+import socket
+import struct
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict, deque
+
+from price_cache import env_seconds
+
+
+# How often an idle connection is pinged, how long without any frame from
+# the client before it is dropped, the largest client message accepted and
+# how many symbols one connection may follow
+WS_PING_INTERVAL = env_seconds('WS_PING_INTERVAL', 20)
+WS_IDLE_TIMEOUT = env_seconds('WS_IDLE_TIMEOUT', 60)
+WS_MAX_MESSAGE = int(os.environ.get('WS_MAX_MESSAGE', 64 * 1024))
+WS_MAX_SYMBOLS = int(os.environ.get('WS_MAX_SYMBOLS', 50))
+
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+OP_CONTINUATION, OP_TEXT, OP_BINARY, OP_CLOSE, OP_PING, OP_PONG = 0x0, 0x1, 0x2, 0x8, 0x9, 0xA
+CLOSE_NORMAL, CLOSE_PROTOCOL_ERROR, CLOSE_UNSUPPORTED, CLOSE_TOO_BIG = 1000, 1002, 1003, 1009
+
+SYMBOL_PATTERN = re.compile(r'^[A-Z0-9]{1,15}$')
+
+
+class ProtocolError(ValueError):
+    """Raised on a malformed or unacceptable client frame"""
+
+    def __init__(self, message, code=CLOSE_PROTOCOL_ERROR):
+        super().__init__(message)
+        self.code = code
+
+
+def websocket_accept(key):
+    """Sec-WebSocket-Accept value for a client's Sec-WebSocket-Key"""
+    digest = hashlib.sha1((key + WS_GUID).encode('ascii')).digest()
+    return base64.b64encode(digest).decode('ascii')
+
+
+def encode_frame(opcode, payload=b''):
+    """One unmasked server frame; the same bytes can go to every client"""
+    length = len(payload)
+    if length < 126:
+        head = struct.pack('!BB', 0x80 | opcode, length)
+    elif length < 1 << 16:
+        head = struct.pack('!BBH', 0x80 | opcode, 126, length)
+    else:
+        head = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+    return head + payload
+
+
+def text_frame(message):
+    return encode_frame(OP_TEXT, json.dumps(message, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+
+def close_frame(code, reason=''):
+    return encode_frame(OP_CLOSE, struct.pack('!H', code) + reason.encode('utf-8')[:120])
+
+
+def _parse_frame():
+    # Generator shared by the blocking and asyncio readers: yields how many
+    # bytes it needs next and returns (fin, opcode, payload)
+    first, second = yield 2
+    fin, opcode = bool(first & 0x80), first & 0x0F
+    if first & 0x70:
+        raise ProtocolError('reserved bits set')
+    if not second & 0x80:
+        raise ProtocolError('client frames must be masked')
+    length = second & 0x7F
+    if length == 126:
+        length, = struct.unpack('!H', (yield 2))
+    elif length == 127:
+        length, = struct.unpack('!Q', (yield 8))
+    if opcode >= OP_CLOSE and (length > 125 or not fin):
+        raise ProtocolError('bad control frame')
+    if length > WS_MAX_MESSAGE:
+        raise ProtocolError('message too big', CLOSE_TOO_BIG)
+    mask = yield 4
+    payload = (yield length) if length else b''
+    # XOR with the repeated 4-byte mask as one big integer operation
+    key = (mask * (length // 4 + 1))[:length]
+    payload = (int.from_bytes(payload, 'big') ^ int.from_bytes(key, 'big')).to_bytes(length, 'big')
+    return fin, opcode, payload
+
+
+def read_frame(rfile):
+    """Next client frame from a blocking file; raises EOFError when the peer is gone"""
+    parser = _parse_frame()
+    needed = next(parser)
+    while True:
+        data = rfile.read(needed)
+        if len(data) < needed:
+            raise EOFError('connection closed')
+        try:
+            needed = parser.send(data)
+        except StopIteration as done:
+            return done.value
+
+
+async def read_frame_async(reader):
+    """read_frame() for an asyncio StreamReader"""
+    parser = _parse_frame()
+    needed = next(parser)
+    while True:
+        try:
+            data = await reader.readexactly(needed)
+        except asyncio.IncompleteReadError:
+            raise EOFError('connection closed')
+        try:
+            needed = parser.send(data)
+        except StopIteration as done:
+            return done.value
+
+
+class MarketTick:
+    """One symbol's change in one snapshot, encoded at most once per form"""
+
+    def __init__(self, symbol, version, quote, previous):
+        self.symbol = symbol
+        self.version = version
+        self.quote = quote
+        if quote is None:
+            self.delta = {'type': 'removed', 'symbol': symbol, 'v': version}
+        else:
+            changed = {key: value for key, value in quote.items()
+                       if previous is None or previous.get(key) != value}
+            self.delta = dict(changed, type='tick' if previous is not None else 'quote', symbol=symbol, v=version)
+        self._delta_frame = None
+        self._full_frame = None
+
+    @property
+    def delta_frame(self):
+        if self._delta_frame is None:
+            self._delta_frame = text_frame(self.delta)
+        return self._delta_frame
+
+    @property
+    def full_frame(self):
+        """Whole quote, for clients that missed the tick before this one"""
+        if self.quote is None:
+            return self.delta_frame
+        if self._full_frame is None:
+            self._full_frame = text_frame(dict(self.quote, type='quote', symbol=self.symbol, v=self.version))
+        return self._full_frame
+
+
+class MarketClient:
+    """Outgoing queue of one connection: at most one pending tick per symbol"""
+
+    def __init__(self):
+        self.symbols = set()
+        # symbol -> frame not yet written; a newer tick replaces it in place
+        self.pending = OrderedDict()
+        # Replies and control frames are never dropped
+        self.control = deque()
+        self.closed = False
+        self.dropped = 0
+        self._cond = threading.Condition()
+        self._loop = None
+        self._event = None
+        self._wake_scheduled = False
+
+    def bind_loop(self):
+        """Wake an asyncio writer on this loop instead of a thread"""
+        self._loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+
+    def offer(self, tick):
+        with self._cond:
+            if self.closed:
+                return
+            if tick.symbol in self.pending:
+                # Slow consumer: the unsent tick was a delta against a quote
+                # the client never got, so send the latest whole quote instead
+                self.pending[tick.symbol] = tick.full_frame
+                self.dropped += 1
+            else:
+                self.pending[tick.symbol] = tick.delta_frame
+            self._cond.notify()
+        self._wake()
+
+    def send(self, frame):
+        with self._cond:
+            self.control.append(frame)
+            self._cond.notify()
+        self._wake()
+
+    def close(self, frame=None):
+        """Stop queueing ticks; frame (a close frame) is the last thing written"""
+        with self._cond:
+            self.closed = True
+            self.pending.clear()
+            if frame is not None:
+                self.control.append(frame)
+            self._cond.notify()
+        self._wake()
+
+    def _wake(self):
+        if self._loop is None or self._wake_scheduled:
+            return
+        self._wake_scheduled = True
+        try:
+            self._loop.call_soon_threadsafe(self._set_event)
+        except RuntimeError:
+            # Loop already closed
+            pass
+
+    def _set_event(self):
+        self._wake_scheduled = False
+        self._event.set()
+
+    def take(self):
+        """Everything queued, as bytes for one write"""
+        with self._cond:
+            return self._take()
+
+    def _take(self):
+        frames = list(self.control)
+        self.control.clear()
+        frames.extend(self.pending.values())
+        self.pending.clear()
+        return b''.join(frames)
+
+    def wait_and_take(self, timeout):
+        """take() after blocking until something is queued or timeout"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.control or self.pending or self.closed, timeout)
+            return self._take()
+
+    async def wait_and_take_async(self, timeout):
+        self._event.clear()
+        data = self.take()
+        if data or self.closed:
+            return data
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.take()
+
+
+class MarketGateway:
+    """Fans price snapshots out to WebSocket clients as per-symbol ticks"""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self._quotes = {}
+        self._version = 0
+        # symbol -> clients following it
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self.clients = 0
+        cache.add_listener(self.publish)
+
+    def publish(self, snapshot):
+        """PriceCache listener: one MarketTick per changed symbol, shared by its subscribers"""
+        quotes = {quote.get('symbol'): quote for quote in snapshot.data}
+        deliveries = []
+        with self._lock:
+            previous = self._quotes
+            self._quotes, self._version = quotes, snapshot.version
+            for symbol in set(quotes) | set(previous):
+                quote, old = quotes.get(symbol), previous.get(symbol)
+                clients = self._subscribers.get(symbol)
+                if quote == old or not clients:
+                    continue
+                deliveries.append((MarketTick(symbol, snapshot.version, quote, old), list(clients)))
+        for tick, clients in deliveries:
+            for client in clients:
+                client.offer(tick)
+
+    def subscribe(self, client, symbols):
+        """Follow symbols; each starts with its whole current quote"""
+        if self._version == 0:
+            # Nothing published yet; reading the cache publishes the first snapshot
+            self.cache.get()
+        added = []
+        with self._lock:
+            for symbol in symbols:
+                if symbol in client.symbols:
+                    continue
+                if len(client.symbols) >= WS_MAX_SYMBOLS:
+                    break
+                client.symbols.add(symbol)
+                self._subscribers.setdefault(symbol, set()).add(client)
+                added.append(symbol)
+            # Queued under the lock, so the next tick is a delta against these
+            for symbol in added:
+                quote = self._quotes.get(symbol)
+                if quote is not None:
+                    client.offer(MarketTick(symbol, self._version, quote, None))
+        return added
+
+    def unsubscribe(self, client, symbols):
+        removed = []
+        with self._lock:
+            for symbol in symbols:
+                if symbol not in client.symbols:
+                    continue
+                client.symbols.discard(symbol)
+                followers = self._subscribers.get(symbol)
+                if followers is not None:
+                    followers.discard(client)
+                    if not followers:
+                        del self._subscribers[symbol]
+                removed.append(symbol)
+        with client._cond:
+            for symbol in removed:
+                client.pending.pop(symbol, None)
+        return removed
+
+    def status(self):
+        return {
+            'clients': self.clients,
+            'symbols': len(self._subscribers),
+            'version': self._version
+        }
+
+
+class MarketSession:
+    """One WebSocket connection to the gateway, served from threads or a loop"""
+
+    def __init__(self, gateway):
+        self.gateway = gateway
+        self.client = MarketClient()
+        self._fragments = []
+        self._fragment_size = 0
+        # Sent back in the closing handshake, when the connection ends cleanly
+        self.close_code = None
+        self.close_reason = ''
+
+    def on_frame(self, fin, opcode, payload):
+        """Handle one client frame; returns False once the connection should end"""
+        if opcode == OP_CLOSE:
+            self.close_code = CLOSE_NORMAL
+            return False
+        if opcode == OP_PING:
+            self.client.send(encode_frame(OP_PONG, payload))
+            return True
+        if opcode == OP_PONG:
+            return True
+        if opcode == OP_BINARY:
+            raise ProtocolError('binary messages are not supported', CLOSE_UNSUPPORTED)
+        if (opcode == OP_TEXT and self._fragments) or (opcode == OP_CONTINUATION and not self._fragments):
+            raise ProtocolError('unexpected continuation')
+        if opcode not in (OP_TEXT, OP_CONTINUATION):
+            raise ProtocolError('unknown opcode')
+
+        self._fragments.append(payload)
+        self._fragment_size += len(payload)
+        if self._fragment_size > WS_MAX_MESSAGE:
+            raise ProtocolError('message too big', CLOSE_TOO_BIG)
+        if fin:
+            message = b''.join(self._fragments)
+            self._fragments, self._fragment_size = [], 0
+            self.on_message(message)
+        return True
+
+    def on_message(self, data):
+        try:
+            message = json.loads(data.decode('utf-8'))
+            action = message['action']
+            symbols = message.get('symbols', [])
+            if isinstance(symbols, str):
+                symbols = [symbols]
+            symbols = [str(symbol).upper() for symbol in symbols]
+        except (UnicodeDecodeError, ValueError, KeyError, TypeError, AttributeError):
+            self.client.send(text_frame({'type': 'error', 'message': 'expected {"action": ..., "symbols": [...]}'}))
+            return
+
+        invalid = [symbol for symbol in symbols if not SYMBOL_PATTERN.match(symbol)]
+        if invalid:
+            self.client.send(text_frame({'type': 'error', 'message': 'invalid symbols', 'symbols': invalid[:10]}))
+            return
+
+        if action == 'subscribe':
+            added = self.gateway.subscribe(self.client, symbols)
+            # Replies go out ahead of the quotes already queued for the new symbols
+            reply = {'type': 'subscribed', 'symbols': added}
+            if any(symbol not in self.client.symbols for symbol in symbols):
+                reply['limit'] = WS_MAX_SYMBOLS
+            self.client.send(text_frame(reply))
+        elif action == 'unsubscribe':
+            removed = self.gateway.unsubscribe(self.client, symbols)
+            self.client.send(text_frame({'type': 'unsubscribed', 'symbols': removed}))
+        elif action == 'ping':
+            self.client.send(text_frame({'type': 'pong', 'v': self.gateway._version}))
+        else:
+            self.client.send(text_frame({'type': 'error', 'message': f'unknown action {action!r}'[:100]}))
+
+    def _finish(self):
+        self.gateway.unsubscribe(self.client, list(self.client.symbols))
+        self.client.close(None if self.close_code is None else close_frame(self.close_code, self.close_reason))
+
+    def serve(self, rfile, wfile, connection):
+        """Blocking session: this thread reads, a helper thread writes"""
+        self.gateway.clients += 1
+        connection.settimeout(WS_IDLE_TIMEOUT)
+        writer = threading.Thread(target=self._write_loop, args=(wfile, connection), daemon=True)
+        writer.start()
+        try:
+            while self.on_frame(*read_frame(rfile)):
+                pass
+        except ProtocolError as error:
+            self.close_code, self.close_reason = error.code, str(error)
+        except (EOFError, OSError):
+            pass
+        finally:
+            self._finish()
+            writer.join(WS_PING_INTERVAL)
+            self.gateway.clients -= 1
+
+    def _write_loop(self, wfile, connection):
+        try:
+            while True:
+                data = self.client.wait_and_take(WS_PING_INTERVAL)
+                if data:
+                    wfile.write(data)
+                elif self.client.closed:
+                    return
+                else:
+                    wfile.write(encode_frame(OP_PING))
+        except OSError:
+            # Unblock the reading thread too
+            self.client.close()
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    async def stream_to(self, writer, reader):
+        """Session for the asyncio engine: two coroutines, no threads"""
+        self.gateway.clients += 1
+        self.client.bind_loop()
+        writing = asyncio.ensure_future(self._write_loop_async(writer))
+        try:
+            while not writing.done():
+                frame = await asyncio.wait_for(read_frame_async(reader), WS_IDLE_TIMEOUT)
+                if not self.on_frame(*frame):
+                    break
+        except ProtocolError as error:
+            self.close_code, self.close_reason = error.code, str(error)
+        except (EOFError, ConnectionError, OSError, asyncio.TimeoutError):
+            pass
+        finally:
+            self._finish()
+            try:
+                await asyncio.wait_for(writing, WS_PING_INTERVAL)
+            except (asyncio.TimeoutError, ConnectionError, OSError):
+                writing.cancel()
+            self.gateway.clients -= 1
+
+    async def _write_loop_async(self, writer):
+        while True:
+            data = await self.client.wait_and_take_async(WS_PING_INTERVAL)
+            if data:
+                writer.write(data)
+            elif self.client.closed:
+                return
+            else:
+                writer.write(encode_frame(OP_PING))
+            await writer.drain()
+
+
+def serve_market(handler, gateway):
+    """Upgrade a request handler's connection and run a gateway session on it"""
+    headers = handler.headers
+    key = headers.get('Sec-WebSocket-Key', '')
+    upgrade = 'websocket' in headers.get('Upgrade', '').lower()
+    connection = 'upgrade' in headers.get('Connection', '').lower()
+    try:
+        valid_key = len(base64.b64decode(key, validate=True)) == 16
+    except ValueError:
+        valid_key = False
+    if not (upgrade and connection and valid_key):
+        handler.send_error(400, 'Expected a WebSocket upgrade')
+        return
+    if headers.get('Sec-WebSocket-Version') != '13':
+        handler.send_response(426)
+        handler.send_header('Sec-WebSocket-Version', '13')
+        handler.send_header('Content-Length', '0')
+        handler.end_headers()
+        return
+
+    handler.send_response(101)
+    handler.send_header('Upgrade', 'websocket')
+    handler.send_header('Connection', 'Upgrade')
+    handler.send_header('Sec-WebSocket-Accept', websocket_accept(key))
+    handler.end_headers()
+    handler.close_connection = True
+
+    session = MarketSession(gateway)
+    if getattr(handler, 'request', None) is None:
+        # asyncio engine: the event loop takes over the upgraded connection
+        handler.stream = session
+        return
+    handler.wfile.flush()
+    session.serve(handler.rfile, handler.wfile, handler.connection)
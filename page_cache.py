@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+import threading
+
+from http_compression import compress
+
+
+class RenderedPageCache:
+    """Fully rendered, encoded page bodies kept until the next price snapshot"""
+
+    def __init__(self, render):
+        # render(snapshot) -> encoded page bytes
+        self.render = render
+        self.renders = 0
+        # (snapshot version, {encoding: body}) swapped as one reference
+        self._entry = (None, {})
+        self._lock = threading.Lock()
+
+    def get(self, snapshot, encoding='identity'):
+        """Page body for the snapshot in the given content coding, rendering at most once"""
+        version, variants = self._entry
+        if version == snapshot.version and encoding in variants:
+            return variants[encoding]
+
+        with self._lock:
+            version, variants = self._entry
+            if version != snapshot.version:
+                variants = {'identity': self.render(snapshot)}
+                self._entry = (snapshot.version, variants)
+                self.renders += 1
+            if encoding not in variants:
+                variants[encoding] = compress(variants['identity'], encoding)
+            return variants[encoding]
+
+    def invalidate(self, snapshot=None):
+        """Drop every cached variant; registered as a PriceCache listener"""
+        self._entry = (None, {})
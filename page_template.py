@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+
+
+class PrecompiledPage:
+    """Page rendered once with placeholders and kept as pre-encoded byte chunks"""
+
+    def __init__(self, render, slots):
+        # render(**slots) must return the full page as a str; every slot is
+        # filled with a unique marker so the static parts can be cut out
+        markers = {slot: f'\x00{slot}\x00' for slot in slots}
+        html = render(**markers)
+
+        self.parts = []
+        position = 0
+        while True:
+            found = [(html.find(marker, position), slot) for slot, marker in markers.items()]
+            found = [(index, slot) for index, slot in found if index >= 0]
+            if not found:
+                break
+            index, slot = min(found)
+            self.parts.append(html[position:index].encode('utf-8'))
+            self.parts.append(slot)
+            position = index + len(markers[slot])
+        self.parts.append(html[position:].encode('utf-8'))
+
+        self.static_bytes = sum(len(part) for part in self.parts if isinstance(part, bytes))
+
+    def render(self, **values):
+        """Byte chunks for one response; values maps each slot to already-encoded bytes"""
+        return [values[part] if isinstance(part, str) else part for part in self.parts]
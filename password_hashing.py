@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+import os
+import hmac
+import time
+import base64
+import hashlib
+import secrets
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+
+# scrypt cost (N must be a power of two; memory is about 128 * N * r bytes),
+# how many processes hash at once, and how many requests may wait for one
+PASSWORD_HASH_N = int(os.environ.get('PASSWORD_HASH_N', 2 ** 14))
+PASSWORD_HASH_R = int(os.environ.get('PASSWORD_HASH_R', 8))
+PASSWORD_HASH_P = int(os.environ.get('PASSWORD_HASH_P', 1))
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', max(1, (os.cpu_count() or 2) - 1)))
+PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 64))
+PASSWORD_HASH_WAIT = float(os.environ.get('PASSWORD_HASH_WAIT', 10))
+
+
+class HasherBusy(RuntimeError):
+    """Raised when too many hashing jobs are already queued"""
+
+
+def _b64(data):
+    return base64.b64encode(data).decode('ascii')
+
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode('utf-8'), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r + 1024 * 1024, dklen=32)
+
+
+def _hash(password, n, r, p):
+    # Runs in a pool process
+    salt = secrets.token_bytes(16)
+    return f'scrypt${n}${r}${p}${_b64(salt)}${_b64(_scrypt(password, salt, n, r, p))}'
+
+
+def _verify(password, encoded):
+    # Runs in a pool process; parameters come from the stored hash so cost
+    # changes only apply to passwords hashed afterwards
+    try:
+        scheme, n, r, p, salt, expected = encoded.split('$')
+        if scheme != 'scrypt':
+            return False
+        derived = _scrypt(password, base64.b64decode(salt), int(n), int(r), int(p))
+    except (ValueError, TypeError):
+        return False
+    return hmac.compare_digest(derived, base64.b64decode(expected))
+
+
+class PasswordHasher:
+    """scrypt hashing on a bounded process pool so request threads never burn CPU on it"""
+
+    def __init__(self, workers=None, max_queue=None, n=None, r=None, p=None):
+        self.workers = PASSWORD_HASH_WORKERS if workers is None else workers
+        self.n = PASSWORD_HASH_N if n is None else n
+        self.r = PASSWORD_HASH_R if r is None else r
+        self.p = PASSWORD_HASH_P if p is None else p
+        max_queue = PASSWORD_HASH_QUEUE if max_queue is None else max_queue
+        # Jobs running plus waiting; beyond this, callers get HasherBusy at once
+        self._slots = threading.BoundedSemaphore(self.workers + max_queue)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._dummy = None
+
+    def _pool(self):
+        # Created on first use, so prefork workers each get their own pool
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    methods = multiprocessing.get_all_start_methods()
+                    context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                    self._executor = ProcessPoolExecutor(self.workers, mp_context=context)
+        return self._executor
+
+    def _submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy('password hashing queue is full')
+        try:
+            future = self._pool().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot is held until the job finishes or is cancelled, so work a
+        # timed-out caller left behind still counts against the limit
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(PASSWORD_HASH_WAIT)
+        except TimeoutError:
+            future.cancel()
+            raise HasherBusy('password hashing took too long')
+
+    def hash(self, password):
+        return self._submit(_hash, password, self.n, self.r, self.p)
+
+    def verify(self, password, encoded):
+        """Check a password; unknown users (encoded=None) cost the same as real ones"""
+        if encoded is None:
+            if self._dummy is None:
+                self._dummy = self.hash(secrets.token_hex(8))
+            self._submit(_verify, password, self._dummy)
+            return False
+        return self._submit(_verify, password, encoded)
+
+    def status(self):
+        return {
+            'workers': self.workers,
+            'cost': {'n': self.n, 'r': self.r, 'p': self.p}
+        }
+
+
+def benchmark(seconds=5.0):
+    """Verifications per second on one core and across the pool"""
+    encoded = _hash('benchmark-password', PASSWORD_HASH_N, PASSWORD_HASH_R, PASSWORD_HASH_P)
+
+    count, start = 0, time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        _verify('benchmark-password', encoded)
+        count += 1
+    per_core = count / (time.perf_counter() - start)
+
+    hasher = PasswordHasher(max_queue=10 ** 6)
+    hasher.verify('warm-up', encoded)
+    jobs = int(per_core * hasher.workers * seconds)
+    threads = [threading.Thread(target=hasher.verify, args=('benchmark-password', encoded))
+               for _ in range(jobs)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    pooled = jobs / (time.perf_counter() - start)
+
+    print(f"scrypt N={PASSWORD_HASH_N} r={PASSWORD_HASH_R} p={PASSWORD_HASH_P}")
+    print(f"  {per_core:.1f} logins/sec per core ({1000 / per_core:.1f} ms each)")
+    print(f"  {pooled:.1f} logins/sec with {hasher.workers} pool workers")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark password hashing cost')
+    parser.add_argument('--seconds', type=float, default=5.0)
+    benchmark(parser.parse_args().seconds)
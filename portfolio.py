@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+import time
+import argparse
+import threading
+
+import numpy as np
+
+from price_cache import PriceSnapshot
+
+
+class PortfolioEngine:
+    """Holdings of every user as one users x assets matrix, revalued in batch on each price tick"""
+
+    def __init__(self, users=()):
+        # Row = user id (ids are dense), column = asset
+        self.quantities = np.zeros((0, 0))
+        self.assets = []
+        self._columns = {}
+        self.names = {}
+        self.prices = np.zeros(0)
+        self.changes = np.zeros(0)
+        # Per-user results of the last revaluation
+        self.totals = np.zeros(0)
+        self.previous_totals = np.zeros(0)
+        self.version = 0
+        self.revalue_ms = 0.0
+        self._lock = threading.Lock()
+        for user in users:
+            self.add_user(user)
+
+    def _column(self, symbol):
+        column = self._columns.get(symbol)
+        if column is None:
+            column = self._columns[symbol] = len(self.assets)
+            self.assets.append(symbol)
+        return column
+
+    def _reserve(self, rows, columns):
+        """Grow the matrices (doubling rows) so they hold rows x columns"""
+        have_rows, have_columns = self.quantities.shape
+        if rows <= have_rows and columns <= have_columns:
+            return
+        rows = max(rows, have_rows * 2, 1024) if rows > have_rows else have_rows
+        columns = max(have_columns, columns)
+        quantities = np.zeros((rows, columns))
+        quantities[:have_rows, :have_columns] = self.quantities
+        self.quantities = quantities
+        self.prices = np.pad(self.prices, (0, columns - len(self.prices)))
+        self.changes = np.pad(self.changes, (0, columns - len(self.changes)))
+        self.totals = np.pad(self.totals, (0, rows - len(self.totals)))
+        self.previous_totals = np.pad(self.previous_totals, (0, rows - len(self.previous_totals)))
+
+    def add_user(self, user):
+        """UserStore listener: take in a user record's holdings, if it has any"""
+        if user.get('holdings'):
+            self.set_holdings(user['id'], user['holdings'])
+
+    def set_holdings(self, user_id, holdings):
+        """Replace one user's holdings ({symbol: amount}) and revalue just that row"""
+        with self._lock:
+            columns = [self._column(str(symbol).upper()) for symbol in holdings]
+            self._reserve(user_id + 1, len(self.assets))
+            self.quantities[user_id] = 0
+            self.quantities[user_id, columns] = [float(amount) for amount in holdings.values()]
+            self.totals[user_id], self.previous_totals[user_id] = self._value_rows(self.quantities[user_id])
+
+    def _value_rows(self, quantities):
+        # Yesterday's price follows from today's and the 24h change
+        previous = self.prices / (1 + self.changes / 100)
+        return quantities @ self.prices, quantities @ previous
+
+    def revalue(self, snapshot):
+        """PriceCache listener: new prices for every asset, then every portfolio at once"""
+        started = time.perf_counter()
+        with self._lock:
+            quotes = []
+            for quote in snapshot.data:
+                symbol = str(quote.get('symbol', '')).upper()
+                price, change = quote.get('price'), quote.get('change_24h')
+                if symbol and isinstance(price, (int, float)):
+                    self.names[symbol] = quote.get('name', symbol)
+                    valid_change = isinstance(change, (int, float)) and change > -100
+                    quotes.append((self._column(symbol), price, change if valid_change else 0))
+            self._reserve(len(self.totals), len(self.assets))
+
+            # Assets missing from this snapshot are valued at zero
+            prices = np.zeros(len(self.assets))
+            changes = np.zeros(len(self.assets))
+            for column, price, change in quotes:
+                prices[column], changes[column] = price, change
+            self.prices, self.changes = prices, changes
+            # Two matrix-vector products cover every user
+            self.totals, self.previous_totals = self._value_rows(self.quantities)
+            self.version = snapshot.version
+        self.revalue_ms = (time.perf_counter() - started) * 1000
+
+    def portfolio(self, user_id):
+        """Valuation of one user's holdings with 24h change and allocation"""
+        with self._lock:
+            if user_id < len(self.quantities):
+                quantities = self.quantities[user_id].copy()
+                total, previous = float(self.totals[user_id]), float(self.previous_totals[user_id])
+            else:
+                quantities, total, previous = np.zeros(len(self.assets)), 0.0, 0.0
+            prices, changes, version = self.prices, self.changes, self.version
+
+        values = quantities * prices
+        allocation = values / total * 100 if total else np.zeros(len(values))
+        holdings = [
+            {
+                'symbol': self.assets[column],
+                'name': self.names.get(self.assets[column], self.assets[column]),
+                'amount': float(quantities[column]),
+                'price': float(prices[column]),
+                'value': round(float(values[column]), 2),
+                'change_24h': float(changes[column]),
+                'allocation': round(float(allocation[column]), 2)
+            }
+            for column in np.flatnonzero(quantities)
+        ]
+        holdings.sort(key=lambda holding: -holding['value'])
+        return {
+            'total_value': round(total, 2),
+            'change_24h_value': round(total - previous, 2),
+            'change_24h': round((total - previous) / previous * 100, 2) if previous else 0.0,
+            'holdings': holdings,
+            'version': version
+        }
+
+    def status(self):
+        return {
+            'users': int(np.count_nonzero(self.quantities.any(axis=1))) if self.quantities.size else 0,
+            'assets': len(self.assets),
+            'revalue_ms': round(self.revalue_ms, 3)
+        }
+
+
+def benchmark(users, assets):
+    """Time one full revaluation of users x assets random portfolios"""
+    symbols = [f'A{index}' for index in range(assets)]
+    rng = np.random.default_rng(1)
+    engine = PortfolioEngine()
+    engine.quantities = rng.random((users, assets)) * (rng.random((users, assets)) < 0.3)
+    engine.totals, engine.previous_totals = np.zeros(users), np.zeros(users)
+    snapshot = PriceSnapshot(tuple({'symbol': symbol, 'price': float(rng.random() * 1000), 'change_24h': 1.5}
+                                   for symbol in symbols), 1, time.time())
+    engine.revalue(snapshot)
+    runs = [engine.revalue(snapshot) or engine.revalue_ms for _ in range(10)]
+    print(f"{users} users x {assets} assets: {min(runs):.1f} ms per revaluation (best of 10)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark batch portfolio revaluation')
+    parser.add_argument('--users', type=int, default=300000)
+    parser.add_argument('--assets', type=int, default=20)
+    args = parser.parse_args()
+    benchmark(args.users, args.assets)
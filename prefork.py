@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+import os
+import json
+import mmap
+import time
+import signal
+import struct
+import threading
+
+from price_cache import PriceSnapshot, env_seconds
+from price_refresher import PriceRefresher
+
+
+# Size of the shared price snapshot region, how often workers look for a new
+# snapshot, and how long stopping workers get to finish in-flight requests
+SHARED_SNAPSHOT_BYTES = int(os.environ.get('SHARED_SNAPSHOT_BYTES', 1024 * 1024))
+SNAPSHOT_POLL_INTERVAL = env_seconds('SNAPSHOT_POLL_INTERVAL', 0.25)
+WORKER_SHUTDOWN_GRACE = env_seconds('WORKER_SHUTDOWN_GRACE', 10)
+
+# sequence, version, fetched_at, checked_at, payload length
+_HEADER = struct.Struct('<QQddI')
+_CHECKED_AT_OFFSET = 24
+# How often a reader retries a snapshot that is being rewritten before it
+# settles for the last one it read; a write takes microseconds
+_READ_ATTEMPTS = 1000
+
+
+class SharedSnapshot:
+    """Price snapshot in anonymous shared memory, written by one process and read by many"""
+
+    def __init__(self, size=None):
+        self.size = SHARED_SNAPSHOT_BYTES if size is None else size
+        # MAP_SHARED anonymous memory is inherited by every forked worker
+        self.buffer = mmap.mmap(-1, self.size)
+        # Last consistent read in this process, served while no other is available
+        self._last = None
+
+    def write(self, snapshot):
+        # Seqlock: the sequence is odd while a write is in progress, and readers
+        # retry until they see the same even value before and after copying
+        payload = json.dumps(snapshot.data, ensure_ascii=False).encode('utf-8')
+        if _HEADER.size + len(payload) > self.size:
+            print(f"Snapshot of {len(payload)} bytes does not fit in shared memory")
+            return
+
+        # Read back rather than count locally: a restarted fetcher continues the
+        # sequence. The old version stays readable so it never appears to go back.
+        sequence, version, fetched_at, checked_at, length = _HEADER.unpack_from(self.buffer, 0)
+        sequence += 1
+        _HEADER.pack_into(self.buffer, 0, sequence, version, fetched_at, checked_at, length)
+        self.buffer[_HEADER.size:_HEADER.size + len(payload)] = payload
+        _HEADER.pack_into(self.buffer, 0, sequence + 1, snapshot.version, snapshot.fetched_at,
+                          snapshot.fetched_at, len(payload))
+
+    def confirm(self, checked_at):
+        """Record that upstream still returns the current snapshot; one aligned 8-byte store"""
+        struct.pack_into('<d', self.buffer, _CHECKED_AT_OFFSET, checked_at)
+
+    def recover(self):
+        """End a write whose process died halfway; call only while no writer is running
+
+        The payload may be half written, so it is dropped: readers keep their
+        last snapshot until the next write.
+        """
+        sequence, version, fetched_at, checked_at, _ = _HEADER.unpack_from(self.buffer, 0)
+        if sequence % 2:
+            _HEADER.pack_into(self.buffer, 0, sequence + 1, version, fetched_at, checked_at, 0)
+            return True
+        return False
+
+    def version(self):
+        return _HEADER.unpack_from(self.buffer, 0)[1]
+
+    def checked_at(self):
+        return struct.unpack_from('<d', self.buffer, _CHECKED_AT_OFFSET)[0]
+
+    def read(self):
+        """Consistent copy of the latest snapshot
+
+        Falls back to the last snapshot this process read (None at first) when
+        nothing was written yet, the payload was dropped by recover(), or a
+        write does not finish within _READ_ATTEMPTS retries.
+        """
+        for _ in range(_READ_ATTEMPTS):
+            sequence, version, fetched_at, _, length = _HEADER.unpack_from(self.buffer, 0)
+            if sequence % 2:
+                time.sleep(0)
+                continue
+            payload = self.buffer[_HEADER.size:_HEADER.size + length]
+            if _HEADER.unpack_from(self.buffer, 0)[0] != sequence:
+                continue
+            if not version or not length:
+                return self._last
+            self._last = PriceSnapshot(tuple(json.loads(payload)), version, fetched_at)
+            return self._last
+        return self._last
+
+
+class SnapshotFollower(threading.Thread):
+    """Worker-side thread that installs snapshots published by the fetcher process"""
+
+    def __init__(self, cache, shared, interval=None):
+        super().__init__(name='snapshot-follower', daemon=True)
+        self.cache = cache
+        self.shared = shared
+        self.interval = SNAPSHOT_POLL_INTERVAL if interval is None else interval
+        # Like PriceRefresher: while attached, request threads never fetch
+        cache.refresher = self
+
+    def run(self):
+        while True:
+            if self.shared.version() > self.cache.peek().version:
+                snapshot = self.shared.read()
+                if snapshot is not None:
+                    self.cache.install(snapshot)
+            self.cache.confirm(self.shared.checked_at())
+            time.sleep(self.interval)
+
+    def status(self):
+        return {
+            'running': self.is_alive(),
+            'mode': 'shared-snapshot',
+            'version': self.cache.peek().version
+        }
+
+
+class PreforkSupervisor:
+    """Pre-forks workers on a SO_REUSEPORT address, restarts crashed ones and reloads on SIGHUP
+
+    The supervisor never starts a thread, so no lock can be held by a thread
+    that vanishes in a forked child. Prices are polled by a separate fetcher
+    process that publishes them to the workers through SharedSnapshot.
+    """
+
+    def __init__(self, server_factory, server_address, workers, cache, refresher, fetcher_listeners=()):
+        # server_factory(server_address) must bind with SO_REUSEPORT
+        self.server_factory = server_factory
+        self.server_address = server_address
+        self.workers = workers
+        self.cache = cache
+        self.refresher = refresher
+        # The only cache listeners run in the fetcher (e.g. the history
+        # writer); workers run the app's own listeners on installed snapshots
+        self.fetcher_listeners = fetcher_listeners
+        self.shared = SharedSnapshot()
+        self.children = {}
+        self.fetcher = None
+        self.generation = 0
+        self._reload = False
+        self._stopping = False
+
+    def run(self):
+        # Fail fast if the address is taken instead of crash-looping workers
+        self.server_factory(self.server_address).server_close()
+
+        # The fetcher is the only process that talks to CoinMarketCap
+        self.spawn_fetcher()
+        deadline = time.time() + 5
+        while not self.shared.version() and time.time() < deadline:
+            time.sleep(0.05)
+
+        signal.signal(signal.SIGHUP, lambda *_: setattr(self, '_reload', True))
+        signal.signal(signal.SIGTERM, lambda *_: setattr(self, '_stopping', True))
+        signal.signal(signal.SIGINT, lambda *_: setattr(self, '_stopping', True))
+
+        for _ in range(self.workers):
+            self.spawn()
+        print(f"👷 Supervisor {os.getpid()} running {self.workers} workers")
+
+        while not self._stopping:
+            if self._reload:
+                self._reload = False
+                self.reload()
+            self.reap()
+            time.sleep(0.2)
+
+        self.stop_workers(list(self.children))
+        if self.fetcher is not None:
+            self.stop_workers([self.fetcher[0]])
+
+    def _fork(self):
+        if threading.active_count() > 1:
+            print(f"⚠️ Forking with {threading.active_count()} threads running; their locks may be held in the child")
+        return os.fork()
+
+    def spawn(self):
+        pid = self._fork()
+        if pid:
+            self.children[pid] = (self.generation, time.time())
+            return pid
+
+        try:
+            self._run_worker()
+        except Exception as e:
+            print(f"Worker {os.getpid()} failed: {e}")
+            os._exit(1)
+        os._exit(0)
+
+    def spawn_fetcher(self):
+        # The previous fetcher may have died in the middle of a write
+        if self.shared.recover():
+            print("⚠️ Dropped a snapshot the previous price fetcher did not finish writing")
+        pid = self._fork()
+        if pid:
+            self.fetcher = (pid, time.time())
+            return pid
+
+        try:
+            self._run_fetcher()
+        except Exception as e:
+            print(f"Price fetcher {os.getpid()} failed: {e}")
+            os._exit(1)
+        os._exit(0)
+
+    def reap(self):
+        """Collect exited workers and replace crashed ones from the current generation"""
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                return
+
+            if self.fetcher is not None and pid == self.fetcher[0]:
+                started = self.fetcher[1]
+                self.fetcher = None
+                if not self._stopping:
+                    print(f"⚠️ Price fetcher {pid} exited with status {status}, restarting")
+                    if time.time() - started < 1:
+                        time.sleep(1)
+                    self.spawn_fetcher()
+                continue
+
+            generation, started = self.children.pop(pid, (None, 0))
+            if generation != self.generation or self._stopping:
+                continue
+
+            print(f"⚠️ Worker {pid} exited with status {status}, restarting")
+            # Avoid a tight fork loop when workers die right after starting
+            if time.time() - started < 1:
+                time.sleep(1)
+            self.spawn()
+
+    def reload(self):
+        """Start a new generation of workers, then retire the old one
+
+        New workers are forked from the supervisor's app as it was loaded at
+        startup, so this replaces worker processes (e.g. after leaks or stuck
+        requests) but does not pick up new code or configuration; restart the
+        supervisor for that.
+        """
+        old = [pid for pid, (generation, _) in self.children.items() if generation == self.generation]
+        self.generation += 1
+        for _ in range(self.workers):
+            self.spawn()
+        print(f"🔄 Reloaded: {self.workers} new workers (same code and config), retiring {len(old)}")
+        self.stop_workers(old)
+
+    def stop_workers(self, pids):
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+        deadline = time.time() + WORKER_SHUTDOWN_GRACE
+        remaining = set(pids)
+        while remaining and time.time() < deadline:
+            for pid in list(remaining):
+                try:
+                    if os.waitpid(pid, os.WNOHANG)[0]:
+                        remaining.discard(pid)
+                        self.children.pop(pid, None)
+                except ChildProcessError:
+                    remaining.discard(pid)
+                    self.children.pop(pid, None)
+            time.sleep(0.1)
+
+        for pid in remaining:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            self.children.pop(pid, None)
+
+    def _run_worker(self):
+        for signum in (signal.SIGHUP, signal.SIGINT):
+            signal.signal(signum, signal.SIG_IGN)
+
+        SnapshotFollower(self.cache, self.shared).start()
+
+        httpd = self.server_factory(self.server_address)
+
+        def graceful_stop(*_):
+            # shutdown() waits for serve_forever to return, so call it off the main thread
+            threading.Thread(target=httpd.shutdown, daemon=True).start()
+
+        signal.signal(signal.SIGTERM, graceful_stop)
+        idle_threads = threading.active_count()
+        httpd.serve_forever()
+        httpd.server_close()
+
+        # Let requests that were already accepted finish
+        deadline = time.time() + WORKER_SHUTDOWN_GRACE
+        while threading.active_count() > idle_threads and time.time() < deadline:
+            time.sleep(0.05)
+
+    def _run_fetcher(self):
+        for signum in (signal.SIGHUP, signal.SIGINT):
+            signal.signal(signum, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+        # Page caches, portfolio revaluation and streams are the workers' job
+        self.cache.set_listeners(self.fetcher_listeners)
+
+        # A restarted fetcher continues from what the workers already have,
+        # so its versions keep increasing
+        snapshot = self.shared.read()
+        if snapshot is None and self.shared.version():
+            # The last payload was dropped; start empty (and stale) at its version
+            snapshot = PriceSnapshot((), self.shared.version(), 0.0)
+        if snapshot is not None:
+            self.cache.install(snapshot)
+        self.cache.add_listener(self.shared.write)
+        # Thread objects made before a fork never report as alive in the
+        # child, so poll with a new refresher configured like the app's
+        refresher = PriceRefresher(self.cache, self.refresher.interval, self.refresher.max_backoff,
+                                   self.refresher.budget)
+        refresher.start()
+
+        while refresher.is_alive():
+            # Unchanged prices publish nothing, but workers still learn they are current
+            self.shared.confirm(self.cache.checked_at)
+            time.sleep(SNAPSHOT_POLL_INTERVAL)
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+import os
+import time
+import datetime
+import threading
+from collections import namedtuple
+
+
+def env_seconds(name, default):
+    """Read a duration in seconds from the environment"""
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return float(default)
+
+
+# How long a snapshot is served as fresh, and how much longer it may be
+# served stale while a background refresh is running
+PRICE_CACHE_TTL = env_seconds('PRICE_CACHE_TTL', 30)
+PRICE_CACHE_STALE_TTL = env_seconds('PRICE_CACHE_STALE_TTL', 300)
+# How long a request waits for a fetch already in flight before falling back
+PRICE_FETCH_WAIT = env_seconds('PRICE_FETCH_WAIT', 3)
+
+
+class PriceSnapshot(namedtuple('PriceSnapshot', ['data', 'version', 'fetched_at'])):
+    """Immutable set of quotes as returned by one upstream fetch"""
+    __slots__ = ()
+
+    def age(self, now=None):
+        if not self.fetched_at:
+            return None
+        return max(0.0, (now or time.time()) - self.fetched_at)
+
+
+EMPTY_SNAPSHOT = PriceSnapshot((), 0, 0.0)
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Run at most one call per key at a time and share its result with every waiter"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def do(self, key, fn, timeout=None):
+        """Call fn, or wait up to timeout seconds for the identical call already running"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[key] = flight
+
+        if leader:
+            try:
+                flight.result = fn()
+            except Exception as e:
+                flight.error = e
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+        elif not flight.done.wait(timeout):
+            raise TimeoutError(f'timed out waiting for in-flight fetch {key!r}')
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights)
+
+
+# Shared by every cache so identical upstream requests are never duplicated
+price_flights = SingleFlight()
+
+
+class PriceCache:
+    """Process-wide TTL cache with stale-while-revalidate in front of a price fetch"""
+
+    def __init__(self, fetch, ttl=None, stale_ttl=None, key=None, fallback=None, wait_timeout=None):
+        self.fetch = fetch
+        self.ttl = PRICE_CACHE_TTL if ttl is None else ttl
+        self.stale_ttl = PRICE_CACHE_STALE_TTL if stale_ttl is None else stale_ttl
+        # Identifies the upstream request, e.g. (endpoint, symbols, convert)
+        self.key = key if key is not None else fetch
+        self.fallback = fallback
+        self.wait_timeout = PRICE_FETCH_WAIT if wait_timeout is None else wait_timeout
+        self._snapshot = EMPTY_SNAPSHOT
+        # Last time upstream confirmed the current snapshot, even if it was unchanged
+        self._checked_at = 0.0
+        self._fallback_snapshot = None
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._revalidating = False
+        # Set by PriceRefresher; while it runs, readers never touch the network
+        self.refresher = None
+
+    def get(self):
+        """Return the current snapshot, refreshing it if it has expired"""
+        snapshot = self._snapshot
+        if self.refresher is not None and self.refresher.is_alive():
+            return snapshot if snapshot.data else self.last_good()
+
+        age = self._age(snapshot)
+
+        if age is not None and age < self.ttl:
+            return snapshot
+
+        if age is not None and age < self.ttl + self.stale_ttl:
+            self._revalidate_in_background()
+            return snapshot
+
+        return self.refresh(self.wait_timeout) or self.last_good()
+
+    def peek(self):
+        """Return the current snapshot without triggering any refresh"""
+        return self._snapshot
+
+    def last_good(self):
+        """The last published snapshot, or fallback data when nothing was ever fetched"""
+        snapshot = self._snapshot
+        if snapshot.data or self.fallback is None:
+            return snapshot
+
+        if self._fallback_snapshot is None:
+            self._fallback_snapshot = PriceSnapshot(tuple(self.fallback()), 0, 0.0)
+        return self._fallback_snapshot
+
+    def refresh(self, timeout=None):
+        """Fetch new prices synchronously and publish them"""
+        try:
+            return self.fetch_shared(timeout)
+        except TimeoutError:
+            # Another thread is still fetching; the caller serves last_good()
+            return None
+        except Exception as e:
+            print(f"Price refresh failed: {e}")
+            return None
+
+    def fetch_shared(self, timeout=None):
+        """Fetch and publish through the single-flight layer, raising on failure"""
+        return price_flights.do(self.key, self._fetch_and_publish, timeout)
+
+    def _fetch_and_publish(self):
+        data = self.fetch()
+        # An empty result means the upstream call failed; keep serving the
+        # last good snapshot instead of replacing it with nothing
+        if not data:
+            raise ValueError('upstream returned no prices')
+        return self.publish(data)
+
+    def publish(self, data):
+        """Atomically replace the current snapshot with new data
+
+        Data identical to the current snapshot only marks it as checked: the
+        version, ETags and listeners are left alone.
+        """
+        data = tuple(dict(item) for item in data)
+        with self._lock:
+            self._checked_at = time.time()
+            if data == self._snapshot.data:
+                return self._snapshot
+            snapshot = PriceSnapshot(data, self._snapshot.version + 1, self._checked_at)
+            self._snapshot = snapshot
+        self._notify(snapshot)
+        return snapshot
+
+    def install(self, snapshot):
+        """Adopt a snapshot published elsewhere, e.g. by another process, keeping its version"""
+        with self._lock:
+            if snapshot.version <= self._snapshot.version:
+                return self._snapshot
+            self._snapshot = snapshot
+        self._notify(snapshot)
+        return snapshot
+
+    @property
+    def checked_at(self):
+        return self._checked_at
+
+    def confirm(self, checked_at):
+        """Mark the current snapshot as checked upstream at checked_at, e.g. by another process"""
+        if checked_at > self._checked_at:
+            self._checked_at = checked_at
+
+    def add_listener(self, listener):
+        """Call listener(snapshot) every time a new snapshot is published"""
+        self._listeners.append(listener)
+
+    def set_listeners(self, listeners):
+        """Replace every listener, e.g. in a process that only needs some of them"""
+        self._listeners = list(listeners)
+
+    def _notify(self, snapshot):
+        for listener in self._listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                print(f"Price cache listener failed: {e}")
+
+    def _age(self, snapshot):
+        """Seconds since upstream last returned this snapshot's data"""
+        if snapshot is self._snapshot and snapshot.fetched_at:
+            return max(0.0, time.time() - max(snapshot.fetched_at, self._checked_at))
+        return snapshot.age()
+
+    def freshness(self, snapshot):
+        """Freshness metadata for a snapshot, suitable for JSON responses"""
+        age = self._age(snapshot)
+        if age is None:
+            return {'cached': False, 'stale': True, 'version': snapshot.version}
+
+        return {
+            'cached': True,
+            'version': snapshot.version,
+            'fetched_at': datetime.datetime.utcfromtimestamp(snapshot.fetched_at).isoformat() + 'Z',
+            'age_seconds': round(age, 3),
+            'ttl_seconds': self.ttl,
+            'stale': age >= self.ttl
+        }
+
+    def _revalidate_in_background(self):
+        with self._lock:
+            if self._revalidating:
+                return
+            self._revalidating = True
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                self._revalidating = False
+
+        threading.Thread(target=run, name='price-cache-revalidate', daemon=True).start()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+import time
+import random
+import datetime
+import threading
+
+from price_cache import env_seconds
+from credit_budget import credit_budget
+
+
+# How often prices are polled while healthy, and the longest delay between
+# attempts once errors start backing off
+PRICE_REFRESH_INTERVAL = env_seconds('PRICE_REFRESH_INTERVAL', 15)
+PRICE_REFRESH_MAX_BACKOFF = env_seconds('PRICE_REFRESH_MAX_BACKOFF', 300)
+
+
+class PriceRefresher(threading.Thread):
+    """Background poller that owns all upstream price calls for a cache"""
+
+    def __init__(self, cache, interval=None, max_backoff=None, budget=credit_budget):
+        super().__init__(name='price-refresher', daemon=True)
+        self.cache = cache
+        self.interval = PRICE_REFRESH_INTERVAL if interval is None else interval
+        self.max_backoff = PRICE_REFRESH_MAX_BACKOFF if max_backoff is None else max_backoff
+        # Paces polling so the CoinMarketCap credit quota lasts until it resets
+        self.budget = budget
+        self.skipped = 0
+        self.last_success = None
+        self.last_error = None
+        self.error_count = 0
+        self.consecutive_errors = 0
+        self._ready = threading.Event()
+        self._stopped = threading.Event()
+
+        # Once attached, request threads read the cache without fetching
+        cache.refresher = self
+
+    def run(self):
+        while not self._stopped.is_set():
+            self.poll_once()
+            self._ready.set()
+            self._stopped.wait(self.next_delay())
+
+    def poll_once(self):
+        """Fetch prices once and publish them as a new snapshot"""
+        if self.budget is not None and not self.budget.allow():
+            # Out of budget: readers keep getting the cached snapshot
+            self.skipped += 1
+            return None
+
+        try:
+            snapshot = self.cache.fetch_shared()
+        except Exception as e:
+            self.error_count += 1
+            self.consecutive_errors += 1
+            self.last_error = str(e)
+            print(f"Price refresher error ({self.consecutive_errors} in a row): {e}")
+            return None
+
+        self.last_success = time.time()
+        self.consecutive_errors = 0
+        return snapshot
+
+    def next_delay(self):
+        """Seconds until the next poll, with jittered exponential backoff on errors"""
+        interval = self.effective_interval()
+        if not self.consecutive_errors:
+            return interval
+        backoff = min(max(self.max_backoff, interval), interval * (2 ** self.consecutive_errors))
+        return backoff * random.uniform(0.5, 1.0)
+
+    def effective_interval(self):
+        """Base interval, stretched when the credit budget is running low"""
+        if self.budget is None:
+            return self.interval
+        return self.budget.stretch(self.interval)
+
+    def wait_until_ready(self, timeout=None):
+        """Block until the first poll has completed, or the timeout expires"""
+        return self._ready.wait(timeout)
+
+    def stop(self):
+        self._stopped.set()
+
+    def status(self):
+        """Health information for monitoring endpoints"""
+        last_success = None
+        if self.last_success:
+            last_success = datetime.datetime.utcfromtimestamp(self.last_success).isoformat() + 'Z'
+
+        return {
+            'running': self.is_alive(),
+            'interval_seconds': self.interval,
+            'effective_interval_seconds': round(self.effective_interval(), 2),
+            'last_success': last_success,
+            'error_count': self.error_count,
+            'consecutive_errors': self.consecutive_errors,
+            'last_error': self.last_error,
+            'skipped_for_budget': self.skipped,
+            'budget': self.budget.status() if self.budget is not None else None
+        }
+
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+import os
+import json
+import time
+import asyncio
+import threading
+from collections import deque
+
+from price_cache import env_seconds
+
+
+# Comment line sent when nothing changed, so proxies keep the connection
+# open and dead clients are noticed; and how many past events a
+# reconnecting client can catch up on through Last-Event-ID
+SSE_HEARTBEAT = env_seconds('SSE_HEARTBEAT', 15)
+SSE_HISTORY = int(os.environ.get('SSE_HISTORY', 256))
+SSE_RETRY_MS = 3000
+
+HEARTBEAT = b': ping\n\n'
+
+
+def _event(event_id, name, payload):
+    data = json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+    return f'id: {event_id}\nevent: {name}\ndata: {data}\n\n'.encode('utf-8')
+
+
+class PriceBroadcaster:
+    """Turns price snapshots into SSE events once and fans them out to every subscriber"""
+
+    def __init__(self, cache, history=None):
+        self.cache = cache
+        # Event ids are "<epoch>.<snapshot version>"; a restarted server has a
+        # new epoch, so ids from before the restart are never trusted
+        self.epoch = int(time.time())
+        self._events = deque(maxlen=SSE_HISTORY if history is None else history)
+        self._evicted = 0
+        self._quotes = {}
+        self._full = None
+        self._cond = threading.Condition()
+        self._loop_events = {}
+        self._loops_lock = threading.Lock()
+        self._subscribers_lock = threading.Lock()
+        self.subscribers = 0
+        cache.add_listener(self.publish)
+
+    def publish(self, snapshot):
+        """PriceCache listener: encode the changed quotes as one delta event"""
+        quotes = {quote.get('symbol'): quote for quote in snapshot.data}
+        changed = [quote for symbol, quote in quotes.items() if self._quotes.get(symbol) != quote]
+        removed = [symbol for symbol in self._quotes if symbol not in quotes]
+        event_id = f'{self.epoch}.{snapshot.version}'
+
+        with self._cond:
+            self._quotes = quotes
+            self._full = _event(event_id, 'snapshot', {'version': snapshot.version, 'quotes': list(quotes.values())})
+            if changed or removed:
+                payload = {'version': snapshot.version, 'quotes': changed}
+                if removed:
+                    payload['removed'] = removed
+                if len(self._events) == self._events.maxlen:
+                    self._evicted = self._events[0][0]
+                self._events.append((snapshot.version, _event(event_id, 'prices', payload)))
+            self._cond.notify_all()
+
+        with self._loops_lock:
+            loops = list(self._loop_events)
+        for loop in loops:
+            try:
+                loop.call_soon_threadsafe(self._wake_loop, loop)
+            except RuntimeError:
+                # Loop already closed
+                with self._loops_lock:
+                    self._loop_events.pop(loop, None)
+
+    def _cursor(self):
+        return self._events[-1][0] if self._events else 0
+
+    def subscribe(self, last_event_id=None):
+        """(cursor, first payload) for a new connection, resuming when possible"""
+        if self._full is None:
+            # Nothing published yet; start from whatever the cache holds. Read
+            # outside the lock: a cache miss may publish, which takes it
+            snapshot = self.cache.get()
+            with self._cond:
+                if self._full is None:
+                    self._quotes = {quote.get('symbol'): quote for quote in snapshot.data}
+                    self._full = _event(f'{self.epoch}.{snapshot.version}', 'snapshot',
+                                        {'version': snapshot.version, 'quotes': list(snapshot.data)})
+
+        with self._cond:
+            version = self._resume_point(last_event_id)
+            if version is not None:
+                missed = [data for event_version, data in self._events if event_version > version]
+                return self._cursor(), b''.join(missed)
+            return self._cursor(), self._full
+
+    def _resume_point(self, last_event_id):
+        try:
+            epoch, version = (int(part) for part in (last_event_id or '').split('.'))
+        except ValueError:
+            return None
+        # Resume only if no event after the client's one fell out of history
+        if epoch != self.epoch or version < self._evicted:
+            return None
+        return version
+
+    def events_after(self, cursor):
+        """(new cursor, event bytes) published since cursor"""
+        with self._cond:
+            data = b''.join(event for version, event in self._events if version > cursor)
+            return self._cursor(), data
+
+    def wait(self, cursor, timeout):
+        """Block until an event newer than cursor exists, or timeout"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._cursor() != cursor, timeout)
+
+    async def wait_async(self, cursor, timeout):
+        """wait() for coroutines; one asyncio.Event per loop, woken from the publisher"""
+        loop = asyncio.get_running_loop()
+        with self._loops_lock:
+            event = self._loop_events.get(loop)
+            if event is None:
+                event = self._loop_events[loop] = asyncio.Event()
+        # Checked only once the Event is registered: a publish after this
+        # check sees the Event and wakes it, one before it moved the cursor
+        if self._cursor() != cursor:
+            return
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def count_subscriber(self, delta):
+        # += on an attribute is not atomic across threads
+        with self._subscribers_lock:
+            self.subscribers += delta
+
+    def _wake_loop(self, loop):
+        # Runs on the loop; later waiters get a fresh Event
+        with self._loops_lock:
+            event = self._loop_events.pop(loop, None)
+        if event is not None:
+            event.set()
+
+    def status(self):
+        return {
+            'subscribers': self.subscribers,
+            'history': len(self._events),
+            'last_event_id': f'{self.epoch}.{self._cursor()}'
+        }
+
+
+class PriceSubscription:
+    """One client's event stream, served from a thread or from an event loop"""
+
+    def __init__(self, broadcaster, cursor):
+        self.broadcaster = broadcaster
+        self.cursor = cursor
+
+    def serve(self, wfile):
+        """Blocking loop for thread-per-connection servers; returns when the client leaves"""
+        self.broadcaster.count_subscriber(1)
+        try:
+            while True:
+                self.broadcaster.wait(self.cursor, SSE_HEARTBEAT)
+                self.cursor, data = self.broadcaster.events_after(self.cursor)
+                wfile.write(data or HEARTBEAT)
+                wfile.flush()
+        except (BrokenPipeError, ConnectionResetError, OSError):
+            pass
+        finally:
+            self.broadcaster.count_subscriber(-1)
+
+    async def stream_to(self, writer, reader=None):
+        """Coroutine for the asyncio engine; costs no thread per client"""
+        self.broadcaster.count_subscriber(1)
+        try:
+            while not writer.is_closing():
+                await self.broadcaster.wait_async(self.cursor, SSE_HEARTBEAT)
+                self.cursor, data = self.broadcaster.events_after(self.cursor)
+                writer.write(data or HEARTBEAT)
+                await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.broadcaster.count_subscriber(-1)
+
+
+def stream_prices(handler, broadcaster):
+    """Answer a request handler with a text/event-stream of price updates"""
+    cursor, first = broadcaster.subscribe(handler.headers.get('Last-Event-ID'))
+
+    handler.send_response(200)
+    handler.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+    handler.send_header('Cache-Control', 'no-cache')
+    handler.send_header('X-Accel-Buffering', 'no')
+    handler.send_header('Access-Control-Allow-Origin', '*')
+    # The body ends when either side closes the connection
+    handler.send_header('Connection', 'close')
+    handler.end_headers()
+    handler.wfile.write(f'retry: {SSE_RETRY_MS}\n\n'.encode('ascii') + first)
+
+    subscription = PriceSubscription(broadcaster, cursor)
+    if getattr(handler, 'request', None) is None:
+        # asyncio engine: hand the open connection back to the event loop
+        handler.stream = subscription
+        return
+    handler.wfile.flush()
+    subscription.serve(handler.wfile)
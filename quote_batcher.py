@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+import time
+import threading
+
+from price_cache import env_seconds
+
+
+# Per-symbol quote freshness, how long a batch waits to collect symbols from
+# other callers, and the most symbols sent in one upstream call
+QUOTE_CACHE_TTL = env_seconds('QUOTE_CACHE_TTL', 60)
+QUOTE_BATCH_WINDOW = env_seconds('QUOTE_BATCH_WINDOW', 0.02)
+QUOTE_BATCH_WAIT = env_seconds('QUOTE_BATCH_WAIT', 5)
+QUOTE_BATCH_SIZE = 100
+
+
+class _Batch:
+    def __init__(self, currency):
+        self.currency = currency
+        self.symbols = set()
+        self.done = threading.Event()
+
+
+class QuoteBatcher:
+    """Per-symbol quote cache that merges concurrent lookups into shared upstream calls"""
+
+    def __init__(self, fetch_batch, ttl=None, window=None, batch_size=QUOTE_BATCH_SIZE):
+        # fetch_batch(symbols, currency) -> {symbol: {'name': ..., 'quote': {...}}}
+        self.fetch_batch = fetch_batch
+        self.ttl = QUOTE_CACHE_TTL if ttl is None else ttl
+        self.window = QUOTE_BATCH_WINDOW if window is None else window
+        self.batch_size = batch_size
+        self.upstream_calls = 0
+        self._quotes = {}
+        self._open = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def get(self, symbols, convert=('USD',), timeout=None, max_age=None):
+        """Quotes for every symbol in every currency, fetching only what the cache lacks
+
+        With max_age, quotes older than that are refetched and, if the refetch
+        fails, left out, so a caller polling upstream still sees failures.
+        """
+        symbols = [symbol.upper() for symbol in symbols]
+        convert = [currency.upper() for currency in convert]
+        now = time.time()
+        ttl = self.ttl if max_age is None else min(self.ttl, max_age)
+
+        led = []
+        waiting = set()
+        with self._lock:
+            for currency in convert:
+                for symbol in symbols:
+                    entry = self._quotes.get((symbol, currency))
+                    if entry is not None and now - entry[2] < ttl:
+                        continue
+
+                    batch = self._pending.get((symbol, currency))
+                    if batch is None:
+                        batch = self._open.get(currency)
+                        if batch is None:
+                            batch = _Batch(currency)
+                            self._open[currency] = batch
+                            led.append(batch)
+                        batch.symbols.add(symbol)
+                        self._pending[(symbol, currency)] = batch
+                    waiting.add(batch)
+
+        if led:
+            # Give concurrent callers a moment to add their symbols to our batches
+            time.sleep(self.window)
+            for batch in led:
+                self._run(batch)
+
+        deadline = time.time() + (QUOTE_BATCH_WAIT if timeout is None else timeout)
+        for batch in waiting:
+            batch.done.wait(max(0.0, deadline - time.time()))
+
+        return self._collect(symbols, convert, None if max_age is None else now - ttl)
+
+    def store(self, symbol, name, currency, quote):
+        """Seed the cache with a quote obtained elsewhere, e.g. from a listings call"""
+        with self._lock:
+            self._quotes[(symbol.upper(), currency.upper())] = (name, quote, time.time())
+
+    def _run(self, batch):
+        with self._lock:
+            if self._open.get(batch.currency) is batch:
+                del self._open[batch.currency]
+            symbols = sorted(batch.symbols)
+
+        try:
+            for start in range(0, len(symbols), self.batch_size):
+                chunk = symbols[start:start + self.batch_size]
+                self.upstream_calls += 1
+                results = self.fetch_batch(chunk, batch.currency) or {}
+                for symbol, coin in results.items():
+                    self.store(symbol, coin['name'], batch.currency, coin['quote'])
+        except Exception as e:
+            print(f"Quote batch for {batch.currency} failed: {e}")
+        finally:
+            with self._lock:
+                for symbol in symbols:
+                    if self._pending.get((symbol, batch.currency)) is batch:
+                        del self._pending[(symbol, batch.currency)]
+            batch.done.set()
+
+    def _collect(self, symbols, convert, newer_than=None):
+        # Unless the caller set a limit, stale entries still fill in for
+        # symbols whose refresh failed
+        quotes = []
+        with self._lock:
+            for symbol in symbols:
+                item = None
+                for currency in convert:
+                    entry = self._quotes.get((symbol, currency))
+                    if entry is None or (newer_than is not None and entry[2] < newer_than):
+                        continue
+                    if item is None:
+                        item = {'symbol': symbol, 'name': entry[0], 'quote': {}}
+                    item['quote'][currency] = entry[1]
+                if item is not None:
+                    quotes.append(item)
+        return quotes
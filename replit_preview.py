@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 import os
 import json
-import requests
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from socketserver import ThreadingMixIn
+from price_cache import PriceCache
+from price_refresher import PriceRefresher, PRICE_REFRESH_INTERVAL
+from price_stream import PriceBroadcaster, stream_prices
+from crypto_api import DEFAULT_SYMBOLS, crypto_service as quote_service
 
 class CryptoAPIService:
     def __init__(self):
@@ -19,54 +22,39 @@ class CryptoAPIService:
             return []
             
         try:
-            symbols = ['BTC', 'ETH', 'BNB', 'SOL', 'DOGE', 'USDC']
-            
-            response = requests.get(
-                f'{self.base_url}/cryptocurrency/quotes/latest',
-                headers=self.headers,
-                params={
-                    'symbol': ','.join(symbols),
-                    'convert': 'USD'
-                },
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                crypto_data = []
-                
-                for symbol in symbols:
-                    if symbol in data['data']:
-                        coin = data['data'][symbol]
-                        quote = coin['quote']['USD']
-                        
-                        crypto_data.append({
-                            'symbol': symbol,
-                            'name': coin['name'],
-                            'price': round(quote['price'], 6),
-                            'change_24h': round(quote['percent_change_24h'], 2)
-                        })
-                
-                return crypto_data
-            else:
-                return []
+            # Through the shared per-symbol quote cache, so this fetch joins any
+            # concurrent quotes/latest batch and reuses quotes another caller
+            # fetched within the last half refresh interval
+            return [
+                {'symbol': coin['symbol'], 'name': coin['name'], **coin['quote']['USD']}
+                for coin in quote_service.get_quotes(DEFAULT_SYMBOLS, max_age=PRICE_REFRESH_INTERVAL / 2)
+            ]
                 
         except Exception as e:
             print(f"Error fetching data: {e}")
             return []
 
+# Shared by every request so prices are fetched once per TTL
+crypto_service = CryptoAPIService()
+price_cache = PriceCache(
+    crypto_service.get_real_time_prices,
+    key=('/cryptocurrency/quotes/latest', 'BTC,ETH,BNB,SOL,DOGE,USDC', 'USD')
+)
+price_refresher = PriceRefresher(price_cache)
+price_stream = PriceBroadcaster(price_cache)
+
 class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
     """Handle requests in a separate thread."""
     allow_reuse_address = True
+    # Event stream threads never finish on their own; don't wait for them
+    daemon_threads = True
 
 class RimTokenHandler(BaseHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        self.crypto_service = CryptoAPIService()
-        super().__init__(*args, **kwargs)
-
     def do_GET(self):
         if self.path == '/api/crypto/prices':
             self.handle_crypto_api()
+        elif self.path == '/api/crypto/stream':
+            self.handle_price_stream()
         elif self.path == '/health':
             self.handle_health_check()
         else:
@@ -88,13 +76,18 @@ class RimTokenHandler(BaseHTTPRequestHandler):
         self.end_headers()
         
         health_data = {
-            'status': 'healthy',
+            'status': 'degraded' if price_refresher.consecutive_errors else 'healthy',
             'service': 'RimToken Trading Platform',
-            'coinmarketcap_api': 'connected' if self.crypto_service.api_key else 'not_configured'
+            'coinmarketcap_api': 'connected' if crypto_service.api_key else 'not_configured',
+            'price_refresher': price_refresher.status()
         }
         
         self.wfile.write(json.dumps(health_data, ensure_ascii=False).encode('utf-8'))
     
+    def handle_price_stream(self):
+        """Server-Sent Events stream of changed quotes"""
+        stream_prices(self, price_stream)
+    
     def handle_crypto_api(self):
         """API endpoint for cryptocurrency prices"""
         self.send_response(200)
@@ -102,12 +95,13 @@ class RimTokenHandler(BaseHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Origin', '*')
         self.end_headers()
         
-        crypto_data = self.crypto_service.get_real_time_prices()
+        snapshot = price_cache.get()
         response_data = {
             'success': True,
-            'data': crypto_data,
+            'data': snapshot.data,
             'source': 'CoinMarketCap API',
-            'count': len(crypto_data)
+            'count': len(snapshot.data),
+            'cache': price_cache.freshness(snapshot)
         }
         
         self.wfile.write(json.dumps(response_data, ensure_ascii=False).encode('utf-8'))
@@ -121,7 +115,7 @@ class RimTokenHandler(BaseHTTPRequestHandler):
         self.end_headers()
         
         # Get authentic cryptocurrency data
-        crypto_data = self.crypto_service.get_real_time_prices()
+        crypto_data = price_cache.get().data
         
         # Generate real-time price display
         price_display = ""
@@ -460,8 +454,16 @@ class RimTokenHandler(BaseHTTPRequestHandler):
                 .catch(error => console.error('خطأ:', error));
         }}
         
-        // تحديث تلقائي كل 30 ثانية
-        setInterval(refreshPrices, 30000);
+        // تحديث تلقائي عند تغير الأسعار، أو كل 30 ثانية بدون EventSource
+        if (window.EventSource) {{
+            const priceStream = new EventSource('/api/crypto/stream');
+            priceStream.addEventListener('prices', event => {{
+                console.log('تم تحديث الأسعار:', JSON.parse(event.data).quotes);
+                setTimeout(() => location.reload(), 1000);
+            }});
+        }} else {{
+            setInterval(refreshPrices, 30000);
+        }}
         
         console.log('✅ RimToken منصة تعمل بالبيانات الحقيقية');
         console.log('🔗 API Endpoint: /api/crypto/prices');
@@ -474,6 +476,8 @@ class RimTokenHandler(BaseHTTPRequestHandler):
 
 if __name__ == "__main__":
     # استخدام الخادم المحسن للمعاينة
+    price_refresher.start()
+    price_refresher.wait_until_ready(5)
     server_address = ('0.0.0.0', 3000)
     httpd = ThreadedHTTPServer(server_address, RimTokenHandler)
     
@@ -1,9 +1,13 @@
 #!/usr/bin/env python3
 import os
 import json
-import requests
 from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
 from datetime import datetime
+from price_cache import PriceCache
+from price_refresher import PriceRefresher, PRICE_REFRESH_INTERVAL
+from price_stream import PriceBroadcaster, stream_prices
+from crypto_api import DEFAULT_SYMBOLS, crypto_service as quote_service
 
 class CryptoAPIService:
     def __init__(self):
@@ -17,57 +21,45 @@ class CryptoAPIService:
     def get_real_time_prices(self):
         """الحصول على أسعار العملات الحقيقية من CoinMarketCap"""
         try:
-            symbols = ['BTC', 'ETH', 'BNB', 'SOL', 'DOGE', 'USDC']
-            
-            response = requests.get(
-                f'{self.base_url}/cryptocurrency/quotes/latest',
-                headers=self.headers,
-                params={
-                    'symbol': ','.join(symbols),
-                    'convert': 'USD'
-                },
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                crypto_data = []
-                
-                for symbol in symbols:
-                    if symbol in data['data']:
-                        coin = data['data'][symbol]
-                        quote = coin['quote']['USD']
-                        
-                        crypto_data.append({
-                            'symbol': symbol,
-                            'name': coin['name'],
-                            'price': round(quote['price'], 6),
-                            'change_24h': round(quote['percent_change_24h'], 2),
-                            'market_cap': quote['market_cap'],
-                            'volume_24h': quote['volume_24h'],
-                            'last_updated': quote['last_updated']
-                        })
-                
-                return crypto_data
-            else:
-                print(f"خطأ في API: {response.status_code}")
-                return []
+            # Through the shared per-symbol quote cache, so this fetch joins any
+            # concurrent quotes/latest batch and reuses quotes another caller
+            # fetched within the last half refresh interval
+            return [
+                {'symbol': coin['symbol'], 'name': coin['name'], **coin['quote']['USD']}
+                for coin in quote_service.get_quotes(DEFAULT_SYMBOLS, max_age=PRICE_REFRESH_INTERVAL / 2)
+            ]
                 
         except Exception as e:
             print(f"خطأ في الحصول على البيانات: {e}")
             return []
 
+# Shared by every request so prices are fetched once per TTL
+crypto_service = CryptoAPIService()
+price_cache = PriceCache(
+    crypto_service.get_real_time_prices,
+    key=('/cryptocurrency/quotes/latest', 'BTC,ETH,BNB,SOL,DOGE,USDC', 'USD')
+)
+price_refresher = PriceRefresher(price_cache)
+price_stream = PriceBroadcaster(price_cache)
+
+class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
+    """Handle requests in a separate thread so event streams do not block pages"""
+    allow_reuse_address = True
+    daemon_threads = True
+
 class RimTokenHandler(BaseHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        self.crypto_service = CryptoAPIService()
-        super().__init__(*args, **kwargs)
-    
     def do_GET(self):
         if self.path == '/api/crypto/prices':
             self.handle_crypto_api()
+        elif self.path == '/api/crypto/stream':
+            self.handle_price_stream()
         else:
             self.handle_main_page()
     
+    def handle_price_stream(self):
+        """بث الأسعار المتغيرة فقط عبر Server-Sent Events"""
+        stream_prices(self, price_stream)
+    
     def handle_crypto_api(self):
         """واجهة برمجة التطبيقات للحصول على أسعار العملات"""
         self.send_response(200)
@@ -75,12 +67,13 @@ class RimTokenHandler(BaseHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Origin', '*')
         self.end_headers()
         
-        crypto_data = self.crypto_service.get_real_time_prices()
+        snapshot = price_cache.get()
         response_data = {
             'success': True,
-            'data': crypto_data,
+            'data': snapshot.data,
             'last_updated': datetime.now().isoformat(),
-            'source': 'CoinMarketCap'
+            'source': 'CoinMarketCap',
+            'cache': price_cache.freshness(snapshot)
         }
         
         self.wfile.write(json.dumps(response_data, ensure_ascii=False).encode('utf-8'))
@@ -93,7 +86,7 @@ class RimTokenHandler(BaseHTTPRequestHandler):
         self.end_headers()
         
         # الحصول على البيانات الحقيقية
-        crypto_data = self.crypto_service.get_real_time_prices()
+        crypto_data = price_cache.get().data
         
         # تحويل البيانات إلى JavaScript
         crypto_js_data = json.dumps(crypto_data, ensure_ascii=False)
@@ -446,8 +439,31 @@ class RimTokenHandler(BaseHTTPRequestHandler):
             }}
         }}
         
-        // تحديث الأسعار كل 30 ثانية
-        setInterval(refreshPrices, 30000);
+        // الخادم يرسل الأسعار المتغيرة فقط؛ الاستطلاع كل 30 ثانية بدون EventSource
+        function applyQuotes(quotes, removed) {{
+            const bySymbol = new Map(cryptoData.map(coin => [coin.symbol, coin]));
+            quotes.forEach(coin => bySymbol.set(coin.symbol, coin));
+            (removed || []).forEach(symbol => bySymbol.delete(symbol));
+            cryptoData = Array.from(bySymbol.values());
+            renderCryptoCards();
+            
+            const now = new Date().toLocaleString('ar-SA');
+            document.getElementById('lastUpdated').textContent = `آخر تحديث: ${{now}}`;
+        }}
+        
+        if (window.EventSource) {{
+            const priceStream = new EventSource('/api/crypto/stream');
+            priceStream.addEventListener('snapshot', event => {{
+                cryptoData = [];
+                applyQuotes(JSON.parse(event.data).quotes);
+            }});
+            priceStream.addEventListener('prices', event => {{
+                const update = JSON.parse(event.data);
+                applyQuotes(update.quotes, update.removed);
+            }});
+        }} else {{
+            setInterval(refreshPrices, 30000);
+        }}
         
         // رسم البطاقات عند تحميل الصفحة
         renderCryptoCards();
@@ -458,8 +474,10 @@ class RimTokenHandler(BaseHTTPRequestHandler):
         self.wfile.write(html_content.encode('utf-8'))
 
 if __name__ == "__main__":
+    price_refresher.start()
+    price_refresher.wait_until_ready(5)
     server_address = ('0.0.0.0', 3000)
-    httpd = HTTPServer(server_address, RimTokenHandler)
+    httpd = ThreadedHTTPServer(server_address, RimTokenHandler)
     
     print("🔐 RimToken Trading Platform running on port 3000")
     print("🌐 Access at: http://localhost:3000")
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+import os
+import hmac
+import time
+import base64
+import hashlib
+import secrets
+import threading
+from collections import OrderedDict
+
+from price_cache import env_seconds
+from sqlite_db import USER_DATA_DIR, SQLiteDatabase
+
+
+# Session lifetime, how many sessions are kept in memory, and how many
+# independently locked shards the table is split into
+SESSION_TTL = int(os.environ.get('SESSION_TTL', 7 * 24 * 3600))
+SESSION_MAX = int(os.environ.get('SESSION_MAX', 100000))
+SESSION_SHARDS = int(os.environ.get('SESSION_SHARDS', 16))
+# How long a logout in one worker may take to reach the others
+SESSION_REVOCATION_POLL = env_seconds('SESSION_REVOCATION_POLL', 1)
+SESSION_COOKIE = 'rimtoken_session'
+
+
+def _encode(text):
+    return base64.urlsafe_b64encode(text.encode('utf-8')).rstrip(b'=').decode('ascii')
+
+
+def _decode(text):
+    try:
+        return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4)).decode('utf-8')
+    except ValueError:
+        return None
+
+
+class SessionShard:
+    """One LRU slice of the session table with its own lock"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+
+class RevocationList:
+    """Logged-out tokens, shared by every worker process until they expire
+
+    They must outlive the LRU table and reach every worker, or the signature
+    alone would accept the token again. Each worker keeps the list in memory
+    and reads only rows added since its last poll, so checking a token never
+    touches the database.
+    """
+
+    def __init__(self, path=None, poll_interval=None):
+        self.db = SQLiteDatabase(
+            os.path.join(USER_DATA_DIR, 'sessions.db') if path is None else path,
+            # AUTOINCREMENT ids are never reused, so the highest id seen marks
+            # where the next poll continues
+            'CREATE TABLE IF NOT EXISTS session_revocations (id INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' token_hash TEXT NOT NULL UNIQUE, expires INTEGER NOT NULL);'
+            'CREATE INDEX IF NOT EXISTS session_revocations_by_expires ON session_revocations (expires);'
+        )
+        self.poll_interval = SESSION_REVOCATION_POLL if poll_interval is None else poll_interval
+        self._revoked = {}
+        self._seen_id = 0
+        self._polled = 0.0
+        self._lock = threading.Lock()
+        self._poll()
+
+    @staticmethod
+    def _key(token):
+        # Only a digest is stored, so the table never holds a usable token
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    def add(self, token, expires):
+        key = self._key(token)
+        self._revoked[key] = expires
+
+        def revoke(connection):
+            connection.execute('INSERT OR REPLACE INTO session_revocations (token_hash, expires) VALUES (?, ?)',
+                               (key, expires))
+            # Drop entries that expired anyway so the table stays small
+            connection.execute('DELETE FROM session_revocations WHERE expires <= ?', (int(time.time()),))
+        self.db.write(revoke)
+
+    def _poll(self):
+        """Pick up tokens revoked by any worker since the last poll"""
+        # One thread polls; the others go on with the list as it is
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            now = time.time()
+            rows = self.db.fetchall('SELECT id, token_hash, expires FROM session_revocations'
+                                    ' WHERE id > ? AND expires > ? ORDER BY id', (self._seen_id, int(now)))
+            for row in rows:
+                self._revoked[row['token_hash']] = row['expires']
+            if rows:
+                self._seen_id = rows[-1]['id']
+            for key, expires in list(self._revoked.items()):
+                if expires <= now:
+                    del self._revoked[key]
+            self._polled = time.monotonic()
+        finally:
+            self._lock.release()
+
+    def __contains__(self, token):
+        if time.monotonic() - self._polled >= self.poll_interval:
+            self._poll()
+        return self._key(token) in self._revoked
+
+
+class SessionStore:
+    """Signed session tokens with an expiring, sharded LRU table in front"""
+
+    def __init__(self, secret, ttl=None, max_sessions=None, shards=None, revoked=None):
+        self.secret = secret.encode('utf-8') if isinstance(secret, str) else secret
+        self.ttl = SESSION_TTL if ttl is None else ttl
+        shards = SESSION_SHARDS if shards is None else shards
+        capacity = max(1, (SESSION_MAX if max_sessions is None else max_sessions) // shards)
+        self.shards = [SessionShard(capacity) for _ in range(shards)]
+        self.revoked = RevocationList() if revoked is None else revoked
+
+    def _sign(self, payload):
+        digest = hmac.new(self.secret, payload.encode('ascii'), hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest).rstrip(b'=').decode('ascii')
+
+    def _shard(self, token):
+        return self.shards[hash(token) % len(self.shards)]
+
+    def create(self, user):
+        """Issue a token for a user record and remember the session"""
+        expires = int(time.time()) + self.ttl
+        # The username is signed too, so the token only ever names this user
+        payload = f"v2.{user['id']}.{_encode(user['username'])}.{expires}.{secrets.token_urlsafe(16)}"
+        token = f"{payload}.{self._sign(payload)}"
+        self._remember(token, {'user_id': user['id'], 'username': user['username'], 'expires': expires})
+        return token
+
+    def _remember(self, token, session):
+        shard = self._shard(token)
+        with shard.lock:
+            shard.sessions[token] = session
+            shard.sessions.move_to_end(token)
+            while len(shard.sessions) > shard.capacity:
+                shard.sessions.popitem(last=False)
+
+    def _verify(self, token):
+        """(user_id, username, expires) from a correctly signed token, else None"""
+        if not token or token.count('.') != 5 or not token.startswith('v2.'):
+            return None
+        payload, _, signature = token.rpartition('.')
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            return None
+        _, user_id, username, expires, _ = payload.split('.')
+        return int(user_id), _decode(username), int(expires)
+
+    def get(self, token, load_user=None):
+        """Session for a token, or None; never touches the password hash"""
+        claims = self._verify(token)
+        if claims is None:
+            return None
+
+        now = time.time()
+        shard = self._shard(token)
+        with shard.lock:
+            session = shard.sessions.get(token)
+            if session is not None:
+                if session['expires'] <= now:
+                    del shard.sessions[token]
+                    return None
+                shard.sessions.move_to_end(token)
+
+        # Logouts from any worker land in the shared list
+        if token in self.revoked:
+            if session is not None:
+                with shard.lock:
+                    shard.sessions.pop(token, None)
+            return None
+        if session is not None:
+            return session
+
+        # Evicted, or issued by another worker process: the signed token is
+        # still proof of the session, so rebuild the entry from it
+        user_id, username, expires = claims
+        if expires <= now or load_user is None:
+            return None
+        user = load_user(user_id)
+        # The id must still belong to the user the token was issued to
+        if user is None or user['username'] != username:
+            return None
+        session = {'user_id': user['id'], 'username': user['username'], 'expires': expires}
+        self._remember(token, session)
+        return session
+
+    def revoke(self, token):
+        claims = self._verify(token)
+        if claims is None:
+            return
+        self.revoked.add(token, claims[2])
+        shard = self._shard(token)
+        with shard.lock:
+            shard.sessions.pop(token, None)
+
+    def __len__(self):
+        return sum(len(shard.sessions) for shard in self.shards)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+# Where the SQLite database lives, and whether every commit is fsync'ed
+# (turn off only for throwaway environments)
+USER_DATA_DIR = os.environ.get('USER_DATA_DIR', 'data')
+USER_DB_FSYNC = os.environ.get('USER_DB_FSYNC', '1') != '0'
+DATABASE_BUSY_TIMEOUT = 10
+# Idle read connections kept open per process
+DATABASE_POOL_SIZE = 8
+# Most writes committed together in one transaction
+DATABASE_WRITE_BATCH = 256
+
+
+class _PendingWrite:
+    def __init__(self, fn):
+        self.fn = fn
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class SQLiteDatabase:
+    """One SQLite file shared by every thread and worker process
+
+    Reads borrow a connection from a per-process pool, so request threads do
+    not open (and configure) a connection each.
+
+    Writes go through one writer thread per process, which commits every
+    write queued while the previous commit was syncing in a single
+    transaction, so a burst of registrations costs one fsync, not one each.
+    """
+
+    def __init__(self, path, schema='', fsync=None):
+        self.path = path
+        self.fsync = USER_DB_FSYNC if fsync is None else fsync
+        self.schema = schema
+        self._pool = None
+        self._pool_pid = None
+        self._writes = None
+        self._writer_pid = None
+        self._writer_lock = threading.Lock()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self.connection() as connection:
+            # WAL lets worker processes read while one of them writes; the
+            # mode is stored in the file, so setting it once is enough
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.executescript(schema)
+
+    def _open(self, isolation_level=''):
+        connection = sqlite3.connect(self.path, timeout=DATABASE_BUSY_TIMEOUT,
+                                     isolation_level=isolation_level, check_same_thread=False)
+        connection.row_factory = sqlite3.Row
+        connection.execute('PRAGMA synchronous=%s' % ('FULL' if self.fsync else 'OFF'))
+        return connection
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection; connections never cross a fork"""
+        if self._pool_pid != os.getpid():
+            self._pool = queue.LifoQueue()
+            self._pool_pid = os.getpid()
+        pool = self._pool
+        try:
+            connection = pool.get_nowait()
+        except queue.Empty:
+            connection = self._open()
+        try:
+            yield connection
+        finally:
+            if connection.in_transaction:
+                connection.rollback()
+            if pool.qsize() < DATABASE_POOL_SIZE:
+                pool.put(connection)
+            else:
+                connection.close()
+
+    def fetchone(self, sql, parameters=()):
+        with self.connection() as connection:
+            return connection.execute(sql, parameters).fetchone()
+
+    def fetchall(self, sql, parameters=()):
+        with self.connection() as connection:
+            return connection.execute(sql, parameters).fetchall()
+
+    def write(self, fn):
+        """Run fn(connection) in a transaction shared with other queued writes
+
+        Returns what fn returns or raises what it raises; a failing write is
+        rolled back to its savepoint without affecting the rest of the batch.
+        """
+        pending = _PendingWrite(fn)
+        self._queue().put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _queue(self):
+        # Started on first write, so a process that only forks workers never runs it
+        with self._writer_lock:
+            if self._writer_pid != os.getpid():
+                self._writes = queue.Queue()
+                self._writer_pid = os.getpid()
+                threading.Thread(target=self._write_loop, args=(self._writes,),
+                                 name='sqlite-writer', daemon=True).start()
+            return self._writes
+
+    def _write_loop(self, writes):
+        connection = self._open(isolation_level=None)
+        while True:
+            batch = [writes.get()]
+            while len(batch) < DATABASE_WRITE_BATCH:
+                try:
+                    batch.append(writes.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                connection.execute('BEGIN IMMEDIATE')
+                for pending in batch:
+                    connection.execute('SAVEPOINT pending_write')
+                    try:
+                        pending.result = pending.fn(connection)
+                    except Exception as e:
+                        pending.error = e
+                        connection.execute('ROLLBACK TO pending_write')
+                    connection.execute('RELEASE pending_write')
+                connection.execute('COMMIT')
+            except Exception as e:
+                # Nothing in the batch was committed
+                if connection.in_transaction:
+                    connection.execute('ROLLBACK')
+                for pending in batch:
+                    pending.result, pending.error = None, pending.error or e
+            for pending in batch:
+                pending.done.set()
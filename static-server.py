@@ -3,16 +3,34 @@ import http.server
 import socketserver
 import os
 
+from http_cache import file_validators, is_not_modified
+
 class StaticHandler(http.server.SimpleHTTPRequestHandler):
     def do_GET(self):
         if self.path == '/' or self.path == '':
             self.path = '/index.html'
         return super().do_GET()
-    
+
+    def send_head(self):
+        # Answer conditional requests from the file's validators before opening it
+        self.etag = None
+        path = self.translate_path(self.path)
+        if os.path.isfile(path):
+            try:
+                self.etag, last_modified = file_validators.get(path)
+            except OSError:
+                return super().send_head()
+            if is_not_modified(self.headers, self.etag, last_modified):
+                self.send_response(304)
+                self.end_headers()
+                return None
+        return super().send_head()
+
     def end_headers(self):
-        self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate')
-        self.send_header('Pragma', 'no-cache')
-        self.send_header('Expires', '0')
+        # Browsers may keep files but must revalidate them; a match costs a 304
+        self.send_header('Cache-Control', 'no-cache')
+        if getattr(self, 'etag', None):
+            self.send_header('ETag', self.etag)
         super().end_headers()
 
 PORT = 3000
@@ -20,4 +38,4 @@ os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
 with socketserver.TCPServer(("0.0.0.0", PORT), StaticHandler) as httpd:
     print(f"RimToken static server running on port {PORT}")
-    httpd.serve_forever()
\ No newline at end of file
+    httpd.serve_forever()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+import os
+import time
+import mimetypes
+import threading
+
+from price_cache import env_seconds
+from http_cache import content_etag, http_date
+
+
+# Files up to this size are held in memory; larger ones are streamed with
+# sendfile. Files are re-checked against disk at most once per interval.
+STATIC_MEMORY_LIMIT = int(os.environ.get('STATIC_MEMORY_LIMIT', 512 * 1024))
+STATIC_CHECK_INTERVAL = env_seconds('STATIC_CHECK_INTERVAL', 2)
+STATIC_CACHE_CONTROL = os.environ.get('STATIC_CACHE_CONTROL', 'public, max-age=3600')
+
+CONTENT_TYPES = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.jfif': 'image/jpeg',
+    '.png': 'image/png',
+    '.gif': 'image/gif',
+    '.webp': 'image/webp',
+    '.svg': 'image/svg+xml',
+}
+
+
+class Asset:
+    """One indexed file: validators, precomputed headers and, if small, its bytes"""
+
+    def __init__(self, path, stat):
+        self.path = path
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.key = (stat.st_mtime_ns, stat.st_size)
+        extension = os.path.splitext(path)[1].lower()
+        self.content_type = CONTENT_TYPES.get(extension) or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.checked = time.monotonic()
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        self.etag = content_etag(data)
+        self.data = data if self.size <= STATIC_MEMORY_LIMIT else None
+
+        self.headers = [
+            ('Content-Type', self.content_type),
+            ('ETag', self.etag),
+            ('Last-Modified', http_date(self.mtime)),
+            ('Cache-Control', STATIC_CACHE_CONTROL),
+            ('Accept-Ranges', 'bytes'),
+        ]
+
+
+class AssetIndex:
+    """Index of a flat asset directory, refreshed when files change on disk"""
+
+    def __init__(self, root):
+        self.root = root
+        self._assets = {}
+        self._lock = threading.Lock()
+        self._scanned = 0.0
+        self.scan()
+
+    def scan(self):
+        """Index every file in the directory, reusing entries that did not change"""
+        assets = {}
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            names = []
+        for name in names:
+            path = os.path.join(self.root, name)
+            try:
+                stat = os.stat(path)
+                if not os.path.isfile(path):
+                    continue
+                current = self._assets.get(name)
+                if current is not None and current.key == (stat.st_mtime_ns, stat.st_size):
+                    assets[name] = current
+                else:
+                    assets[name] = Asset(path, stat)
+            except OSError as e:
+                print(f"Skipping asset {name}: {e}")
+        with self._lock:
+            self._assets = assets
+            self._scanned = time.monotonic()
+        return assets
+
+    def get(self, name):
+        """Asset for a bare file name, or None; never resolves paths outside the root"""
+        if not name or name != os.path.basename(name) or name.startswith('.'):
+            return None
+
+        asset = self._assets.get(name)
+        now = time.monotonic()
+        if asset is None:
+            # New files show up after at most one check interval
+            if now - self._scanned < STATIC_CHECK_INTERVAL:
+                return None
+            return self.scan().get(name)
+
+        if now - asset.checked >= STATIC_CHECK_INTERVAL:
+            asset = self._revalidate(name, asset)
+        return asset
+
+    def _revalidate(self, name, asset):
+        try:
+            stat = os.stat(asset.path)
+        except FileNotFoundError:
+            with self._lock:
+                self._assets.pop(name, None)
+            return None
+        if (stat.st_mtime_ns, stat.st_size) == asset.key:
+            asset.checked = time.monotonic()
+            return asset
+        try:
+            asset = Asset(asset.path, stat)
+        except OSError:
+            return None
+        with self._lock:
+            self._assets[name] = asset
+        return asset
+
+    def stats(self):
+        assets = list(self._assets.values())
+        return {
+            'files': len(assets),
+            'in_memory': sum(1 for asset in assets if asset.data is not None),
+            'memory_bytes': sum(asset.size for asset in assets if asset.data is not None)
+        }
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single byte range, None to send the whole
+    file, or False when the range cannot be satisfied"""
+    if not header or not header.startswith('bytes=') or ',' in header:
+        # Multiple ranges are rare for images; the full body is a valid answer
+        return None
+    first, _, last = header[6:].strip().partition('-')
+    try:
+        if not first:
+            length = int(last)
+            if length <= 0:
+                return False
+            return max(size - length, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
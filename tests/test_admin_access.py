@@ -0,0 +1,69 @@
+import os
+import types
+import tempfile
+import threading
+import unittest
+import http.client
+from unittest import mock
+
+import main
+from sessions import RevocationList, SessionStore
+from user_store import UserStore
+
+
+class AdminAccessTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        users = UserStore(os.path.join(self.directory.name, 'users.db'))
+        sessions = SessionStore('test-secret', revoked=RevocationList(os.path.join(self.directory.name, 'sessions.db')))
+        self.admin = sessions.create(users.add('root', 'root@example.com', 'hash'))
+        self.member = sessions.create(users.add('alice', 'alice@example.com', 'hash'))
+
+        self.server = main.ThreadedHTTPServer(('127.0.0.1', 0), main.LandingPageHandler)
+        self.server.app = types.SimpleNamespace(user_store=users, session_store=sessions)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+        for patcher in (mock.patch('main.ADMIN_USERS', frozenset({'root'})),
+                        mock.patch('main.ADMIN_TOKEN', 'ops-token'),
+                        mock.patch.object(main.LandingPageHandler, 'log_message')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join(5)
+        self.server.server_close()
+        self.directory.cleanup()
+
+    def status(self, path, token=None):
+        connection = http.client.HTTPConnection(*self.server.server_address, timeout=5)
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        connection.request('GET', path, headers=headers)
+        response = connection.getresponse()
+        body = response.read()
+        connection.close()
+        return response.status, body
+
+    def test_admin_pages_need_an_admin(self):
+        for path in ('/admin/users', '/admin/users/export?format=csv'):
+            self.assertEqual(self.status(path)[0], 401, path)
+            self.assertEqual(self.status(path, 'not-a-session')[0], 401, path)
+            self.assertEqual(self.status(path, self.member)[0], 403, path)
+            self.assertEqual(self.status(path, self.admin)[0], 200, path)
+            self.assertEqual(self.status(path, 'ops-token')[0], 200, path)
+
+    def test_export_is_served_to_the_admin_token(self):
+        status, body = self.status('/admin/users/export?format=csv', 'ops-token')
+        self.assertEqual(status, 200)
+        self.assertIn(b'alice@example.com', body)
+
+    def test_no_configured_admins_means_no_access(self):
+        with mock.patch('main.ADMIN_USERS', frozenset()), mock.patch('main.ADMIN_TOKEN', ''):
+            self.assertEqual(self.status('/admin/users', self.admin)[0], 403)
+            self.assertEqual(self.status('/admin/users', '')[0], 401)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import socket
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler
+
+from async_server import AsyncHTTPServer, STREAM_BUFFER_BYTES
+
+
+class ExportHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    release = threading.Event()
+
+    def do_GET(self):
+        body = b'x' * (2 * STREAM_BUFFER_BYTES)
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body) + 5))
+        self.end_headers()
+        self.wfile.write(body)
+        # The first part must already be on the wire while the handler waits
+        self.release.wait(5)
+        self.wfile.write(b'done!')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class AsyncServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = AsyncHTTPServer(('127.0.0.1', 0), ExportHandler, max_handlers=2)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        ExportHandler.release.set()
+        self.server.shutdown()
+        self.thread.join(5)
+        self.server.server_close()
+
+    def test_long_response_is_streamed_before_the_handler_returns(self):
+        ExportHandler.release.clear()
+        client = socket.create_connection(self.server.socket.getsockname(), timeout=5)
+        client.sendall(b'GET /export HTTP/1.1\r\nHost: test\r\nConnection: close\r\n\r\n')
+
+        received = b''
+        while len(received) < 2 * STREAM_BUFFER_BYTES:
+            received += client.recv(65536)
+        self.assertNotIn(b'done!', received)
+
+        ExportHandler.release.set()
+        while True:
+            data = client.recv(65536)
+            if not data:
+                break
+            received += data
+        client.close()
+        self.assertTrue(received.startswith(b'HTTP/1.1 200'))
+        self.assertTrue(received.endswith(b'done!'))
+
+
+if __name__ == '__main__':
+    unittest.main()
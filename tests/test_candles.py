@@ -0,0 +1,108 @@
+import tempfile
+import unittest
+from array import array
+
+from candles import CandleBook, resample
+from price_cache import PriceSnapshot
+from timeseries import TimeSeriesStore
+
+
+# On an hour boundary, so every interval's first candle is complete
+START = 999_997_200.0
+
+
+def tick(t, price, volume):
+    return PriceSnapshot(({'symbol': 'BTC', 'price': price, 'volume_24h': volume},), 1, t)
+
+
+def columns(*ticks):
+    return {
+        'ts': array('d', [t for t, _, _ in ticks]),
+        'price': array('d', [price for _, price, _ in ticks]),
+        'volume_24h': array('d', [volume for _, _, volume in ticks])
+    }
+
+
+class ResampleTest(unittest.TestCase):
+
+    def test_ticks_become_one_candle_per_bucket(self):
+        candles = resample(columns((60, 5.0, 1), (70, 9.0, 2), (80, 4.0, 3), (130, 6.0, 4)), 60)
+        self.assertEqual(candles, {
+            't': [60.0, 120.0], 'open': [5.0, 6.0], 'high': [9.0, 6.0], 'low': [4.0, 6.0],
+            'close': [4.0, 6.0], 'volume_24h': [3.0, 4.0], 'ticks': [3, 1]
+        })
+
+    def test_missing_prices_are_skipped(self):
+        candles = resample(columns((60, float('nan'), 1), (70, 2.0, 2)), 60)
+        self.assertEqual(candles['open'], [2.0])
+        self.assertEqual(resample(columns(), 60)['t'], [])
+
+
+class CandleBookTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = TimeSeriesStore(self.directory.name, retention_days=0)
+        self.book = CandleBook(self.store)
+        # Half an hour of ticks every 20 seconds, fed to both like the app does
+        self.last = START
+        for index in range(90):
+            self.last = START + index * 20
+            snapshot = tick(self.last, 100.0 + index * 7 % 13, float(index))
+            self.store.record(snapshot)
+            self.book.record(snapshot)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_memory_candles_match_resampled_history(self):
+        for interval, step in (('1m', 60), ('5m', 300), ('1h', 3600)):
+            start = self.book._symbols['BTC'].covered_from(interval)
+            from_memory = self.book.candles('BTC', interval, start, self.last)
+            from_ticks = resample(self.store.query('BTC', start, self.last), step)
+            self.assertEqual(from_memory, from_ticks, interval)
+        self.assertEqual(self.book.status()['memory_hits'], 3)
+        self.assertEqual(self.book.status()['resampled'], 0)
+
+    def test_open_candle_includes_the_lower_intervals(self):
+        hour = self.book.candles('BTC', '1h', START, self.last)
+        self.assertEqual(self.book.status()['memory_hits'], 1)
+        self.assertEqual(hour['ticks'], [90])
+        self.assertEqual(hour['high'], [112.0])
+        self.assertEqual(hour['close'], [100.0 + 89 * 7 % 13])
+
+    def test_ranges_before_memory_are_resampled_from_the_store(self):
+        start = START - 3600
+        candles = self.book.candles('BTC', '1m', start, self.last)
+        self.assertEqual(self.book.status()['resampled'], 1)
+        self.assertEqual(sum(candles['ticks']), 90)
+        self.assertEqual(candles['t'][0], START)
+
+    def test_full_memory_falls_back_to_the_store(self):
+        book = CandleBook(capacity=5)
+        for index in range(30):
+            book.record(tick(START + index * 20, 1.0 + index, float(index)))
+        # Only the last five closed minutes are kept, so earlier ones are not in memory
+        self.assertEqual(book.candles('BTC', '1m', START, START + 600)['t'], [])
+        self.assertEqual(book.status()['resampled'], 1)
+
+    def test_a_bucket_joined_halfway_is_not_served_from_memory(self):
+        book = CandleBook()
+        book.record(tick(START + 30, 1.0, 1.0))
+        book.record(tick(START + 90, 2.0, 1.0))
+        self.assertEqual(book._symbols['BTC'].covered_from('1m'), START + 60)
+        self.assertEqual(book.candles('BTC', '1m', START + 60, START + 90)['open'], [2.0])
+        book.candles('BTC', '1m', START, START + 90)
+        self.assertEqual(book.status(), {'symbols': 1, 'memory_hits': 1, 'resampled': 1})
+
+    def test_out_of_order_ticks_are_dropped(self):
+        book = CandleBook()
+        book.record(tick(START + 120, 2.0, 1.0))
+        book.record(tick(START, 1.0, 1.0))
+        candles = book.candles('BTC', '1m', START + 120, START + 120)
+        self.assertEqual(candles['ticks'], [1])
+        self.assertEqual(book.status()['memory_hits'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
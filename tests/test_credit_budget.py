@@ -0,0 +1,54 @@
+import time
+import threading
+import unittest
+
+from credit_budget import CreditBudget
+
+
+def plan(credits_used, credits_left):
+    return {'status': 'active', 'plan': 'Basic', 'credits_used': credits_used,
+            'credits_left': credits_left, 'reset_at': time.time() + 86400}
+
+
+class CreditBudgetTest(unittest.TestCase):
+
+    def test_status_check_never_blocks_allow(self):
+        release = threading.Event()
+
+        def slow_status():
+            release.wait(5)
+            return plan(10, 1000)
+
+        budget = CreditBudget(slow_status)
+        started = time.perf_counter()
+        self.assertTrue(budget.allow())
+        self.assertLess(time.perf_counter() - started, 0.5)
+        # Only one check runs at a time
+        self.assertTrue(budget.allow())
+
+        release.set()
+        deadline = time.time() + 5
+        while budget.credits_left is None and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(budget.credits_left, 1000)
+
+    def test_reserve_is_never_spent(self):
+        budget = CreditBudget(lambda: plan(9000, 1000))
+        budget.refresh_status()
+        budget.last_checked = time.time()
+        # 5% of a 10000 credit plan stays in reserve
+        self.assertTrue(budget.allow(credits=1))
+        budget.record(credits=500)
+        self.assertFalse(budget.allow(credits=1))
+        self.assertEqual(budget.refused, 1)
+
+    def test_failed_status_keeps_the_previous_reading(self):
+        budget = CreditBudget(lambda: plan(10, 1000))
+        budget.refresh_status()
+        budget.check_status = lambda: {'status': 'error', 'message': 'HTTP 500'}
+        budget.refresh_status()
+        self.assertEqual(budget.credits_left, 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
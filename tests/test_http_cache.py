@@ -0,0 +1,78 @@
+import os
+import tempfile
+import unittest
+
+from http_cache import (
+    FileValidators, content_etag, http_date, is_not_modified, matching_etag, snapshot_etag, variant_etag
+)
+from price_cache import PriceSnapshot
+
+
+class ETagTest(unittest.TestCase):
+
+    def test_content_etag_is_strong_and_follows_the_body(self):
+        etag = content_etag(b'logo')
+        self.assertEqual(etag, content_etag(b'logo'))
+        self.assertNotEqual(etag, content_etag(b'logo2'))
+        self.assertTrue(etag.startswith('"') and etag.endswith('"'))
+
+    def test_snapshot_etag_changes_with_the_snapshot(self):
+        first = snapshot_etag('prices', PriceSnapshot((), 1, 100.0))
+        self.assertNotEqual(first, snapshot_etag('prices', PriceSnapshot((), 2, 100.0)))
+        self.assertEqual(snapshot_etag('prices', PriceSnapshot((), 1, 100.0), weak=True), 'W/' + first)
+
+    def test_each_content_coding_matches_the_same_resource(self):
+        etag = content_etag(b'page')
+        gzipped = variant_etag(etag, 'gzip')
+        self.assertNotEqual(gzipped, etag)
+        self.assertEqual(variant_etag(etag, 'identity'), etag)
+        # A client holding the gzip copy revalidates against the identity tag
+        self.assertEqual(matching_etag(gzipped, etag), gzipped)
+        self.assertEqual(matching_etag('W/' + etag, etag), 'W/' + etag)
+        self.assertEqual(matching_etag('"other", ' + etag, etag), etag)
+        self.assertEqual(matching_etag('*', etag), etag)
+        self.assertIsNone(matching_etag('"other"', etag))
+
+
+class ConditionalRequestTest(unittest.TestCase):
+
+    def test_if_none_match(self):
+        etag = content_etag(b'page')
+        self.assertTrue(is_not_modified({'If-None-Match': etag}, etag))
+        self.assertFalse(is_not_modified({'If-None-Match': '"stale"'}, etag))
+        self.assertFalse(is_not_modified({'If-None-Match': etag}, None))
+        self.assertFalse(is_not_modified({}, etag))
+
+    def test_if_modified_since(self):
+        self.assertTrue(is_not_modified({'If-Modified-Since': http_date(1000)}, None, 1000.5))
+        self.assertFalse(is_not_modified({'If-Modified-Since': http_date(1000)}, None, 1001))
+        self.assertFalse(is_not_modified({'If-Modified-Since': 'yesterday'}, None, 1000))
+
+    def test_if_none_match_takes_precedence_over_if_modified_since(self):
+        headers = {'If-None-Match': '"stale"', 'If-Modified-Since': http_date(2000)}
+        self.assertFalse(is_not_modified(headers, content_etag(b'page'), 1000))
+
+
+class FileValidatorsTest(unittest.TestCase):
+
+    def test_etag_is_recomputed_only_when_the_file_changes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'logo.gif')
+            with open(path, 'wb') as f:
+                f.write(b'first')
+            validators = FileValidators()
+            etag, _ = validators.get(path)
+            self.assertEqual(etag, content_etag(b'first'))
+            self.assertEqual(validators.get(path)[0], etag)
+
+            with open(path, 'wb') as f:
+                f.write(b'second!')
+            self.assertEqual(validators.get(path)[0], content_etag(b'second!'))
+
+            os.remove(path)
+            with self.assertRaises(FileNotFoundError):
+                validators.get(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import gzip
+import zlib
+import unittest
+from unittest import mock
+
+from http_compression import PrecompressedBody, StreamCompressor, is_compressible, negotiate
+
+
+class NegotiateTest(unittest.TestCase):
+
+    def test_missing_or_unsupported_header_means_identity(self):
+        self.assertEqual(negotiate(None), 'identity')
+        self.assertEqual(negotiate(''), 'identity')
+        self.assertEqual(negotiate('deflate, identity'), 'identity')
+
+    def test_gzip_is_picked_unless_refused(self):
+        self.assertEqual(negotiate('gzip, deflate'), 'gzip')
+        self.assertEqual(negotiate('GZIP'), 'gzip')
+        self.assertEqual(negotiate('*'), 'gzip')
+        self.assertEqual(negotiate('gzip;q=0'), 'identity')
+        self.assertEqual(negotiate('*, gzip;q=0'), 'identity')
+        self.assertEqual(negotiate('gzip;q=oops'), 'identity')
+
+    def test_quality_values_decide_between_supported_codings(self):
+        with mock.patch('http_compression.supported_encodings', return_value=['br', 'gzip']):
+            self.assertEqual(negotiate('gzip, br'), 'br')
+            self.assertEqual(negotiate('br;q=0.5, gzip;q=0.8'), 'gzip')
+            self.assertEqual(negotiate('gzip;q=0.8, *;q=0.9'), 'br')
+
+    def test_only_text_like_types_are_compressed(self):
+        self.assertTrue(is_compressible('text/html; charset=utf-8'))
+        self.assertTrue(is_compressible('application/json'))
+        self.assertFalse(is_compressible('image/jpeg'))
+
+
+class CompressedBodyTest(unittest.TestCase):
+
+    def test_precompressed_variant_is_computed_once(self):
+        body = PrecompressedBody(b'<p>prices</p>' * 200)
+        first = body.get('gzip')
+        self.assertIs(body.get('gzip'), first)
+        self.assertEqual(gzip.decompress(first), body.body)
+        self.assertIs(body.get(), body.body)
+
+    def test_stream_chunks_are_decodable_as_they_arrive(self):
+        stream = StreamCompressor('gzip')
+        decoder = zlib.decompressobj(31)
+        chunks = [b'id,username\n', b'1,alice\n' * 50, b'2,bob\n']
+
+        received = b''
+        for chunk in chunks:
+            received += decoder.decompress(stream.compress(chunk))
+            self.assertEqual(received, b''.join(chunks[:chunks.index(chunk) + 1]))
+        received += decoder.decompress(stream.finish())
+        self.assertTrue(decoder.eof)
+        self.assertEqual(received, b''.join(chunks))
+
+    def test_identity_stream_passes_data_through(self):
+        stream = StreamCompressor('identity')
+        self.assertEqual(stream.compress(b'abc'), b'abc')
+        self.assertEqual(stream.finish(), b'')
+
+
+if __name__ == '__main__':
+    unittest.main()
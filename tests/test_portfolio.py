@@ -0,0 +1,52 @@
+import os
+import time
+import tempfile
+import unittest
+
+from portfolio import PortfolioEngine
+from price_cache import PriceSnapshot
+from user_store import UserStore
+
+
+PRICES = PriceSnapshot((
+    {'symbol': 'BTC', 'name': 'Bitcoin', 'price': 100.0, 'change_24h': 25.0},
+    {'symbol': 'ETH', 'name': 'Ethereum', 'price': 10.0, 'change_24h': 0.0},
+), 1, time.time())
+
+
+class PortfolioEngineTest(unittest.TestCase):
+
+    def test_every_portfolio_is_revalued_on_a_price_tick(self):
+        engine = PortfolioEngine([{'id': 1, 'holdings': {'btc': 2}}, {'id': 2, 'holdings': {'ETH': 5, 'BTC': 1}}])
+        engine.revalue(PRICES)
+
+        first = engine.portfolio(1)
+        self.assertEqual(first['total_value'], 200.0)
+        # 100 is up 25% from 80, so two coins gained 40
+        self.assertEqual(first['change_24h_value'], 40.0)
+        self.assertEqual(first['holdings'][0]['name'], 'Bitcoin')
+        second = engine.portfolio(2)
+        self.assertEqual([holding['symbol'] for holding in second['holdings']], ['BTC', 'ETH'])
+        self.assertEqual([holding['allocation'] for holding in second['holdings']], [66.67, 33.33])
+        self.assertEqual(engine.portfolio(99)['total_value'], 0.0)
+
+    def test_users_from_any_worker_join_through_the_store(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'users.db')
+            worker = UserStore(path)
+            engine = PortfolioEngine(worker.all())
+            worker.add_listener(engine.add_user)
+            engine.revalue(PRICES)
+
+            local = worker.add('alice', 'alice@example.com', 'hash', holdings={'BTC': 1})
+            self.assertEqual(engine.portfolio(local['id'])['total_value'], 100.0)
+
+            # Registered through another worker's store; seen on the first lookup here
+            remote = UserStore(path).add('bob', 'bob@example.com', 'hash', holdings={'ETH': 3})
+            self.assertEqual(engine.portfolio(remote['id'])['total_value'], 0.0)
+            worker.get(remote['id'])
+            self.assertEqual(engine.portfolio(remote['id'])['total_value'], 30.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
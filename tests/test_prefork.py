@@ -0,0 +1,78 @@
+import time
+import unittest
+
+from price_cache import PriceCache, PriceSnapshot
+from prefork import SharedSnapshot, SnapshotFollower, _HEADER
+
+
+BTC_1 = ({'symbol': 'BTC', 'price': 1.0},)
+BTC_2 = ({'symbol': 'BTC', 'price': 2.0},)
+
+
+def interrupt_write(shared):
+    """Leave the header as a writer that died mid-write would: odd sequence"""
+    sequence, version, fetched_at, checked_at, length = _HEADER.unpack_from(shared.buffer, 0)
+    _HEADER.pack_into(shared.buffer, 0, sequence + 1, version, fetched_at, checked_at, length)
+    shared.buffer[_HEADER.size:_HEADER.size + 4] = b'\xff\xff\xff\xff'
+
+
+class SharedSnapshotTest(unittest.TestCase):
+
+    def test_read_returns_what_was_written(self):
+        shared = SharedSnapshot(size=4096)
+        self.assertIsNone(shared.read())
+        shared.write(PriceSnapshot(BTC_1, 3, 100.0))
+        self.assertEqual(shared.read(), PriceSnapshot(BTC_1, 3, 100.0))
+        self.assertEqual(shared.version(), 3)
+
+    def test_oversized_snapshot_is_not_written(self):
+        shared = SharedSnapshot(size=64)
+        shared.write(PriceSnapshot(BTC_1 * 10, 1, 100.0))
+        self.assertEqual(shared.version(), 0)
+
+    def test_interrupted_write_falls_back_to_the_last_good_snapshot(self):
+        shared = SharedSnapshot(size=4096)
+        shared.write(PriceSnapshot(BTC_1, 1, 100.0))
+        shared.read()
+        interrupt_write(shared)
+
+        started = time.perf_counter()
+        self.assertEqual(shared.read().data, BTC_1)
+        self.assertLess(time.perf_counter() - started, 1)
+        self.assertEqual(shared.version(), 1)
+
+    def test_recover_drops_the_torn_payload_and_writes_continue(self):
+        shared = SharedSnapshot(size=4096)
+        shared.write(PriceSnapshot(BTC_1, 1, 100.0))
+        interrupt_write(shared)
+
+        self.assertTrue(shared.recover())
+        self.assertFalse(shared.recover())
+        # A process that never read a snapshot has nothing to fall back to
+        self.assertIsNone(shared.read())
+        self.assertEqual(shared.version(), 1)
+
+        shared.write(PriceSnapshot(BTC_2, 2, 200.0))
+        self.assertEqual(shared.read(), PriceSnapshot(BTC_2, 2, 200.0))
+
+
+class SnapshotFollowerTest(unittest.TestCase):
+
+    def test_follower_installs_new_snapshots_and_confirmations(self):
+        shared = SharedSnapshot(size=4096)
+        cache = PriceCache(lambda: self.fail('workers never fetch'))
+        SnapshotFollower(cache, shared, interval=0.01).start()
+
+        shared.write(PriceSnapshot(BTC_1, 1, 100.0))
+        shared.write(PriceSnapshot(BTC_2, 2, 200.0))
+        shared.confirm(250.0)
+        deadline = time.time() + 5
+        while cache.checked_at < 250.0 and time.time() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual(cache.peek(), PriceSnapshot(BTC_2, 2, 200.0))
+        self.assertEqual(cache.checked_at, 250.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
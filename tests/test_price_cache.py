@@ -0,0 +1,104 @@
+import time
+import threading
+import unittest
+
+from price_cache import PriceCache
+
+
+def make_age(cache, seconds):
+    """Pretend the current snapshot was fetched `seconds` ago"""
+    cache._snapshot = cache._snapshot._replace(fetched_at=time.time() - seconds)
+    cache._checked_at = 0.0
+
+
+class CountingFetch:
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = 0
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self):
+        self.calls += 1
+        self.release.wait(5)
+        result = self.results[min(self.calls, len(self.results)) - 1]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+BTC_1 = [{'symbol': 'BTC', 'price': 1.0}]
+BTC_2 = [{'symbol': 'BTC', 'price': 2.0}]
+
+
+class PriceCacheTest(unittest.TestCase):
+
+    def test_fresh_snapshot_is_served_without_fetching(self):
+        fetch = CountingFetch(BTC_1)
+        cache = PriceCache(fetch, ttl=30, stale_ttl=300)
+        first = cache.get()
+        self.assertEqual(first.data[0]['price'], 1.0)
+        self.assertIs(cache.get(), first)
+        self.assertEqual(fetch.calls, 1)
+
+    def test_stale_snapshot_is_served_while_revalidating_in_background(self):
+        fetch = CountingFetch(BTC_1, BTC_2)
+        cache = PriceCache(fetch, ttl=30, stale_ttl=300)
+        cache.get()
+        make_age(cache, 60)
+
+        fetch.release.clear()
+        stale = cache.get()
+        # The caller gets the old prices at once; the refresh runs behind it
+        self.assertEqual(stale.data[0]['price'], 1.0)
+        fetch.release.set()
+        deadline = time.time() + 5
+        while cache.peek().version < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(cache.peek().data[0]['price'], 2.0)
+        self.assertEqual(fetch.calls, 2)
+
+    def test_expired_snapshot_is_refreshed_synchronously(self):
+        fetch = CountingFetch(BTC_1, BTC_2)
+        cache = PriceCache(fetch, ttl=30, stale_ttl=300)
+        cache.get()
+        make_age(cache, 1000)
+        self.assertEqual(cache.get().data[0]['price'], 2.0)
+
+    def test_failed_fetch_keeps_the_last_good_snapshot(self):
+        fetch = CountingFetch(BTC_1, [], ValueError('down'))
+        cache = PriceCache(fetch, ttl=30, stale_ttl=300)
+        good = cache.get()
+        for _ in range(2):
+            make_age(cache, 1000)
+            self.assertEqual(cache.get().data, good.data)
+        self.assertEqual(cache.peek().version, 1)
+
+    def test_cold_start_failure_serves_fallback_data(self):
+        cache = PriceCache(CountingFetch([]), fallback=lambda: BTC_2)
+        snapshot = cache.get()
+        self.assertEqual(snapshot.data[0]['price'], 2.0)
+        self.assertEqual(snapshot.version, 0)
+
+    def test_unchanged_data_keeps_the_version_and_skips_listeners(self):
+        cache = PriceCache(CountingFetch(BTC_1, BTC_1, BTC_2))
+        versions = []
+        cache.add_listener(lambda snapshot: versions.append(snapshot.version))
+        first = cache.refresh()
+        self.assertIs(cache.refresh(), first)
+        self.assertEqual(cache.refresh().version, 2)
+        self.assertEqual(versions, [1, 2])
+
+    def test_confirmed_snapshot_is_fresh_again(self):
+        fetch = CountingFetch(BTC_1, BTC_1)
+        cache = PriceCache(fetch, ttl=30, stale_ttl=300)
+        cache.get()
+        make_age(cache, 60)
+        cache.refresh()
+        self.assertFalse(cache.freshness(cache.peek())['stale'])
+        cache.get()
+        self.assertEqual(fetch.calls, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
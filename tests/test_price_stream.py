@@ -0,0 +1,77 @@
+import time
+import asyncio
+import threading
+import unittest
+
+from price_cache import PriceCache, PriceSnapshot
+from price_stream import PriceBroadcaster
+
+
+def snapshot(version, price):
+    return PriceSnapshot(({'symbol': 'BTC', 'price': price},), version, time.time())
+
+
+class PublishOnFirstAcquire:
+    """Lock wrapper that runs a publish from another thread just before the first acquire"""
+
+    def __init__(self, lock, publish):
+        self.lock = lock
+        self.publish = publish
+
+    def __enter__(self):
+        publish, self.publish = self.publish, None
+        if publish is not None:
+            thread = threading.Thread(target=publish)
+            thread.start()
+            thread.join()
+        return self.lock.__enter__()
+
+    def __exit__(self, *exc_info):
+        return self.lock.__exit__(*exc_info)
+
+
+class PriceBroadcasterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.broadcaster = PriceBroadcaster(PriceCache(lambda: []))
+
+    def test_publish_while_a_coroutine_starts_waiting_wakes_it(self):
+        cursor, _ = self.broadcaster.subscribe()
+        # The publish lands after the waiter was called but before its Event exists
+        self.broadcaster._loops_lock = PublishOnFirstAcquire(
+            self.broadcaster._loops_lock, lambda: self.broadcaster.publish(snapshot(1, 1.0))
+        )
+
+        started = time.perf_counter()
+        asyncio.run(self.broadcaster.wait_async(cursor, 2))
+        self.assertLess(time.perf_counter() - started, 1)
+        self.assertIn(b'"price":1.0', self.broadcaster.events_after(cursor)[1])
+
+    def test_publish_from_another_thread_wakes_a_waiting_coroutine(self):
+        cursor, _ = self.broadcaster.subscribe()
+
+        async def wait():
+            loop = asyncio.get_running_loop()
+            loop.call_later(0.05, threading.Thread(target=self.broadcaster.publish, args=(snapshot(1, 1.0),)).start)
+            started = time.perf_counter()
+            await self.broadcaster.wait_async(cursor, 2)
+            return time.perf_counter() - started
+
+        self.assertLess(asyncio.run(wait()), 1)
+
+    def test_subscriber_count_is_exact_under_concurrency(self):
+        def churn():
+            for _ in range(10000):
+                self.broadcaster.count_subscriber(1)
+                self.broadcaster.count_subscriber(-1)
+
+        threads = [threading.Thread(target=churn) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.broadcaster.subscribers, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import time
+import threading
+import unittest
+
+from quote_batcher import QuoteBatcher
+
+
+def quote(price):
+    return {'name': 'Bitcoin', 'quote': {'price': price}}
+
+
+class QuoteBatcherTest(unittest.TestCase):
+
+    def test_concurrent_lookups_share_one_upstream_call(self):
+        calls = []
+
+        def fetch_batch(symbols, currency):
+            calls.append(tuple(symbols))
+            return {symbol: quote(1.0) for symbol in symbols}
+
+        batcher = QuoteBatcher(fetch_batch, ttl=60, window=0.05)
+        results = []
+        threads = [
+            threading.Thread(target=lambda symbol=symbol: results.append(batcher.get([symbol])))
+            for symbol in ('btc', 'eth', 'sol')
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(calls, [('BTC', 'ETH', 'SOL')])
+        self.assertEqual(sorted(result[0]['symbol'] for result in results), ['BTC', 'ETH', 'SOL'])
+
+    def test_stale_quote_fills_in_unless_max_age_is_set(self):
+        results = [{'BTC': quote(1.0)}, {}, {}]
+        batcher = QuoteBatcher(lambda symbols, currency: results.pop(0), ttl=60, window=0)
+        self.assertEqual(batcher.get(['BTC'])[0]['quote']['USD']['price'], 1.0)
+
+        name, cached, _ = batcher._quotes[('BTC', 'USD')]
+        batcher._quotes[('BTC', 'USD')] = (name, cached, time.time() - 120)
+        # The refresh fails; the old quote still answers a plain lookup...
+        self.assertEqual(batcher.get(['BTC'])[0]['quote']['USD']['price'], 1.0)
+        # ...but not one that asked for quotes younger than ten seconds
+        self.assertEqual(batcher.get(['BTC'], max_age=10), [])
+        self.assertEqual(batcher.upstream_calls, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import tempfile
+import unittest
+
+from sessions import RevocationList, SessionStore
+
+
+SECRET = 'test-session-secret'
+ALICE = {'id': 1, 'username': 'alice'}
+MALLORY = {'id': 1, 'username': 'mallory'}
+
+
+class SessionsAcrossWorkersTest(unittest.TestCase):
+    """Each prefork worker has its own SessionStore; tokens must mean the same thing in all of them"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'sessions.db')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def worker(self, poll_interval=0):
+        return SessionStore(SECRET, revoked=RevocationList(self.path, poll_interval))
+
+    def test_token_is_rejected_when_its_id_belongs_to_another_user(self):
+        token = self.worker().create(ALICE)
+
+        other = self.worker()
+        self.assertIsNone(other.get(token, load_user={1: MALLORY}.get))
+        self.assertIsNone(other.get(token, load_user={}.get))
+        session = other.get(token, load_user={1: ALICE}.get)
+        self.assertEqual(session['username'], 'alice')
+
+    def test_logout_in_one_worker_revokes_the_token_in_every_worker(self):
+        first, second = self.worker(), self.worker()
+        token = first.create(ALICE)
+        # The second worker has rebuilt and cached the session from the token
+        self.assertIsNotNone(second.get(token, load_user={1: ALICE}.get))
+
+        first.revoke(token)
+        self.assertIsNone(first.get(token, load_user={1: ALICE}.get))
+        self.assertIsNone(second.get(token, load_user={1: ALICE}.get))
+        self.assertIsNone(self.worker().get(token, load_user={1: ALICE}.get))
+
+    def test_revocations_are_checked_in_memory_between_polls(self):
+        first, second = self.worker(), self.worker(poll_interval=3600)
+        token = first.create(ALICE)
+        self.assertIsNotNone(second.get(token, load_user={1: ALICE}.get))
+        first.revoke(token)
+
+        second.revoked.db.fetchall = lambda *args: self.fail('token check went to the database')
+        # Until its next poll the second worker has not heard of the logout
+        self.assertIsNotNone(second.get(token, load_user={1: ALICE}.get))
+        del second.revoked.db.fetchall
+        second.revoked._polled = 0.0
+        self.assertIsNone(second.get(token, load_user={1: ALICE}.get))
+        self.assertEqual(len(second), 0)
+
+    def test_tampered_username_fails_the_signature(self):
+        store = self.worker()
+        token = store.create(ALICE)
+        version, user_id, _, rest = token.split('.', 3)
+        forged = '.'.join([version, user_id, 'bWFsbG9yeQ', rest])
+        self.assertIsNone(store.get(forged, load_user={1: MALLORY}.get))
+
+
+if __name__ == '__main__':
+    unittest.main()
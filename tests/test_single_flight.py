@@ -0,0 +1,84 @@
+import time
+import threading
+import unittest
+
+from price_cache import SingleFlight
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def run_concurrently(self, flights, fn, callers, timeout=5):
+        results, errors = [], []
+
+        def call():
+            try:
+                results.append(flights.do('key', fn, timeout))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        return threads, results, errors
+
+    def test_concurrent_callers_share_one_call(self):
+        flights = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'prices'
+
+        threads, results, errors = self.run_concurrently(flights, fetch, 8)
+        started.wait(5)
+        # Give the other callers time to join the flight before it lands
+        time.sleep(0.2)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['prices'] * 8)
+        self.assertEqual(errors, [])
+        self.assertEqual(flights.in_flight(), 0)
+
+    def test_error_reaches_every_waiter_and_next_call_runs_again(self):
+        flights = SingleFlight()
+        release = threading.Event()
+
+        def fail():
+            release.wait(5)
+            raise ValueError('upstream down')
+
+        threads, results, errors = self.run_concurrently(flights, fail, 4)
+        time.sleep(0.2)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(results, [])
+        self.assertTrue(errors and all(isinstance(e, ValueError) for e in errors))
+        self.assertEqual(flights.do('key', lambda: 'recovered'), 'recovered')
+
+    def test_waiter_times_out_without_cancelling_the_leader(self):
+        flights = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+            return 'late'
+
+        leader, results, _ = self.run_concurrently(flights, slow, 1)
+        started.wait(5)
+        with self.assertRaises(TimeoutError):
+            flights.do('key', slow, timeout=0.05)
+        release.set()
+        leader[0].join(5)
+        self.assertEqual(results, ['late'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import os
+import types
+import tempfile
+import threading
+import unittest
+import http.client
+from unittest import mock
+
+import main
+from async_server import AsyncHTTPServer
+from static_assets import AssetIndex, parse_range
+
+
+PHOTO = bytes(range(256)) * 40
+
+
+class ParseRangeTest(unittest.TestCase):
+
+    def test_single_ranges(self):
+        self.assertEqual(parse_range('bytes=0-99', 1000), (0, 99))
+        self.assertEqual(parse_range('bytes=900-', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=-100', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=-5000', 1000), (0, 999))
+        self.assertEqual(parse_range('bytes=990-2000', 1000), (990, 999))
+
+    def test_whole_body_or_unsatisfiable(self):
+        self.assertIsNone(parse_range(None, 1000))
+        self.assertIsNone(parse_range('bytes=0-1,5-6', 1000))
+        self.assertIsNone(parse_range('items=0-1', 1000))
+        self.assertIsNone(parse_range('bytes=a-b', 1000))
+        self.assertIs(parse_range('bytes=1000-', 1000), False)
+        self.assertIs(parse_range('bytes=5-1', 1000), False)
+        self.assertIs(parse_range('bytes=-0', 1000), False)
+
+
+class AssetIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = self.directory.name
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def add(self, name, data):
+        with open(os.path.join(self.root, name), 'wb') as f:
+            f.write(data)
+
+    def test_small_files_are_kept_in_memory_and_large_ones_are_not(self):
+        self.add('logo.gif', b'GIF89a')
+        self.add('team.jpg', PHOTO)
+        with mock.patch('static_assets.STATIC_MEMORY_LIMIT', 1024):
+            index = AssetIndex(self.root)
+        self.assertEqual(index.get('logo.gif').data, b'GIF89a')
+        self.assertEqual(index.get('logo.gif').content_type, 'image/gif')
+        self.assertIsNone(index.get('team.jpg').data)
+        self.assertEqual(index.stats(), {'files': 2, 'in_memory': 1, 'memory_bytes': 6})
+
+    def test_only_bare_names_inside_the_root_resolve(self):
+        self.add('.env', b'secret')
+        index = AssetIndex(self.root)
+        for name in ('', '.env', '../etc/passwd', 'sub/logo.gif', '..'):
+            self.assertIsNone(index.get(name), name)
+
+    def test_changed_added_and_removed_files_are_noticed(self):
+        self.add('logo.gif', b'one')
+        index = AssetIndex(self.root)
+        etag = index.get('logo.gif').etag
+
+        with mock.patch('static_assets.STATIC_CHECK_INTERVAL', 0):
+            self.add('logo.gif', b'two!')
+            self.assertNotEqual(index.get('logo.gif').etag, etag)
+            self.add('new.png', b'png')
+            self.assertEqual(index.get('new.png').data, b'png')
+            os.remove(os.path.join(self.root, 'logo.gif'))
+            self.assertIsNone(index.get('logo.gif'))
+
+
+class SendAssetTest(unittest.TestCase):
+    """Range and conditional requests for a file too large to keep in memory"""
+
+    engine = 'threaded'
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        with open(os.path.join(self.directory.name, 'team.jpg'), 'wb') as f:
+            f.write(PHOTO)
+        with mock.patch('static_assets.STATIC_MEMORY_LIMIT', 1024):
+            self.assets = AssetIndex(self.directory.name)
+
+        address = ('127.0.0.1', 0)
+        if self.engine == 'asyncio':
+            self.server = AsyncHTTPServer(address, main.LandingPageHandler, max_handlers=2)
+        else:
+            self.server = main.ThreadedHTTPServer(address, main.LandingPageHandler)
+        self.server.app = types.SimpleNamespace(static_assets=self.assets)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join(5)
+        self.server.server_close()
+        self.directory.cleanup()
+
+    def fetch(self, **headers):
+        host, port = self.server.socket.getsockname()[:2]
+        connection = http.client.HTTPConnection(host, port, timeout=5)
+        with mock.patch.object(main.LandingPageHandler, 'log_message'):
+            connection.request('GET', '/team-photos/team.jpg', headers=headers)
+            response = connection.getresponse()
+            body = response.read()
+        connection.close()
+        return response, body
+
+    def test_full_body(self):
+        response, body = self.fetch()
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader('Accept-Ranges'), 'bytes')
+        self.assertEqual(body, PHOTO)
+
+    def test_byte_range(self):
+        response, body = self.fetch(Range='bytes=1000-1999')
+        self.assertEqual(response.status, 206)
+        self.assertEqual(response.getheader('Content-Range'), f'bytes 1000-1999/{len(PHOTO)}')
+        self.assertEqual(body, PHOTO[1000:2000])
+
+    def test_suffix_range_and_unsatisfiable_range(self):
+        self.assertEqual(self.fetch(Range='bytes=-10')[1], PHOTO[-10:])
+        response, _ = self.fetch(Range=f'bytes={len(PHOTO)}-')
+        self.assertEqual(response.status, 416)
+        self.assertEqual(response.getheader('Content-Range'), f'bytes */{len(PHOTO)}')
+
+    def test_if_range_with_an_old_etag_sends_the_whole_file(self):
+        response, body = self.fetch(Range='bytes=0-9', **{'If-Range': '"old"'})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(body, PHOTO)
+
+    def test_current_etag_is_not_modified(self):
+        etag = self.assets.get('team.jpg').etag
+        response, body = self.fetch(**{'If-None-Match': etag})
+        self.assertEqual(response.status, 304)
+        self.assertEqual(body, b'')
+
+
+class AsyncSendAssetTest(SendAssetTest):
+    """Same requests on the asyncio engine, which copies instead of using sendfile"""
+
+    engine = 'asyncio'
+
+
+if __name__ == '__main__':
+    unittest.main()
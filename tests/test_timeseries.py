@@ -0,0 +1,105 @@
+import os
+import math
+import tempfile
+import unittest
+
+from price_cache import PriceSnapshot
+from timeseries import TimeSeriesStore
+
+
+def quotes(fetched_at, price, symbol='BTC', **extra):
+    return PriceSnapshot(({'symbol': symbol, 'price': price, **extra},), 1, fetched_at)
+
+
+class TimeSeriesStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = self.directory.name
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def store(self, **options):
+        options.setdefault('segment_rows', 3)
+        options.setdefault('retention_days', 0)
+        return TimeSeriesStore(self.root, **options)
+
+    def segments(self, symbol='BTC'):
+        return sorted(os.listdir(os.path.join(self.root, symbol)))
+
+    def test_rows_roll_over_into_new_segments_and_query_across_them(self):
+        store = self.store()
+        for second in range(8):
+            store.record(quotes(1000.0 + second, 100.0 + second))
+        self.assertEqual(len(self.segments()), 3)
+
+        everything = store.query('btc')
+        self.assertEqual(list(everything['price']), [100.0 + second for second in range(8)])
+        window = store.query('BTC', start=1002, end=1005, columns=('ts', 'price'))
+        self.assertEqual(list(window['ts']), [1002.0, 1003.0, 1004.0, 1005.0])
+        self.assertEqual(set(window), {'ts', 'price'})
+        self.assertEqual(list(store.query('BTC', limit=2)['price']), [106.0, 107.0])
+        self.assertEqual(store.latest('BTC')['price'], 107.0)
+
+    def test_repeated_quotes_are_stored_once(self):
+        store = self.store()
+        for second in range(3):
+            store.record(quotes(1000.0 + second, 100.0))
+        store.record(quotes(1003.0, 101.0))
+        self.assertEqual(list(store.query('BTC')['ts']), [1000.0, 1003.0])
+        self.assertEqual(store.status()['rows_skipped'], 2)
+
+    def test_timestamps_stay_sorted_when_the_clock_goes_back(self):
+        store = self.store()
+        store.record(quotes(1000.0, 1.0))
+        store.record(quotes(990.0, 2.0))
+        self.assertEqual(list(store.query('BTC')['ts']), [1000.0, 1000.0])
+
+    def test_segments_filled_within_one_millisecond_get_their_own_files(self):
+        store = self.store()
+        for price in range(7):
+            store.record(quotes(1000.0, float(price)))
+        self.assertEqual(self.segments(), ['000000001000000.seg', '000000001000000_0001.seg',
+                                           '000000001000000_0002.seg'])
+        self.assertEqual(list(store.query('BTC', start=1000, end=1000)['price']), [float(p) for p in range(7)])
+
+    def test_values_are_parsed_and_bad_symbols_skipped(self):
+        store = self.store()
+        store.record(quotes(1000.0, 1.0, last_updated='2024-01-01T00:00:00.000Z', market_cap='n/a'))
+        store.record(quotes(1000.0, 1.0, symbol='../etc'))
+        row = store.latest('BTC')
+        self.assertEqual(row['last_updated'], 1704067200.0)
+        self.assertTrue(math.isnan(row['market_cap']))
+        self.assertEqual(store.symbols(), ['BTC'])
+        self.assertIsNone(store.latest('ETH'))
+
+    def test_retention_drops_old_segments_but_keeps_the_newest(self):
+        day = 86400.0
+        store = self.store(retention_days=1)
+        for offset in range(6):
+            store.record(quotes(1000.0 + offset * 60, float(offset)))
+        self.assertEqual(len(self.segments()), 2)
+
+        # Two days later a new segment starts. A segment is known to end only
+        # where the next one starts, so just the first one is out of the window.
+        for offset in range(3):
+            store.record(quotes(2 * day + offset, 10.0 + offset))
+        self.assertEqual(len(self.segments()), 2)
+        self.assertEqual(list(store.query('BTC')['price']), [3.0, 4.0, 5.0, 10.0, 11.0, 12.0])
+
+        store.record(quotes(4 * day, 20.0))
+        self.assertEqual(len(self.segments()), 2)
+        self.assertEqual(list(store.query('BTC')['price']), [10.0, 11.0, 12.0, 20.0])
+
+    def test_only_one_store_writes_to_a_directory(self):
+        writer, reader = self.store(), self.store()
+        writer.record(quotes(1000.0, 1.0))
+        reader.record(quotes(1001.0, 2.0))
+        self.assertEqual(list(reader.query('BTC')['price']), [1.0])
+        self.assertFalse(reader.status()['writer'])
+        self.assertTrue(writer.status()['writer'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import time
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from user_store import DuplicateUserError, UserStore
+
+
+class UserStoreAcrossWorkersTest(unittest.TestCase):
+    """Prefork workers each open the store; they must share one set of users"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'users.db')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_registrations_from_every_worker_are_kept(self):
+        store = UserStore(self.path)
+        pids = []
+        for worker in range(4):
+            pid = os.fork()
+            if pid == 0:
+                code = 0
+                try:
+                    for index in range(50):
+                        store.add(f'w{worker}-{index}', f'w{worker}-{index}@example.com', 'hash')
+                except BaseException:
+                    code = 1
+                os._exit(code)
+            pids.append(pid)
+        for pid in pids:
+            self.assertEqual(os.waitpid(pid, 0)[1], 0)
+
+        users = store.all()
+        self.assertEqual(len(users), 200)
+        # Ids are unique across workers, so a session's user id means one user
+        self.assertEqual([user['id'] for user in users], list(range(1, 201)))
+
+    def test_duplicates_are_rejected_across_stores(self):
+        first, second = UserStore(self.path), UserStore(self.path)
+        user = first.add('alice', 'Alice@example.com', 'hash')
+        self.assertEqual(second.by_username('alice')['id'], user['id'])
+        with self.assertRaises(DuplicateUserError) as raised:
+            second.add('alice2', 'alice@EXAMPLE.com', 'hash')
+        self.assertEqual(raised.exception.field, 'email')
+        with self.assertRaises(DuplicateUserError) as raised:
+            second.add('alice', 'other@example.com', 'hash')
+        self.assertEqual(raised.exception.field, 'username')
+
+    def test_lookups_come_from_memory_and_misses_catch_up(self):
+        first, second = UserStore(self.path), UserStore(self.path)
+        alice = first.add('alice', 'alice@example.com', 'hash')
+        # Registered through another store: found by the sync on the first miss
+        self.assertEqual(second.by_email('ALICE@example.com')['id'], alice['id'])
+
+        second.db.fetchall = lambda *args: self.fail('hit went to the database')
+        self.assertEqual(second.get(alice['id'])['username'], 'alice')
+        self.assertEqual(second.by_username('alice')['email'], 'alice@example.com')
+        # Callers get copies, never the indexed record
+        second.get(alice['id'])['username'] = 'mallory'
+        self.assertEqual(second.get(alice['id'])['username'], 'alice')
+
+    def test_a_duplicate_in_a_group_commit_does_not_fail_the_others(self):
+        store = UserStore(self.path)
+        store.add('taken', 'taken@example.com', 'hash')
+        # Hold the write lock so the next registrations queue up into one batch
+        blocker = sqlite3.connect(self.path, isolation_level=None)
+        blocker.execute('BEGIN IMMEDIATE')
+
+        results = {}
+
+        def register(name):
+            try:
+                results[name] = store.add(name, f'{name}-new@example.com', 'hash')['id']
+            except DuplicateUserError as e:
+                results[name] = e.field
+
+        names = ['taken'] + [f'user{index}' for index in range(9)]
+        threads = [threading.Thread(target=register, args=(name,)) for name in names]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.2)
+        blocker.execute('ROLLBACK')
+        for thread in threads:
+            thread.join(5)
+        blocker.close()
+
+        self.assertEqual(results.pop('taken'), 'username')
+        self.assertEqual(sorted(results.values()), list(range(2, 11)))
+        self.assertEqual(len(UserStore(self.path)), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+import os
+import re
+import math
+import mmap
+import time
+import fcntl
+import bisect
+import struct
+import threading
+from array import array
+from datetime import datetime
+
+
+# Where quote history lives, rows per segment file, and how long history is
+# kept (0 keeps everything)
+TIMESERIES_DIR = os.environ.get('TIMESERIES_DIR', os.path.join('data', 'timeseries'))
+TIMESERIES_SEGMENT_ROWS = int(os.environ.get('TIMESERIES_SEGMENT_ROWS', 4096))
+TIMESERIES_RETENTION_DAYS = float(os.environ.get('TIMESERIES_RETENTION_DAYS', 90))
+
+# Every column is a float64; 'ts' is when the quote was fetched and
+# 'last_updated' is CoinMarketCap's own timestamp (NaN when unknown)
+COLUMNS = ('ts', 'price', 'change_24h', 'market_cap', 'volume_24h', 'last_updated')
+VALUE_COLUMNS = COLUMNS[1:]
+
+# magic, format version, column count, capacity, row count
+_HEADER = struct.Struct('<4sHHIQ')
+_HEADER_SIZE = 64
+_MAGIC = b'RTS1'
+_COUNT_OFFSET = 12
+
+SYMBOL_PATTERN = re.compile(r'^[A-Z0-9]{1,15}$')
+NAN = float('nan')
+
+
+def _timestamp(value):
+    """Epoch seconds from an ISO 8601 string such as CMC's last_updated"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not value:
+        return NAN
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return NAN
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return NAN
+
+
+def _same(a, b):
+    return a == b or (math.isnan(a) and math.isnan(b))
+
+
+def _segment_start(name):
+    """First timestamp of a segment, from its '<ms>[_<n>].seg' file name"""
+    return int(name[:15]) / 1000
+
+
+class Segment:
+    """One memory-mapped file of up to `capacity` rows, stored column by column"""
+
+    def __init__(self, path, capacity=None, writable=False):
+        self.path = path
+        self.writable = writable
+        self.name = os.path.basename(path)
+        if writable and not os.path.exists(path):
+            open(path, 'wb').close()
+
+        with open(path, 'r+b' if writable else 'rb') as f:
+            if writable and os.fstat(f.fileno()).st_size == 0:
+                self.capacity = capacity or TIMESERIES_SEGMENT_ROWS
+                # Sparse until written, so a fresh segment costs no disk
+                f.truncate(_HEADER_SIZE + len(COLUMNS) * self.capacity * 8)
+                f.write(_HEADER.pack(_MAGIC, 1, len(COLUMNS), self.capacity, 0))
+                f.flush()
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+
+        magic, _, columns, self.capacity, _ = _HEADER.unpack_from(self.map, 0)
+        if magic != _MAGIC or columns != len(COLUMNS):
+            self.map.close()
+            raise ValueError(f'{path} is not a time-series segment')
+
+    @property
+    def count(self):
+        return struct.unpack_from('<Q', self.map, _COUNT_OFFSET)[0]
+
+    @property
+    def full(self):
+        return self.count >= self.capacity
+
+    def _offset(self, column):
+        return _HEADER_SIZE + COLUMNS.index(column) * self.capacity * 8
+
+    def value(self, column, row):
+        return struct.unpack_from('<d', self.map, self._offset(column) + row * 8)[0]
+
+    def append(self, row):
+        """Write one row (a value per column); readers only see it once the count moves"""
+        index = self.count
+        for column, value in zip(COLUMNS, row):
+            struct.pack_into('<d', self.map, self._offset(column) + index * 8, value)
+        struct.pack_into('<Q', self.map, _COUNT_OFFSET, index + 1)
+
+    def column(self, column, start=0, end=None):
+        """Copy of rows [start, end) of one column"""
+        end = self.count if end is None else end
+        offset = self._offset(column)
+        values = array('d')
+        values.frombytes(self.map[offset + start * 8:offset + end * 8])
+        return values
+
+    def bounds(self, start_ts, end_ts):
+        """Row range whose ts falls in [start_ts, end_ts]; ts only grows within a segment"""
+        count = self.count
+        view = memoryview(self.map)[self._offset('ts'):self._offset('ts') + count * 8].cast('d')
+        try:
+            low = 0 if start_ts is None else bisect.bisect_left(view, start_ts)
+            high = count if end_ts is None else bisect.bisect_right(view, end_ts)
+        finally:
+            view.release()
+        return low, high
+
+    def close(self):
+        if self.writable:
+            self.map.flush()
+        self.map.close()
+
+
+class TimeSeriesStore:
+    """Quote history per symbol in columnar, memory-mapped segment files"""
+
+    def __init__(self, directory=None, segment_rows=None, retention_days=None):
+        self.directory = TIMESERIES_DIR if directory is None else directory
+        self.segment_rows = TIMESERIES_SEGMENT_ROWS if segment_rows is None else segment_rows
+        self.retention = (TIMESERIES_RETENTION_DAYS if retention_days is None else retention_days) * 86400
+        self.enabled = True
+        self.rows_written = 0
+        self.rows_skipped = 0
+        # symbol -> open segment being appended to; only the writing process has any
+        self._active = {}
+        self._lock = threading.Lock()
+        self._owner = None
+        self._lock_file = None
+
+    def _symbol_dir(self, symbol):
+        return os.path.join(self.directory, symbol)
+
+    def _segment_names(self, symbol):
+        try:
+            return sorted(name for name in os.listdir(self._symbol_dir(symbol)) if name.endswith('.seg'))
+        except FileNotFoundError:
+            return []
+
+    def _ensure_writer(self):
+        # One writer per directory; other processes (prefork workers, or a
+        # worker forked from the writer) only read
+        if self._owner == os.getpid():
+            return True
+        if not self.enabled:
+            return False
+        os.makedirs(self.directory, exist_ok=True)
+        lock = open(os.path.join(self.directory, 'timeseries.lock'), 'w')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            # Segments inherited over fork belong to the writer; drop them
+            self._active = {}
+            self.enabled = False
+            return False
+        self._lock_file = lock
+        self._owner = os.getpid()
+        self._active = {}
+        for symbol in self.symbols():
+            self._apply_retention(symbol, time.time())
+        return True
+
+    def record(self, snapshot):
+        """PriceCache listener: append each quote that differs from the symbol's last row"""
+        ts = snapshot.fetched_at or time.time()
+        with self._lock:
+            if not self._ensure_writer():
+                return
+            for quote in snapshot.data:
+                symbol = str(quote.get('symbol', '')).upper()
+                if SYMBOL_PATTERN.match(symbol):
+                    row = [ts] + [_number(quote.get(column)) for column in VALUE_COLUMNS[:-1]]
+                    row.append(_timestamp(quote.get('last_updated')))
+                    self._append(symbol, row)
+
+    def _append(self, symbol, row):
+        segment = self._active.get(symbol)
+        if segment is None:
+            names = self._segment_names(symbol)
+            if names:
+                segment = Segment(os.path.join(self._symbol_dir(symbol), names[-1]), writable=True)
+                self._active[symbol] = segment
+        if segment is not None and segment.count:
+            last = segment.count - 1
+            # Cached upstream data repeats between fetches; keep one row for it
+            if all(_same(segment.value(column, last), value)
+                   for column, value in zip(VALUE_COLUMNS, row[1:])):
+                self.rows_skipped += 1
+                return
+            if row[0] < segment.value('ts', last):
+                # Clock went backwards; ts must stay sorted for range queries
+                row[0] = segment.value('ts', last)
+        if segment is None or segment.full:
+            if segment is not None:
+                segment.close()
+            os.makedirs(self._symbol_dir(symbol), exist_ok=True)
+            # Names sort by first timestamp, so listing order is time order. A
+            # segment filled within one millisecond (or while the clock was
+            # behind) gets a numbered sibling rather than reopening the full one.
+            name = f'{int(row[0] * 1000):015d}'
+            names = self._segment_names(symbol)
+            if names and names[-1][:15] == name:
+                suffix = int(names[-1][16:20]) + 1 if names[-1][15] == '_' else 1
+                name = f'{name}_{suffix:04d}'
+            path = os.path.join(self._symbol_dir(symbol), f'{name}.seg')
+            segment = self._active[symbol] = Segment(path, self.segment_rows, writable=True)
+            self._apply_retention(symbol, row[0])
+        segment.append(row)
+        self.rows_written += 1
+
+    def _apply_retention(self, symbol, now):
+        """Delete segments that end before the retention window; never the newest"""
+        if not self.retention:
+            return
+        names = self._segment_names(symbol)
+        # A segment ends where the next one starts
+        for name, following in zip(names, names[1:]):
+            if _segment_start(following) < now - self.retention:
+                try:
+                    os.remove(os.path.join(self._symbol_dir(symbol), name))
+                except OSError as e:
+                    print(f"Time-series retention failed for {name}: {e}")
+
+    def symbols(self):
+        try:
+            return sorted(name for name in os.listdir(self.directory)
+                          if SYMBOL_PATTERN.match(name) and self._segment_names(name))
+        except FileNotFoundError:
+            return []
+
+    def query(self, symbol, start=None, end=None, columns=COLUMNS, limit=None):
+        """{column: array('d')} of rows with start <= ts <= end, oldest first
+
+        Reads the segment files directly, so any process sees what the
+        writer has appended; only the requested rows are copied.
+        """
+        symbol = symbol.upper()
+        result = {column: array('d') for column in columns}
+        if not SYMBOL_PATTERN.match(symbol):
+            return result
+
+        names = self._segment_names(symbol)
+        for index, name in enumerate(names):
+            # Skip segments entirely outside the range by their file names
+            if end is not None and _segment_start(name) > end:
+                break
+            if start is not None and index + 1 < len(names) and _segment_start(names[index + 1]) < start:
+                continue
+            try:
+                segment = Segment(os.path.join(self._symbol_dir(symbol), name))
+            except (FileNotFoundError, ValueError):
+                # Removed by retention while we listed, or not a segment
+                continue
+            try:
+                low, high = segment.bounds(start, end)
+                for column in columns:
+                    result[column].extend(segment.column(column, low, high))
+            finally:
+                segment.close()
+
+        if limit is not None and len(result[columns[0]]) > limit:
+            # Most recent rows win
+            result = {column: values[-limit:] for column, values in result.items()}
+        return result
+
+    def latest(self, symbol):
+        """The newest row for a symbol as a dict, or None"""
+        names = self._segment_names(symbol.upper())
+        if not names:
+            return None
+        try:
+            segment = Segment(os.path.join(self._symbol_dir(symbol.upper()), names[-1]))
+        except (FileNotFoundError, ValueError):
+            return None
+        try:
+            if not segment.count:
+                return None
+            return {column: segment.value(column, segment.count - 1) for column in COLUMNS}
+        finally:
+            segment.close()
+
+    def status(self):
+        return {
+            'writer': self._owner == os.getpid(),
+            'symbols': len(self.symbols()),
+            'rows_written': self.rows_written,
+            'rows_skipped': self.rows_skipped
+        }
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+import os
+import json
+import sqlite3
+import datetime
+import threading
+
+from sqlite_db import USER_DATA_DIR, SQLiteDatabase
+
+
+class DuplicateUserError(ValueError):
+    """Raised when a username or email is already registered"""
+
+    def __init__(self, field):
+        super().__init__(f'{field} already exists')
+        self.field = field
+
+
+# Orderings the admin listing can use; id and created_at share the id order
+SORT_FIELDS = ('id', 'username', 'email', 'created_at')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL UNIQUE,
+    email TEXT NOT NULL,
+    password_hash TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    holdings TEXT,
+    -- Lowercased copies for case-insensitive ordering, search and uniqueness
+    username_key TEXT NOT NULL,
+    email_key TEXT NOT NULL UNIQUE,
+    email_domain TEXT
+);
+CREATE INDEX IF NOT EXISTS users_by_username_key ON users (username_key, id);
+CREATE INDEX IF NOT EXISTS users_by_email_key ON users (email_key, id);
+CREATE INDEX IF NOT EXISTS users_by_created_at ON users (created_at);
+CREATE INDEX IF NOT EXISTS users_by_email_domain ON users (email_domain);
+"""
+
+_COLUMNS = 'id, username, email, password_hash, created_at, holdings'
+_ORDER_KEYS = {'username': 'username_key', 'email': 'email_key'}
+
+
+def _user(row):
+    if row is None:
+        return None
+    user = {
+        'id': row['id'],
+        'username': row['username'],
+        'email': row['email'],
+        'password_hash': row['password_hash'],
+        'created_at': row['created_at']
+    }
+    if row['holdings']:
+        user['holdings'] = json.loads(row['holdings'])
+    return user
+
+
+class UserStore:
+    """Users in one SQLite database, indexed on id, username and email
+
+    Every worker process opens the same file, so a user registered in one
+    worker can log in through any other and ids are never reused.
+
+    Lookups by id, username and email are answered from an in-memory index
+    in each worker. Users are only ever inserted, so a miss is caught up by
+    reading the rows past the highest id seen so far.
+    """
+
+    def __init__(self, path=None):
+        self.db = SQLiteDatabase(os.path.join(USER_DATA_DIR, 'users.db') if path is None else path, _SCHEMA)
+        self._by_id = {}
+        self._by_username = {}
+        self._by_email = {}
+        self._synced_id = 0
+        self._sync_lock = threading.Lock()
+        self._listeners = []
+        self._sync()
+
+    @staticmethod
+    def email_key(email):
+        return email.strip().lower()
+
+    def add(self, username, email, password_hash, holdings=None):
+        """Register a user and return its record; raises DuplicateUserError"""
+        user = {
+            'username': username,
+            'email': email,
+            'password_hash': password_hash,
+            'created_at': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+        if holdings:
+            user['holdings'] = holdings
+        try:
+            # The unique indexes make the duplicate check and id allocation atomic
+            user['id'] = self.db.write(lambda connection: self._insert(connection, user))
+        except sqlite3.IntegrityError as e:
+            raise DuplicateUserError('email' if 'email' in str(e) else 'username')
+        # Users from other workers with lower ids are still read by the next sync
+        self._index(user)
+        return dict(user)
+
+    def _insert(self, connection, user):
+        email = user['email']
+        cursor = connection.execute(
+            'INSERT INTO users (username, email, password_hash, created_at, holdings,'
+            ' username_key, email_key, email_domain) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (user['username'], email, user['password_hash'], user['created_at'],
+             json.dumps(user['holdings']) if user.get('holdings') else None,
+             user['username'].lower(), self.email_key(email),
+             email.split('@')[1] if '@' in email else None)
+        )
+        return cursor.lastrowid
+
+    def add_listener(self, listener):
+        """Call listener(user) for each user this worker learns of from now on,
+        registered here or, once synced, by another worker"""
+        self._listeners.append(listener)
+
+    def _index(self, user):
+        self._by_id[user['id']] = user
+        self._by_username[user['username']] = user
+        self._by_email[self.email_key(user['email'])] = user
+        for listener in self._listeners:
+            try:
+                listener(dict(user))
+            except Exception as e:
+                print(f"User store listener failed: {e}")
+
+    def _sync(self):
+        """Index users registered (by any worker) since the last sync"""
+        with self._sync_lock:
+            rows = self.db.fetchall(f'SELECT {_COLUMNS} FROM users WHERE id > ? ORDER BY id', (self._synced_id,))
+            for row in rows:
+                # Users registered here are indexed already
+                if row['id'] not in self._by_id:
+                    self._index(_user(row))
+            if rows:
+                self._synced_id = rows[-1]['id']
+
+    def _lookup(self, index, key):
+        user = index.get(key)
+        if user is None:
+            self._sync()
+            user = index.get(key)
+        return None if user is None else dict(user)
+
+    def get(self, user_id):
+        return self._lookup(self._by_id, user_id)
+
+    def by_username(self, username):
+        return self._lookup(self._by_username, username)
+
+    def by_email(self, email):
+        return self._lookup(self._by_email, self.email_key(email))
+
+    def all(self):
+        """Copy of every user, oldest first"""
+        self._sync()
+        return [dict(self._by_id[user_id]) for user_id in sorted(self._by_id)]
+
+    def _where(self, search):
+        """WHERE clause for usernames or emails starting with search (case-insensitive)"""
+        if not search:
+            return '', ()
+        prefix = search.strip().lower()
+        # Two index range scans rather than a LIKE over every row
+        return ('WHERE ((username_key >= ? AND username_key < ?) OR (email_key >= ? AND email_key < ?))',
+                (prefix, prefix + '\U0010ffff') * 2)
+
+    def query(self, search=None, sort='id', descending=False, offset=0, limit=50):
+        """(total, users) for one page, using the indexes instead of scanning"""
+        where, parameters = self._where(search)
+        key = _ORDER_KEYS.get(sort, 'id')
+        direction = 'DESC' if descending else 'ASC'
+        order = 'id %s' % direction if key == 'id' else '%s %s, id %s' % (key, direction, direction)
+        with self.db.connection() as connection:
+            total = connection.execute(f'SELECT COUNT(*) FROM users {where}', parameters).fetchone()[0]
+            rows = connection.execute(f'SELECT {_COLUMNS} FROM users {where} ORDER BY {order} LIMIT ? OFFSET ?',
+                                      parameters + (limit, offset)).fetchall()
+        return total, [_user(row) for row in rows]
+
+    def iter_users(self, search=None, sort='id', descending=False, chunk=500):
+        """Yield users in order without copying the whole store"""
+        where, parameters = self._where(search)
+        key = _ORDER_KEYS.get(sort, 'id')
+        direction, compare = ('DESC', '<') if descending else ('ASC', '>')
+        order = 'id %s' % direction if key == 'id' else '%s %s, id %s' % (key, direction, direction)
+        position = 'id' if key == 'id' else f'({key}, id)'
+        last = None
+        while True:
+            # Resume each chunk after the last key seen, so users registered
+            # while streaming neither shift nor duplicate rows
+            clause, values = where, parameters
+            if last is not None:
+                after = f'{position} {compare} ' + ('?' if key == 'id' else '(?, ?)')
+                clause = f'{where} AND {after}' if where else f'WHERE {after}'
+                values = parameters + last
+            rows = self.db.fetchall(f'SELECT {_COLUMNS}, {key} AS sort_key FROM users {clause}'
+                                    f' ORDER BY {order} LIMIT ?', values + (chunk,))
+            if not rows:
+                return
+            for row in rows:
+                yield _user(row)
+            last = (rows[-1]['id'],) if key == 'id' else (rows[-1]['sort_key'], rows[-1]['id'])
+
+    def stats(self):
+        today = datetime.datetime.now().strftime('%Y-%m-%d')
+        total, created_today, domains = self.db.fetchone(
+            'SELECT (SELECT COUNT(*) FROM users),'
+            ' (SELECT COUNT(*) FROM users WHERE created_at >= ?),'
+            ' (SELECT COUNT(DISTINCT email_domain) FROM users)', (today,)
+        )
+        return {'total': total, 'today': created_today, 'domains': domains}
+
+    def __len__(self):
+        return self.db.fetchone('SELECT COUNT(*) FROM users')[0]